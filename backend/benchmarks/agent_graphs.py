@@ -0,0 +1,293 @@
+"""
+End-to-end latency benchmark of the agent graphs, fully offline: the OpenAI models and embeddings are replaced by the
+deterministic fakes of `fakes.py`, with configurable latencies, and the rulebook vector store by synthetic chunks.
+
+Drives the multi-agent graph (conversations of the question corpus, one thread per board) and/or the board analyst
+alone (one turn per board question) with `test_state.json` and `test_state_hand.json`, and reports per path
+(summarize, advise, rulebook) the turn latency p50/p95/p99, and per graph node the wall time, LLM calls and prompt
+tokens per turn. Caches are cleared before every turn unless `--warm-caches`.
+
+Results are written as JSON with `--json`; `--baseline` compares them to a previous run and fails (exit code 1) when
+a path's p50 or p95 regressed by more than `--tolerance`.
+
+Usage:
+    python benchmarks/agent_graphs.py [--graph multi|analysis|both] [--rounds 2] [--mode async|sync]
+        [--json results.json] [--baseline previous.json --tolerance 0.15] [--latency gpt-4.1=0.8 ...]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from langchain_core.callbacks import BaseCallbackHandler
+
+BACKEND_DIRECTORY = Path(__file__).parent.parent
+BOARDS = [BACKEND_DIRECTORY / "test_state.json", BACKEND_DIRECTORY / "test_state_hand.json"]
+CORPUS_PATH = Path(__file__).parent / "questions.json"
+
+
+class NodeProfiler(BaseCallbackHandler):
+    """Wall time of every graph node run, and the LLM calls and prompt tokens made inside each node, for one turn."""
+
+    def __init__(self):
+        self.node_ms: defaultdict[str, float] = defaultdict(float)
+        self.node_runs: Counter = Counter()
+        self.llm_calls: Counter = Counter()
+        self.prompt_tokens: Counter = Counter()
+        self._tasks: set[str] = set() # Checkpoint namespaces of the node runs seen
+        self._starts: dict = {} # run ID -> (node path, start time)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def node_path(metadata: dict | None) -> str | None:
+        """"board_analyst/router" for the router inside the board analyst subgraph, from the run's checkpoint namespace."""
+        namespace = (metadata or {}).get("langgraph_checkpoint_ns")
+        if not namespace:
+            return None
+        return "/".join(part.split(":", 1)[0] for part in namespace.split("|"))
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        namespace = (metadata or {}).get("langgraph_checkpoint_ns")
+        with self._lock:
+            if namespace and namespace not in self._tasks: # The first run of a task is the node itself
+                self._tasks.add(namespace)
+                self._starts[run_id] = (self.node_path(metadata), time.perf_counter())
+
+    def _end(self, run_id):
+        with self._lock:
+            started = self._starts.pop(run_id, None)
+            if started:
+                path, start = started
+                self.node_ms[path] += (time.perf_counter() - start) * 1000
+                self.node_runs[path] += 1
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        from optcg.tokens import count_tokens
+        path = self.node_path(metadata) or "(outside graph)"
+        tokens = sum(count_tokens(message.content if isinstance(message.content, str) else str(message.content)) for message in messages[0])
+        with self._lock:
+            self.llm_calls[path] += 1
+            self.prompt_tokens[path] += tokens
+
+    def turn_path(self) -> str:
+        """The path a turn took, from the nodes that ran."""
+        nodes = set(self.node_runs)
+        if any(node.startswith("rulebook_agent") for node in nodes):
+            return "rulebook"
+        if nodes & {"advisor", "board_analyst/advisor"}:
+            return "advise"
+        if nodes & {"summarize_board", "board_analyst/summarize_board"}:
+            return "summarize"
+        return "other"
+
+
+def clear_caches():
+    from optcg.analysis_cache import analysis_cache
+    from optcg.agents.react import get_rulebook_answer_cache
+    analysis_cache.invalidate()
+    if get_rulebook_answer_cache.is_initialized():
+        get_rulebook_answer_cache().invalidate()
+
+def run_turn(graph, question: str, thread_id: str, mode: str, warm_caches: bool) -> dict:
+    if not warm_caches:
+        clear_caches()
+    profiler = NodeProfiler()
+    state = {"messages": [{"role": "user", "content": question}]}
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": [profiler]}
+    start = time.perf_counter()
+    result = asyncio.run(graph.ainvoke(state, config)) if mode == "async" else graph.invoke(state, config)
+    total_ms = (time.perf_counter() - start) * 1000
+    assert not str(result["messages"][-1].content).startswith("(Error)"), result["messages"][-1].content
+    return {
+        "question": question,
+        "path": profiler.turn_path(),
+        "total_ms": total_ms,
+        "node_ms": dict(profiler.node_ms),
+        "node_runs": dict(profiler.node_runs),
+        "llm_calls": dict(profiler.llm_calls),
+        "prompt_tokens": dict(profiler.prompt_tokens),
+    }
+
+async def maintain_history(graph, thread_id: str):
+    """What the chat routes run after each response, untimed: the context summary update, then history compaction."""
+    from optcg.agents.context_window import CONTEXT_SUMMARY_ENABLED, aupdate_context_summary, summarized_count
+    from optcg.checkpointer import acompact_thread
+    await aupdate_context_summary(graph, thread_id)
+    await acompact_thread(graph, thread_id, removable=summarized_count if CONTEXT_SUMMARY_ENABLED else None)
+
+def run_multi_agent(corpus: list[dict], args) -> list[dict]:
+    """Each round, a conversation over the whole corpus (shuffled) per board, so the history and its windowing grow as in use."""
+    from optcg.agents import warmup
+    from optcg.board_store import get_board_store
+    graph = warmup()
+    turns = []
+    for round_index in range(args.rounds):
+        for board in BOARDS:
+            thread_id = f"benchmark-{round_index}-{board.stem}"
+            get_board_store().set(thread_id, json.loads(board.read_text()))
+            questions = [entry["question"] for entry in corpus]
+            random.Random(args.seed + round_index).shuffle(questions)
+            for question in questions:
+                turns.append({**run_turn(graph, question, thread_id, args.mode, args.warm_caches), "board": board.name})
+                asyncio.run(maintain_history(graph, thread_id))
+    return turns
+
+def run_analysis(corpus: list[dict], args) -> list[dict]:
+    """Each round, every board question of the corpus as the first turn of a new thread, on each board."""
+    from optcg.agents.analysis import get_analysis_agent
+    from optcg.agents.tools import get_rulebook_retriever
+    from optcg.board_store import get_board_store
+    graph = get_analysis_agent()
+    get_rulebook_retriever()
+    turns = []
+    for round_index in range(args.rounds):
+        for board in BOARDS:
+            for index, entry in enumerate(entry for entry in corpus if entry["path"] != "rulebook"):
+                thread_id = f"benchmark-analysis-{round_index}-{board.stem}-{index}"
+                get_board_store().set(thread_id, json.loads(board.read_text()))
+                turns.append({**run_turn(graph, entry["question"], thread_id, args.mode, args.warm_caches), "board": board.name})
+    return turns
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    return sorted_values[max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))]
+
+def aggregate(turns: list[dict]) -> dict:
+    """Latency percentiles and per-node averages per path."""
+    by_path = defaultdict(list)
+    for turn in turns:
+        by_path[turn["path"]].append(turn)
+    results = {}
+    for path, path_turns in sorted(by_path.items()):
+        totals = sorted(turn["total_ms"] for turn in path_turns)
+        count = len(path_turns)
+        nodes = sorted({node for turn in path_turns for node in turn["node_ms"]})
+        results[path] = {
+            "turns": count,
+            "mean_ms": round(statistics.fmean(totals), 1),
+            "p50_ms": round(percentile(totals, 0.50), 1),
+            "p95_ms": round(percentile(totals, 0.95), 1),
+            "p99_ms": round(percentile(totals, 0.99), 1),
+            "llm_calls_per_turn": round(sum(sum(turn["llm_calls"].values()) for turn in path_turns) / count, 2),
+            "prompt_tokens_per_turn": round(sum(sum(turn["prompt_tokens"].values()) for turn in path_turns) / count, 1),
+            "nodes": {
+                node: {
+                    "mean_ms": round(sum(turn["node_ms"].get(node, 0.0) for turn in path_turns) / count, 1),
+                    "runs_per_turn": round(sum(turn["node_runs"].get(node, 0) for turn in path_turns) / count, 2),
+                    "llm_calls_per_turn": round(sum(turn["llm_calls"].get(node, 0) for turn in path_turns) / count, 2),
+                    "prompt_tokens_per_turn": round(sum(turn["prompt_tokens"].get(node, 0) for turn in path_turns) / count, 1),
+                }
+                for node in nodes
+            },
+        }
+    return results
+
+def print_results(graph_name: str, results: dict):
+    for path, result in results.items():
+        print(f"{graph_name:>8} {path:>9}: {result['turns']:>3} turns | p50 {result['p50_ms']:>7.0f} ms, p95 {result['p95_ms']:>7.0f} ms, "
+              f"p99 {result['p99_ms']:>7.0f} ms | {result['llm_calls_per_turn']} LLM calls, {result['prompt_tokens_per_turn']:.0f} prompt tokens per turn")
+        for node, node_result in result["nodes"].items():
+            if node_result["mean_ms"] >= 1 or node_result["llm_calls_per_turn"]:
+                print(f"{'':>20}{node:<36} {node_result['mean_ms']:>7.0f} ms  {node_result['llm_calls_per_turn']:>4} calls  {node_result['prompt_tokens_per_turn']:>6.0f} tokens")
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of p50/p95 per graph and path beyond the tolerance."""
+    regressions = []
+    for graph_name, paths in results.items():
+        for path, result in paths.items():
+            previous = baseline.get("results", {}).get(graph_name, {}).get(path)
+            if not previous:
+                continue
+            for metric in ["p50_ms", "p95_ms"]:
+                change = result[metric] / previous[metric] - 1 if previous[metric] else 0.0
+                print(f"{graph_name:>8} {path:>9} {metric}: {previous[metric]:.0f} -> {result[metric]:.0f} ms ({change:+.1%})")
+                if change > tolerance:
+                    regressions.append(f"{graph_name} {path} {metric} regressed by {change:.1%}")
+    return regressions
+
+
+def parse_latencies(values: list[str]) -> dict[str, float]:
+    latencies = {}
+    for value in values:
+        model, _, seconds = value.partition("=")
+        latencies[model] = float(seconds)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end latency of the agent graphs with fake LLMs and embeddings")
+    parser.add_argument("--graph", choices=["multi", "analysis", "both"], default="both")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--mode", choices=["async", "sync"], default="async", help="ainvoke (as the API) or invoke")
+    parser.add_argument("--corpus", type=Path, default=CORPUS_PATH)
+    parser.add_argument("--latency", action="append", default=[], metavar="MODEL=SECONDS", help="Override a fake model's latency")
+    parser.add_argument("--per-token-latency", type=float, default=None, help="Seconds per output token of text answers")
+    parser.add_argument("--embedding-latency", type=float, default=None, help="Seconds per embedding request")
+    parser.add_argument("--warm-caches", action="store_true", help="Keep the answer and analysis caches between turns")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, default=None, help="Write the results to this file")
+    parser.add_argument("--baseline", type=Path, default=None, help="Results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed p50/p95 increase over the baseline")
+    args = parser.parse_args()
+
+    # In-memory state only, read when the modules are imported
+    os.environ["CHECKPOINTER_BACKEND"] = "memory"
+    os.environ["BOARD_STORE_BACKEND"] = "memory"
+    os.environ["BOARD_ACCESS"] = "local"
+    # The LLM gateway's concurrency slots and coalescing apply, but not the OpenAI tier's rate limits
+    os.environ.setdefault("LLM_RATE_LIMITS", ",".join(f"{model}=1000000:1000000000" for model in ["gpt-4.1", "gpt-5-mini", "gpt-5-nano"]))
+
+    from fakes import DEFAULT_EMBEDDING_LATENCY, DEFAULT_PER_TOKEN_LATENCY, install_fakes
+    from optcg.llm_gateway import llm_gateway
+    corpus = json.loads(args.corpus.read_text())
+    stats = install_fakes(
+        corpus,
+        latencies=parse_latencies(args.latency),
+        per_token_latency=DEFAULT_PER_TOKEN_LATENCY if args.per_token_latency is None else args.per_token_latency,
+        embedding_latency=DEFAULT_EMBEDDING_LATENCY if args.embedding_latency is None else args.embedding_latency,
+    )
+
+    results, fake_calls, all_turns = {}, {}, {}
+    for graph_name, run in [("multi", run_multi_agent), ("analysis", run_analysis)]:
+        if args.graph not in (graph_name, "both"):
+            continue
+        stats.reset()
+        turns = run(corpus, args)
+        results[graph_name] = aggregate(turns)
+        fake_calls[graph_name] = stats.snapshot()
+        all_turns[graph_name] = turns
+        print_results(graph_name, results[graph_name])
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            "config": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+            "topology": os.getenv("ANALYSIS_GRAPH_TOPOLOGY", "parallel"),
+            "results": results,
+            "fake_calls": fake_calls,
+            "llm_gateway": llm_gateway.stats(),
+            "turns": all_turns,
+        }, indent=2))
+        print(f"Results written to {args.json}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            print("\n".join(["Regressions:"] + regressions))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
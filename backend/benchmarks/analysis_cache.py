@@ -0,0 +1,80 @@
+"""
+Check that the board analyst's cache (`optcg/analysis_cache.py`) is read back on a repeated question.
+
+Asks each question twice on the same board with stubbed LLMs and retriever (see `benchmarks/analysis_graph.py`), with
+the router fast path on, so the route is decided without the LLM router. The second turn must go straight from
+`retrieve_board` to the answer through `join`: no router, extraction or retrieval call, whichever topology.
+
+Usage:
+    python benchmarks/analysis_cache.py [--mode async|sync]
+
+Exits with status 1 if a repeated question runs any stage that was cached.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from analysis_graph import install_stubs
+
+# Questions the fast path decides, with the node that answers them
+QUESTIONS = [
+    ("How should I play my Blocker character?", "advisor"),
+    ("Give me a quick overview of the board.", "summarize_board"),
+]
+SEQUENTIAL_CACHED_PATHS = {"advisor": ["retrieve_board", "advisor"], "summarize_board": ["retrieve_board", "summarize_board"]}
+PARALLEL_CACHED_PATHS = {"advisor": ["retrieve_board", "join", "advisor"], "summarize_board": ["retrieve_board", "join", "summarize_board"]}
+CACHED_STAGES = ["router", "extractor", "retriever"] # Stubs that must not be called again
+
+def run_turn(graph, question: str, mode: str) -> list[str]:
+    """The nodes run for the question, in order."""
+    state = {"messages": [{"role": "user", "content": question}]}
+    config = {"configurable": {"thread_id": "benchmark"}}
+
+    async def astream():
+        return [node async for chunk in graph.astream(state, config, stream_mode="updates") for node in chunk]
+
+    return asyncio.run(astream()) if mode == "async" else [node for chunk in graph.stream(state, config, stream_mode="updates") for node in chunk]
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that repeated questions are answered from the analysis cache")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async", help="astream (as the API) or stream")
+    parser.add_argument("--board", type=Path, default=Path(__file__).parent.parent / "test_state.json")
+    args = parser.parse_args()
+
+    from optcg.agents.analysis import route_classifier
+    from optcg.agents.analysis.analysis_graph import build_analysis_graph
+    from optcg.analysis_cache import analysis_cache
+    from optcg.board_store import get_board_store
+
+    route_classifier.enabled = True
+    get_board_store().set("benchmark", json.loads(args.board.read_text()))
+    latencies = SimpleNamespace(router_ms=0, extractor_ms=0, summarizer_ms=0, advisor_ms=0, retrieval_ms=0)
+
+    failures = 0
+    for topology, cached_paths in [("sequential", SEQUENTIAL_CACHED_PATHS), ("parallel", PARALLEL_CACHED_PATHS)]:
+        graph = build_analysis_graph(topology)
+        for question, answered_by in QUESTIONS:
+            if route_classifier.classify(question) is None:
+                print(f"FAIL [{topology}] {question!r}: not decided by the router fast path")
+                failures += 1
+                continue
+            analysis_cache.invalidate()
+            stubs = install_stubs(latencies)
+            first = run_turn(graph, question, args.mode)
+            calls = {name: stub.calls for name, stub in stubs.items()}
+            second = run_turn(graph, question, args.mode)
+            repeated = {name: stubs[name].calls - calls[name] for name in CACHED_STAGES if stubs[name].calls != calls[name]}
+            wrong = second != cached_paths[answered_by] or bool(repeated)
+            failures += wrong
+            print(f"{'FAIL' if wrong else 'ok  '} [{topology}] {question!r}: first {' -> '.join(first)}, "
+                  f"second {' -> '.join(second)}" + (f", repeated calls {repeated}" if repeated else ""))
+
+    print("FAIL" if failures else "OK")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Latency of a board-analyst turn with the sequential and the parallel analysis graph (`ANALYSIS_GRAPH_TOPOLOGY`).
+
+LLMs and the rulebook retriever are replaced by stubs that sleep for the given latencies, so the benchmark needs no
+API keys and measures only the graph topology. Every turn runs with an empty analysis cache, once for a question that
+needs rules (router -> extraction -> retrieval -> advisor) and once for one that does not (router -> summary).
+
+Usage:
+    python benchmarks/analysis_graph.py [--turns 5] [--mode async|sync] [--no-router-fast-path] [--router-ms 800] ...
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+RULE_QUESTION = "Can my Blocker character block the opponent's leader attack if it is rested?"
+SUMMARY_QUESTION = "Give me a quick overview of the board."
+
+class StubLLM:
+    """Sleeps for `latency` seconds and answers with `respond(messages)`. Cancelled calls are counted separately."""
+
+    def __init__(self, latency: float, respond):
+        self.latency = latency
+        self.respond = respond
+        self.calls = 0
+        self.cancelled = 0
+
+    def invoke(self, messages, config=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.respond(messages)
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.respond(messages)
+
+class StubRetriever:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def retrieve_batch(self, queries: list[str]) -> list[Document]:
+        self.calls += 1
+        time.sleep(self.latency) # One embedding request and one vector search
+        return [Document(page_content=f"Rule text for {query!r}, part {part}.", id=f"{query}-{part}") for query in queries for part in range(3)]
+
+    def retrieve_context(self, queries: list[str], token_budget: int) -> str:
+        return "\n\n".join(document.page_content for document in self.retrieve_batch(queries))
+
+def install_stubs(args) -> dict:
+    """Replace the analysis graph's LLMs and retriever with stubs, returns them by name."""
+    from optcg.agents.analysis import analysis_graph
+    from optcg.agents.analysis.analysis_schemas import AnalysisExtractorSchema, AnalysisRouterSchema
+
+    stubs = {
+        "router": StubLLM(args.router_ms / 1000, lambda messages: AnalysisRouterSchema(rule_retrieval=RULE_QUESTION in messages[-1]["content"])),
+        "extractor": StubLLM(args.extractor_ms / 1000, lambda messages: AnalysisExtractorSchema(queries=["Blocker", "rested characters", "leader attack"])),
+        "summarizer": StubLLM(args.summarizer_ms / 1000, lambda messages: AIMessage(content="Board summary.")),
+        "advisor": StubLLM(args.advisor_ms / 1000, lambda messages: AIMessage(content="Advice.")),
+        "retriever": StubRetriever(args.retrieval_ms / 1000),
+    }
+    analysis_graph.get_llm_router = lambda: stubs["router"]
+    analysis_graph.get_llm_extractor = lambda: stubs["extractor"]
+    analysis_graph.get_llm_state_summarizer = lambda: stubs["summarizer"]
+    analysis_graph.get_llm_advisor = lambda: stubs["advisor"]
+    analysis_graph.get_rulebook_retriever = lambda: stubs["retriever"]
+    return stubs
+
+def run_turn(graph, question: str, mode: str) -> float:
+    from optcg.analysis_cache import analysis_cache
+    analysis_cache.invalidate() # Measure uncached turns
+    state = {"messages": [{"role": "user", "content": question}]}
+    config = {"configurable": {"thread_id": "benchmark"}}
+    start = time.perf_counter()
+    result = asyncio.run(graph.ainvoke(state, config)) if mode == "async" else graph.invoke(state, config)
+    elapsed = time.perf_counter() - start
+    assert not result["messages"][-1].content.startswith("(Error)"), result["messages"][-1].content
+    return elapsed
+
+def summarize(topology: str, kind: str, samples: list[float], stubs: dict) -> dict:
+    samples_ms = sorted(sample * 1000 for sample in samples)
+    result = {
+        "topology": topology,
+        "question": kind,
+        "turns": len(samples_ms),
+        "mean_ms": statistics.fmean(samples_ms),
+        "p50_ms": samples_ms[len(samples_ms) // 2],
+        "max_ms": samples_ms[-1],
+        "calls": {name: stub.calls for name, stub in stubs.items()},
+        "cancelled": {name: stub.cancelled for name, stub in stubs.items() if getattr(stub, "cancelled", 0)},
+    }
+    print(f"{topology:>10} {kind:>7}: mean {result['mean_ms']:.0f} ms, p50 {result['p50_ms']:.0f} ms, max {result['max_ms']:.0f} ms"
+          f" | calls {result['calls']}" + (f", cancelled {result['cancelled']}" if result["cancelled"] else ""))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Board-analyst turn latency: sequential vs parallel analysis graph, with stubbed LLMs")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--mode", choices=["async", "sync"], default="async", help="ainvoke (as the API) or invoke")
+    parser.add_argument("--board", type=Path, default=Path(__file__).parent.parent / "test_state.json")
+    parser.add_argument("--router-ms", type=float, default=800)
+    parser.add_argument("--extractor-ms", type=float, default=1500)
+    parser.add_argument("--summarizer-ms", type=float, default=1200)
+    parser.add_argument("--advisor-ms", type=float, default=2500)
+    parser.add_argument("--retrieval-ms", type=float, default=250)
+    parser.add_argument("--no-router-fast-path", action="store_true", help="Route every question with the (stubbed) LLM router")
+    parser.add_argument("--json", type=Path, default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    from optcg.agents.analysis import route_classifier
+    from optcg.agents.analysis.analysis_graph import build_analysis_graph
+    from optcg.board_store import get_board_store
+
+    route_classifier.enabled = not args.no_router_fast_path
+    get_board_store().set("benchmark", json.loads(args.board.read_text()))
+    results = []
+    for topology in ["sequential", "parallel"]:
+        graph = build_analysis_graph(topology)
+        for kind, question in [("rules", RULE_QUESTION), ("summary", SUMMARY_QUESTION)]:
+            stubs = install_stubs(args) # Fresh call counts
+            samples = [run_turn(graph, question, args.mode) for _ in range(args.turns)]
+            results.append(summarize(topology, kind, samples, stubs))
+
+    for kind in ["rules", "summary"]:
+        sequential, parallel = (next(r for r in results if r["topology"] == topology and r["question"] == kind) for topology in ["sequential", "parallel"])
+        print(f"{kind:>7}: parallel saves {sequential['mean_ms'] - parallel['mean_ms']:.0f} ms per turn ({sequential['mean_ms'] / parallel['mean_ms']:.2f}x)")
+    if args.json:
+        args.json.write_text(json.dumps({"mode": args.mode, "router_fast_path": route_classifier.enabled, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
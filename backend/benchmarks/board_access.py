@@ -0,0 +1,83 @@
+"""
+Micro-benchmark of the board retrieval step of a board-analyst turn (`analysis_graph.boardstate_retrieval`):
+in-process board store access vs. the HTTP loopback to the API's `/board/` endpoint.
+
+Starts the board routes on a local uvicorn server, saves `test_state.json` as the board of a thread,
+and times the node with each board source.
+
+Usage:
+    python benchmarks/board_access.py [--turns 200] [--board test_state.json] [--port 8765]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from pathlib import Path
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def summarize(name: str, samples: list[float]) -> dict:
+    samples_ms = sorted(sample * 1000 for sample in samples)
+    result = {
+        "source": name,
+        "turns": len(samples_ms),
+        "mean_ms": statistics.fmean(samples_ms),
+        "p50_ms": samples_ms[len(samples_ms) // 2],
+        "p95_ms": samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.95))],
+    }
+    print(f"{name:>6}: mean {result['mean_ms']:.3f} ms, p50 {result['p50_ms']:.3f} ms, p95 {result['p95_ms']:.3f} ms over {result['turns']} turns")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Board retrieval latency per analyst turn: in-process vs HTTP loopback")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--board", type=Path, default=Path(__file__).parent.parent / "test_state.json")
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+
+    port = args.port or free_port()
+    os.environ["API_BASE_URL"] = f"http://127.0.0.1:{port}" # Read when the board tool module is imported
+
+    import uvicorn
+    from fastapi import FastAPI
+    from optcg.routes import board_routes
+    from optcg.board_store import get_board_store
+    from optcg.agents.analysis.analysis_graph import boardstate_retrieval
+    from optcg.agents.tools import fetch_board_local, fetch_board_http
+
+    # Only the board routes, so the server needs no API keys
+    app = FastAPI()
+    app.include_router(board_routes.router, prefix="/board")
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    thread_id = "benchmark"
+    get_board_store().set(thread_id, json.loads(args.board.read_text()))
+    state = {"messages": []}
+
+    results = []
+    for name, loader in [("local", fetch_board_local), ("http", fetch_board_http)]:
+        config = {"configurable": {"thread_id": thread_id, "board_loader": loader}}
+        command = boardstate_retrieval(state, config) # Warm up (connection pool, imports)
+        assert command.goto == "router", f"{name} board source found no board"
+        samples = []
+        for _ in range(args.turns):
+            start = time.perf_counter()
+            boardstate_retrieval(state, config)
+            samples.append(time.perf_counter() - start)
+        results.append(summarize(name, samples))
+
+    print(f"HTTP loopback adds {results[1]['mean_ms'] - results[0]['mean_ms']:.3f} ms per analyst turn ({results[1]['mean_ms'] / results[0]['mean_ms']:.0f}x)")
+    server.should_exit = True
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Size and round trip of the stored board form (`board_store.compact_board`) for the test boards.
+
+Each board is validated and compacted as `POST /board/` stores it, with an empty card table (no catalog synced, no card
+fetched), so every card is stored whole, and again with the board's cards interned, so every card is a reference.
+The stored board must be smaller than the posted JSON and expand back to the validated board.
+
+Usage:
+    python benchmarks/board_storage.py [--board test_state.json ...]
+
+Exits with status 1 if a stored board is larger than its input or does not round-trip.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).parent.parent
+
+def size(board: dict) -> int:
+    return len(json.dumps(board, separators=(",", ":")))
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the size and round trip of stored boards")
+    parser.add_argument("--board", type=Path, nargs="+", default=[BACKEND / "test_state.json", BACKEND / "test_state_hand.json"])
+    args = parser.parse_args()
+
+    from optcg.board_store import compact_board, expand_board, map_cards
+    from optcg.card_table import CARD_FIELDS, card_table
+    from optcg.schemas import BoardState
+
+    failures = 0
+    for path in args.board:
+        posted = json.loads(path.read_text())
+        board = BoardState.model_validate(posted)
+        expected = board.model_dump(mode="json")
+        for cards in ["whole", "references"]:
+            if cards == "references": # Trusted copies of the board's cards, as a catalog or API TCG would give them
+                interned = []
+                map_cards(expected, lambda card: interned.append({field: card[field] for field in CARD_FIELDS}) or card)
+                card_table.intern(interned, persist=False)
+            stored = compact_board(board)
+            wrong = size(stored) >= size(posted) or expand_board(stored) != expected
+            failures += wrong
+            print(f"{'FAIL' if wrong else 'ok  '} {path.name} ({cards}): posted {size(posted)} bytes, stored {size(stored)} bytes"
+                  + ("" if expand_board(stored) == expected else ", does not expand back to the validated board"))
+
+    print("FAIL" if failures else "OK")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
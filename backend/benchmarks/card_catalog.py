@@ -0,0 +1,112 @@
+"""
+Table-driven check of the local card catalog's indexed search (`optcg/card_catalog.py`) against a fixture catalog.
+
+Every query of the table has the card ids it must return, in catalog order: exact (set, counter, including a counter
+given as a number), partial text (name, type, ability, family, trigger), cost and power (range index), and multicolor
+queries. Also checks lookups by id and by card code, re-indexing and removal, and that the memo of query tokens stays
+bounded.
+
+Usage:
+    python benchmarks/card_catalog.py [--verbose]
+
+Exits with status 1 if any check fails.
+"""
+
+import argparse
+import sys
+
+def card(card_id: str, name: str, type: str, color: str, cost: int | None, power: int | None, counter, family: str,
+         ability: str = "-", trigger: str = "-") -> dict:
+    return {"id": card_id, "code": card_id.split("_")[0], "name": name, "type": type, "color": color, "cost": cost,
+            "power": power, "counter": counter, "family": family, "ability": ability, "trigger": trigger}
+
+FIXTURE = [
+    card("OP01-001", "Roronoa Zoro", "LEADER", "Red", 5, 5000, "-", "Supernovas/Straw Hat Crew",
+         "[DON!! x1] [Your Turn] All of your Characters gain +1000 power."),
+    card("OP01-003", "Monkey.D.Luffy", "LEADER", "Red/Green", 5, 5000, None, "Supernovas/Straw Hat Crew",
+         "[Activate: Main] [Once Per Turn] Give up to 1 rested DON!! card to your Leader or 1 of your Characters."),
+    card("OP01-016", "Nami", "CHARACTER", "Red", 1, 2000, 1000, "Straw Hat Crew",
+         "[On Play] Look at 5 cards from the top of your deck."),
+    card("OP01-016_p1", "Nami", "CHARACTER", "Red", 1, 2000, 1000, "Straw Hat Crew",
+         "[On Play] Look at 5 cards from the top of your deck."),
+    card("OP01-025", "Roronoa Zoro", "CHARACTER", "Red", 3, 5000, "-", "Supernovas/Straw Hat Crew", "[Rush]"),
+    card("OP02-013", "Portgas.D.Ace", "CHARACTER", "Red", 7, 7000, "-", "Whitebeard Pirates",
+         "[On Play] Give up to 2 of your opponent's Characters -3000 power during this turn.", "[Trigger] Play this card."),
+    card("ST01-012", "Monkey.D.Luffy", "CHARACTER", "Red", 5, 6000, "-", "Straw Hat Crew", "[Rush]"),
+    card("OP02-068", "Gum-Gum Giant Pistol", "EVENT", "Blue/Green", 4, None, "-", "Straw Hat Crew",
+         "[Main] K.O. up to 1 of your opponent's Characters with a cost of 6 or less."),
+    card("OP01-090", "Baroque Works", "STAGE", "Purple", 1, None, "-", "Baroque Works"),
+]
+
+# (description, search request fields, expected card ids in catalog order)
+QUERIES = [
+    ("exact set", {"set": "op02"}, ["OP02-013", "OP02-068"]),
+    ("exact set, full card code", {"set": "OP01-016"}, ["OP01-016", "OP01-016_p1"]),
+    ("exact counter, stored as a number", {"counter": "1000"}, ["OP01-016", "OP01-016_p1"]),
+    ("no counter", {"counter": "-", "type": "leader"}, ["OP01-001"]),
+    ("substring of a name", {"name": "luff"}, ["OP01-003", "ST01-012"]),
+    ("substring across name tokens", {"name": "a zoro"}, ["OP01-001", "OP01-025"]),
+    ("substring of a type", {"type": "char"}, ["OP01-016", "OP01-016_p1", "OP01-025", "OP02-013", "ST01-012"]),
+    ("substring of an ability", {"ability": "rush"}, ["OP01-025", "ST01-012"]),
+    ("substring of a family", {"family": "whitebeard"}, ["OP02-013"]),
+    ("trigger", {"trigger": "play this"}, ["OP02-013"]),
+    ("cost", {"cost": 5}, ["OP01-001", "OP01-003", "ST01-012"]),
+    ("power", {"power": 5000, "type": "character"}, ["OP01-025"]),
+    ("zero cost", {"cost": 0}, []),
+    ("multicolor, first color", {"color": "red", "type": "leader"}, ["OP01-001", "OP01-003"]),
+    ("multicolor, second color", {"color": "green"}, ["OP01-003", "OP02-068"]),
+    ("multicolor and partial text", {"color": "blue", "ability": "k.o."}, ["OP02-068"]),
+    ("no match", {"name": "zoro", "color": "purple"}, []),
+]
+
+# (range field, low, high, expected card ids, unordered)
+RANGES = [
+    ("cost", 3, 5, {"OP01-001", "OP01-003", "OP01-025", "ST01-012", "OP02-068"}),
+    ("power", 6000, 10000, {"OP02-013", "ST01-012"}),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the local card catalog's search against a fixture catalog")
+    parser.add_argument("--verbose", action="store_true", help="Print every check")
+    args = parser.parse_args()
+
+    from optcg.card_catalog import VOCAB_MATCH_CACHE_SIZE, CardCatalog
+    from optcg.schemas import CardSearchRequest
+
+    catalog = CardCatalog([dict(entry) for entry in FIXTURE])
+    checks = []
+    for description, fields, expected in QUERIES:
+        found = [entry["id"] for entry in catalog.search(CardSearchRequest(**fields))]
+        checks.append((f"search {description} {fields}", found, expected))
+    for field, low, high, expected in RANGES:
+        checks.append((f"range {field} {low}..{high}", catalog._range_candidates(field, low, high), expected))
+
+    checks.append(("get by id", (catalog.get("OP01-016_p1") or {}).get("id"), "OP01-016_p1"))
+    checks.append(("get by code, first print", (catalog.get("OP01-016") or {}).get("id"), "OP01-016"))
+    checks.append(("get unknown", catalog.get("OP99-001"), None))
+
+    # Re-indexing and removal keep every index in step
+    catalog.upsert([{**FIXTURE[4], "name": "Roronoa Zoro (Alt)", "cost": 4, "counter": 2000}])
+    checks.append(("re-indexed cost", [entry["id"] for entry in catalog.search(CardSearchRequest(cost=4))], ["OP01-025", "OP02-068"]))
+    checks.append(("re-indexed counter", [entry["id"] for entry in catalog.search(CardSearchRequest(counter="2000"))], ["OP01-025"]))
+    catalog.remove(["OP01-016"])
+    checks.append(("get by code after removing a print", (catalog.get("OP01-016") or {}).get("id"), "OP01-016_p1"))
+    catalog.remove(["OP01-016_p1"])
+    checks.append(("get by code after removing every print", catalog.get("OP01-016"), None))
+
+    for index in range(VOCAB_MATCH_CACHE_SIZE + 100):
+        catalog.search(CardSearchRequest(name=f"query{index}"))
+    checks.append(("query token memo is bounded", catalog._vocab_matches.cache_info().currsize <= VOCAB_MATCH_CACHE_SIZE, True))
+
+    failures = 0
+    for description, found, expected in checks:
+        wrong = found != expected
+        failures += wrong
+        if wrong or args.verbose:
+            print(f"{'FAIL' if wrong else 'ok  '} {description}: expected {expected}, found {found}")
+    print(f"{len(checks)} checks, {failures} failed")
+    print("FAIL" if failures else "OK")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
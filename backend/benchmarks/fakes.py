@@ -0,0 +1,228 @@
+"""
+Deterministic offline fakes of the OpenAI chat models and embeddings, for benchmarking the agent graphs without API keys.
+
+- `FakeChatModel` sleeps for its model's latency (plus a per-output-token delay) and answers from a script: handoffs
+  and tool calls for the ReAct agents, the router decision and extraction queries for the board analyst, and filler
+  text of a fixed length for everything else. The script routes a question by the `path` it has in the corpus.
+- `HashingEmbeddings` embeds text as a normalized bag of hashed words, so similar questions get similar vectors.
+- `build_fake_vectorstore` fills an in-memory Chroma collection with synthetic rulebook chunks.
+
+`install_fakes` patches the model and vector store factories of the agent modules; call it before any agent is built.
+"""
+
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# Seconds per call; the real models' latencies for short structured outputs, roughly
+DEFAULT_LATENCIES = {"gpt-5-nano": 0.6, "gpt-5-mini": 1.2, "gpt-4.1": 0.8}
+DEFAULT_PER_TOKEN_LATENCY = 0.004 # Seconds per output token of text answers
+DEFAULT_EMBEDDING_LATENCY = 0.15 # Seconds per embedding request
+DEFAULT_ANSWER_TOKENS = 150
+
+_WORD = re.compile(r"[\w!\[\]]+")
+_FILLER = ("the", "leader", "character", "attack", "power", "counter", "don!!", "life", "blocker", "turn", "effect", "card")
+
+# Paths of the question corpus: summarize and advise go to the board analyst, rulebook to the rulebook agent
+BOARD_PATHS = {"summarize", "advise"}
+
+
+def _stable_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+def _text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+def _filler(tokens: int, seed: str) -> str:
+    start = _stable_hash(seed) % len(_FILLER)
+    return " ".join(_FILLER[(start + index) % len(_FILLER)] for index in range(tokens))
+
+
+@dataclass
+class FakeStats:
+    """Calls made to the fakes, per model."""
+    llm_calls: Counter = field(default_factory=Counter)
+    prompt_tokens: Counter = field(default_factory=Counter)
+    output_tokens: Counter = field(default_factory=Counter)
+    embedding_requests: int = 0
+    embedded_texts: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def reset(self):
+        with self.lock:
+            self.llm_calls.clear()
+            self.prompt_tokens.clear()
+            self.output_tokens.clear()
+            self.embedding_requests = self.embedded_texts = 0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "llm_calls": dict(self.llm_calls),
+                "prompt_tokens": dict(self.prompt_tokens),
+                "output_tokens": dict(self.output_tokens),
+                "embedding_requests": self.embedding_requests,
+                "embedded_texts": self.embedded_texts,
+            }
+
+
+class Script:
+    """Decides the fakes' answers from the corpus path of the question being answered."""
+
+    def __init__(self, corpus: list[dict], answer_tokens: int = DEFAULT_ANSWER_TOKENS):
+        self.paths = {entry["question"]: entry["path"] for entry in corpus}
+        self.answer_tokens = answer_tokens
+
+    def path(self, text: str) -> str | None:
+        for question, path in self.paths.items():
+            if question in text:
+                return path
+        return None
+
+    def respond(self, model: str, messages: list[BaseMessage], tools: list[dict] | None) -> AIMessage:
+        tool_names = [tool["function"]["name"] for tool in tools or []]
+        humans = [message for message in messages if message.type == "human"]
+        question = _text(humans[-1]) if humans else ""
+        path = self.path(question)
+        call_id = f"call_{_stable_hash(model + question + str(len(messages))):016x}"
+
+        def tool_call(name: str, args: dict) -> AIMessage:
+            return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id, "type": "tool_call"}])
+
+        if "AnalysisRouterSchema" in tool_names:
+            return tool_call("AnalysisRouterSchema", {"rule_retrieval": path != "summarize"})
+        if "AnalysisExtractorSchema" in tool_names:
+            words = [word for word in _WORD.findall(question) if len(word) > 3]
+            return tool_call("AnalysisExtractorSchema", {"queries": [" ".join(words[i:i + 3]) for i in range(0, min(len(words), 9), 3)] or [question]})
+        # The ReAct agents answer once their own tool returned (a handoff's tool message belongs to the previous agent)
+        answered = messages[-1].type == "tool" and getattr(messages[-1], "name", None) in tool_names
+        if "transfer_to_board_analyst" in tool_names and not answered and path:
+            return tool_call("transfer_to_board_analyst" if path in BOARD_PATHS else "transfer_to_rulebook_agent", {})
+        if "rulebooks_retriever" in tool_names and not answered:
+            return tool_call("rulebooks_retriever", {"query": question})
+        return AIMessage(content=f"[{model}] {_filler(self.answer_tokens, question)}")
+
+
+class FakeChatModel(BaseChatModel):
+    """Scripted chat model with the latency of the model it stands in for. Supports tool binding and structured output."""
+
+    model_name: str = "fake"
+    latency: float = 0.0
+    per_token_latency: float = 0.0
+    script: Any = None
+    stats: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], tool_choice=tool_choice, **kwargs)
+
+    def _respond(self, messages: list[BaseMessage], tools) -> tuple[ChatResult, float]:
+        from optcg.tokens import count_tokens
+        message = self.script.respond(self.model_name, messages, tools)
+        prompt_tokens = sum(count_tokens(_text(m)) for m in messages)
+        output_tokens = count_tokens(_text(message)) if message.content else 8 * len(message.tool_calls)
+        message.usage_metadata = {"input_tokens": prompt_tokens, "output_tokens": output_tokens, "total_tokens": prompt_tokens + output_tokens}
+        message.response_metadata = {"model_name": self.model_name}
+        with self.stats.lock:
+            self.stats.llm_calls[self.model_name] += 1
+            self.stats.prompt_tokens[self.model_name] += prompt_tokens
+            self.stats.output_tokens[self.model_name] += output_tokens
+        delay = self.latency + (self.per_token_latency * output_tokens if message.content else 0.0)
+        return ChatResult(generations=[ChatGeneration(message=message)]), delay
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result, delay = self._respond(messages, kwargs.get("tools"))
+        time.sleep(delay)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result, delay = self._respond(messages, kwargs.get("tools"))
+        await asyncio.sleep(delay)
+        return result
+
+
+class HashingEmbeddings(Embeddings):
+    """Normalized bag of hashed words, with a fixed latency per request."""
+
+    def __init__(self, size: int = 256, latency: float = DEFAULT_EMBEDDING_LATENCY, stats: FakeStats | None = None):
+        self.size = size
+        self.latency = latency
+        self.stats = stats or FakeStats()
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            hashed = _stable_hash(word)
+            vector[hashed % self.size] += 1.0 if hashed & 1 << 32 else -1.0
+        return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with self.stats.lock:
+            self.stats.embedding_requests += 1
+            self.stats.embedded_texts += len(texts)
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+RULEBOOK_TOPICS = [
+    "Blocker", "Rush", "Double Attack", "Banish", "Counter", "Trigger", "DON!! cards", "Leader", "Life cards",
+    "Attacking", "Blocking", "Characters", "Stages", "Events", "On Play", "When Attacking", "Activate: Main",
+    "K.O.", "Rested cards", "Deck out", "Mulligan", "Turn structure", "Damage", "Power",
+]
+
+def build_fake_vectorstore(embeddings: Embeddings, chunk_tokens: int = 180):
+    """In-memory Chroma collection of synthetic rulebook chunks, one per topic and rule number."""
+    from langchain_chroma import Chroma
+    vectorstore = Chroma(collection_name="optcg_rulebooks_fake", embedding_function=embeddings)
+    documents, ids = [], []
+    for section, topic in enumerate(RULEBOOK_TOPICS, start=1):
+        for part in range(1, 4):
+            number = f"10-{section}-{part}"
+            documents.append(Document(page_content=f"{number}. {topic}: {_filler(chunk_tokens, number + topic)}", metadata={"source": "fake rulebook"}))
+            ids.append(number)
+    vectorstore.add_documents(documents, ids=ids)
+    return vectorstore
+
+
+def install_fakes(corpus: list[dict], latencies: dict[str, float] | None = None, per_token_latency: float = DEFAULT_PER_TOKEN_LATENCY,
+                  embedding_latency: float = DEFAULT_EMBEDDING_LATENCY, answer_tokens: int = DEFAULT_ANSWER_TOKENS) -> FakeStats:
+    """Patch every model and embedding factory of the agents with the fakes. Returns the fakes' call statistics."""
+    from optcg import vectorstore_logic
+    from optcg.agents import context_window
+    from optcg.agents.analysis import analysis_graph
+    from optcg.agents.react import react_agents
+    from optcg.agents.tools import rulebook_tool
+
+    latencies = {**DEFAULT_LATENCIES, **(latencies or {})}
+    stats = FakeStats()
+    script = Script(corpus, answer_tokens)
+
+    def fake_chat_model(model: str, **kwargs) -> FakeChatModel:
+        name = model.split(":", 1)[-1]
+        return FakeChatModel(model_name=name, latency=latencies.get(name, 1.0), per_token_latency=per_token_latency, script=script, stats=stats)
+
+    embeddings = HashingEmbeddings(latency=embedding_latency, stats=stats)
+    analysis_graph.init_chat_model = fake_chat_model
+    context_window.init_chat_model = fake_chat_model
+    react_agents.ChatOpenAI = fake_chat_model
+    vectorstore_logic.get_embeddings = lambda: embeddings
+    rulebook_tool.create_or_load_vectorstore_optcg_rulebooks = lambda: build_fake_vectorstore(embeddings)
+    return stats
@@ -0,0 +1,80 @@
+"""
+Startup benchmark: measures the time to import the API (`optcg.api`) in a fresh interpreter and enforces a budget.
+Also checks that importing the API did not build any agent, LLM client or the rulebook vector store, nor import the
+vector store's libraries (`LAZY_MODULES`), which only the functions building the store import.
+
+Usage:
+    python benchmarks/import_time.py [--runs 5] [--budget 4.0]
+
+Exits with status 1 if the median import time is over budget, or anything was initialized or imported eagerly.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "4.0")) # Seconds
+LAZY_MODULES = ["chromadb", "langchain_chroma"] # Imported by the functions building the rulebook vector store
+
+# Runs in a fresh interpreter for every measurement
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import optcg.api
+elapsed = time.perf_counter() - start
+imported = sorted(module for module in LAZY_MODULES if module in sys.modules)
+
+from optcg.agents import graph
+from optcg.agents.react import react_agents
+from optcg.agents.analysis import analysis_graph
+from optcg.agents.tools import rulebook_tool
+initialized = {
+    "multi_agent_graph": graph.get_multi_agent_graph.is_initialized(),
+    "chat_agent": react_agents.get_chat_agent.is_initialized(),
+    "rulebook_agent": react_agents.get_rulebook_agent.is_initialized(),
+    "analysis_agent": analysis_graph.get_analysis_agent.is_initialized(),
+    "rulebook_vectorstore": rulebook_tool.get_rulebook_vectorstore.is_initialized(),
+}
+print(json.dumps({"seconds": elapsed, "initialized": initialized, "imported": imported}))
+"""
+
+def measure_once() -> dict:
+    probe = f"LAZY_MODULES = {LAZY_MODULES!r}\n{PROBE}"
+    result = subprocess.run([sys.executable, "-W", "ignore", "-c", probe], capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"Importing optcg.api failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and enforce the import-time budget of optcg.api")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=IMPORT_TIME_BUDGET, help="Budget for the median import time, in seconds")
+    args = parser.parse_args()
+
+    measure_once() # Warm the bytecode cache, not counted
+    runs = [measure_once() for _ in range(args.runs)]
+    times = [run["seconds"] for run in runs]
+    median = statistics.median(times)
+    eagerly_built = sorted({name for run in runs for name, built in run["initialized"].items() if built})
+    eagerly_imported = sorted({module for run in runs for module in run["imported"]})
+
+    print(f"import optcg.api: median {median:.3f}s, min {min(times):.3f}s, max {max(times):.3f}s over {args.runs} runs (budget {args.budget:.3f}s)")
+    failed = False
+    if eagerly_built:
+        print(f"FAIL: initialized at import time: {', '.join(eagerly_built)}")
+        failed = True
+    if eagerly_imported:
+        print(f"FAIL: imported at import time: {', '.join(eagerly_imported)}")
+        failed = True
+    if median > args.budget:
+        print("FAIL: import time over budget")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
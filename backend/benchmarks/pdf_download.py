@@ -0,0 +1,109 @@
+"""
+Check of the conditional rulebook PDF download (`fetch_pdf` in `optcg/vectorstore_logic.py`) against a local HTTP
+server standing in for the rulebook site, with the PDF cache in a temporary directory.
+
+Checks the 200-then-304 round trip (the cached ETag is sent back as `If-None-Match`), a changed PDF replacing the
+cached one, a download interrupted partway (the partial file is discarded and the cached PDF kept), and the fallback
+to the cached PDF when the server is unreachable.
+
+Usage:
+    python benchmarks/pdf_download.py [--verbose]
+
+Exits with status 1 if any check fails.
+"""
+
+import argparse
+import hashlib
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+class RulebookHandler(BaseHTTPRequestHandler):
+    """Serves `body` with `etag`, answers 304 to a matching `If-None-Match`, and cuts the body short if `truncate`."""
+    body = b"%PDF-1.4 rulebook v1" * 4096
+    etag = '"v1"'
+    truncate = False
+    requests = [] # The If-None-Match header of each request
+
+    def do_GET(self):
+        cls = type(self)
+        cls.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == cls.etag:
+            self.send_response(304)
+            self.send_header("ETag", cls.etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(cls.body)))
+        self.send_header("ETag", cls.etag)
+        self.end_headers()
+        self.wfile.write(cls.body[:len(cls.body) // 2] if cls.truncate else cls.body)
+        if cls.truncate:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the conditional rulebook PDF download against a local server")
+    parser.add_argument("--verbose", action="store_true", help="Print every check")
+    args = parser.parse_args()
+
+    from optcg import vectorstore_logic
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RulebookHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/rulebook.pdf"
+    checks = []
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        vectorstore_logic.PDF_CACHE_DIRECTORY = Path(cache_dir)
+        pdf_path = Path(cache_dir) / "rules.pdf"
+        v1_hash = hashlib.sha256(RulebookHandler.body).hexdigest()
+
+        first = vectorstore_logic.fetch_pdf(url, "rules") or {}
+        checks.append(("first fetch downloads (200)", first.get("not_modified"), False))
+        checks.append(("first fetch sends no If-None-Match", RulebookHandler.requests[-1], None))
+        checks.append(("downloaded PDF hash", first.get("sha256"), v1_hash))
+        checks.append(("downloaded PDF content", pdf_path.read_bytes() == RulebookHandler.body, True))
+
+        second = vectorstore_logic.fetch_pdf(url, "rules") or {}
+        checks.append(("second fetch sends the ETag as If-None-Match", RulebookHandler.requests[-1], '"v1"'))
+        checks.append(("second fetch is not modified (304)", second.get("not_modified"), True))
+        checks.append(("not modified keeps the PDF hash", second.get("sha256"), v1_hash))
+
+        # A changed PDF is interrupted partway: the partial file is discarded, the cached PDF kept
+        RulebookHandler.body, RulebookHandler.etag, RulebookHandler.truncate = b"%PDF-1.4 rulebook v2" * 4096, '"v2"', True
+        interrupted = vectorstore_logic.fetch_pdf(url, "rules") or {}
+        checks.append(("interrupted download falls back to the cached PDF", (interrupted.get("sha256"), interrupted.get("not_modified")), (v1_hash, True)))
+        checks.append(("interrupted download leaves no partial file", list(Path(cache_dir).glob("*.part")), []))
+        checks.append(("interrupted download keeps the cached PDF", hashlib.sha256(pdf_path.read_bytes()).hexdigest(), v1_hash))
+
+        RulebookHandler.truncate = False
+        changed = vectorstore_logic.fetch_pdf(url, "rules") or {}
+        v2_hash = hashlib.sha256(RulebookHandler.body).hexdigest()
+        checks.append(("changed PDF is downloaded", (changed.get("sha256"), changed.get("not_modified")), (v2_hash, False)))
+        checks.append(("changed PDF replaces the cached one", hashlib.sha256(pdf_path.read_bytes()).hexdigest(), v2_hash))
+
+        # Offline: the server is gone, the cached PDF is used
+        server.shutdown()
+        server.server_close()
+        offline = vectorstore_logic.fetch_pdf(url, "rules") or {}
+        checks.append(("offline fetch falls back to the cached PDF", (offline.get("path"), offline.get("sha256"), offline.get("not_modified")), (pdf_path, v2_hash, True)))
+        checks.append(("offline fetch without a cached PDF", vectorstore_logic.fetch_pdf(url, "other"), None))
+
+    failures = 0
+    for description, found, expected in checks:
+        wrong = found != expected
+        failures += wrong
+        if wrong or args.verbose:
+            print(f"{'FAIL' if wrong else 'ok  '} {description}: expected {expected}, found {found}")
+    print(f"{len(checks)} checks, {failures} failed")
+    print("FAIL" if failures else "OK")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Page text extraction of the rulebook PDFs (`optcg/pdf_pages.py`): serial vs. process pools of increasing size.
+
+Times `extract_pages` on the cached rulebook PDFs (fetched by any vector store build or update check) or the given
+PDFs, bypassing the page cache. Pools are forced with `min_pages=0`; the pool timings include spawning the workers,
+as every extraction pays it. Also reports the page count from which the default pool size beats serial extraction,
+the value for `RULEBOOK_PARALLEL_MIN_PAGES`.
+
+Usage:
+    python benchmarks/pdf_extraction.py [--pdf a.pdf b.pdf] [--workers 2 4] [--runs 3]
+
+Exits with status 1 if the default setup (`RULEBOOK_EXTRACTION_WORKERS`, `RULEBOOK_PARALLEL_MIN_PAGES`) is slower
+than serial extraction on these PDFs.
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PDF_CACHE_DIRECTORY = Path.home() / ".cache" / "optcg_rulebooks_pdfs"
+
+def timed(runs: int, extract) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        page_texts = extract()
+        samples.append(time.perf_counter() - start)
+        assert all(texts is not None for texts in page_texts.values()), "A PDF could not be parsed"
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF page extraction: serial vs process pool")
+    parser.add_argument("--pdf", type=Path, nargs="+", default=sorted(PDF_CACHE_DIRECTORY.glob("*.pdf")))
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    if not args.pdf:
+        sys.exit(f"No PDFs in {PDF_CACHE_DIRECTORY}, fetch the rulebooks first or pass --pdf")
+
+    from optcg.pdf_pages import RULEBOOK_EXTRACTION_WORKERS, RULEBOOK_PARALLEL_MIN_PAGES, count_pages, extract_pages
+
+    paths = {path.stem: path for path in args.pdf}
+    pages = sum(count_pages(path) for path in paths.values())
+    serial = timed(args.runs, lambda: extract_pages(paths, workers=1))
+    print(f"{pages} pages in {len(paths)} PDFs")
+    print(f"    serial: {serial:.2f} s ({serial / pages * 1000:.1f} ms per page)")
+    pools = {}
+    for workers in sorted((set(args.workers) | {RULEBOOK_EXTRACTION_WORKERS}) - {1}):
+        pools[workers] = timed(args.runs, lambda: extract_pages(paths, workers=workers, min_pages=0))
+        print(f"{workers:>2} workers: {pools[workers]:.2f} s ({serial / pools[workers]:.2f}x serial)")
+
+    default = timed(args.runs, lambda: extract_pages(paths))
+    print(f"   default: {default:.2f} s ({RULEBOOK_EXTRACTION_WORKERS} workers from {RULEBOOK_PARALLEL_MIN_PAGES} pages)")
+    if RULEBOOK_EXTRACTION_WORKERS in pools:
+        # Pool time ~ startup + serial / workers, serial time ~ pages * per-page time
+        per_page = serial / pages
+        startup = pools[RULEBOOK_EXTRACTION_WORKERS] - serial / RULEBOOK_EXTRACTION_WORKERS
+        saving = per_page * (1 - 1 / RULEBOOK_EXTRACTION_WORKERS)
+        print(f"The pool of {RULEBOOK_EXTRACTION_WORKERS} starts in {startup:.2f} s, and beats serial extraction from about {max(0, startup) / saving:.0f} pages")
+
+    slower = default > serial * 1.1 # Timing noise
+    print("FAIL" if slower else "OK")
+    sys.exit(1 if slower else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Table-driven check of the router fast path (`optcg/agents/analysis/route_rules.py`).
+
+Every question has the route the LLM router should take (True: rules are needed, False: the board is enough). The fast
+path may decide it or leave it to the LLM router (None), but never decide it the other way. The table is the router
+prompt's examples, the question corpus of `benchmarks/questions.json`, and questions the fast path once misrouted.
+
+Usage:
+    python benchmarks/route_rules.py [--verbose]
+
+Exits with status 1 if any question is misrouted.
+"""
+
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+QUESTIONS = Path(__file__).parent / "questions.json"
+
+# Questions the fast path decided the wrong way before, with their route
+KNOWN_MISROUTES = [
+    ("How many counters does my opponent need to survive my attack?", True),
+    ("How many DON!! do I need to attach to win this battle?", True),
+    ("How many attacks can I make this turn?", True),
+    ("List my options.", True),
+    ("List my options for this turn.", True),
+    ("Show me how to win this turn.", True),
+    ("Describe my best line to win.", True),
+    ("Tell me about my attack options.", True),
+    ("What is the power of my leader if I counter with this card?", True),
+]
+
+def prompt_examples() -> list[tuple[str, bool]]:
+    """The (input, rule_retrieval) examples of the LLM router's system prompt."""
+    from optcg.agents.analysis.analysis_prompts import ANALYSIS_ROUTER_SYSTEM_PROMPT
+    pattern = re.compile(r'Input: "(.+?)"\s*Output: \{"rule_retrieval": (true|false)\}')
+    return [(question, value == "true") for question, value in pattern.findall(ANALYSIS_ROUTER_SYSTEM_PROMPT)]
+
+def corpus_questions() -> list[tuple[str, bool]]:
+    return [(entry["question"], entry["path"] != "summarize") for entry in json.loads(QUESTIONS.read_text())]
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the router fast path against known routes")
+    parser.add_argument("--verbose", action="store_true", help="Print the decision for every question")
+    args = parser.parse_args()
+
+    from optcg.agents.analysis.route_rules import RouteClassifier
+    classifier = RouteClassifier(enabled=True)
+    table = [("prompt", *case) for case in prompt_examples()] + [("corpus", *case) for case in corpus_questions()] \
+        + [("misroute", *case) for case in KNOWN_MISROUTES]
+
+    misrouted = 0
+    for source, question, expected in table:
+        decision = classifier.classify(question)
+        wrong = decision is not None and decision != expected
+        misrouted += wrong
+        if wrong or args.verbose:
+            print(f"{'FAIL' if wrong else 'ok  '} [{source}] {question!r}: expected {expected}, fast path {decision}")
+
+    stats = classifier.stats()
+    print(f"{len(table)} questions: {stats['rule_decisions'] + stats['board_decisions']} decided by the fast path "
+          f"({stats['fast_path_rate']:.0%}), {stats['llm_fallbacks']} left to the LLM router, {misrouted} misrouted")
+    print("FAIL" if misrouted else "OK")
+    sys.exit(1 if misrouted else 0)
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,20 @@ The primary graph orchestration between the agents.
 Contains utility functions to interact with the graph.
 """
 
-from .graph import multi_agent_graph
-from .utils import chat, display_graph
+from .graph import get_multi_agent_graph, warmup
+from .utils import chat, achat, astream_chat, display_graph
 
 __all__ = [
-    "multi_agent_graph",
+    "get_multi_agent_graph",
+    "warmup",
     "chat",
+    "achat",
+    "astream_chat",
     "display_graph"
-    ]
\ No newline at end of file
+    ]
+
+def __getattr__(name):
+    """Backwards compatible, lazily built `multi_agent_graph` package attribute."""
+    if name == "multi_agent_graph":
+        return get_multi_agent_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
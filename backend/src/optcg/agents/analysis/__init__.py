@@ -1,5 +1,6 @@
 """Board State Analysis Agent Graph"""
 
-from .analysis_graph import analysis_agent
+from .analysis_graph import get_analysis_agent
+from .route_rules import route_classifier
 
-__all__ = ["analysis_agent"]
\ No newline at end of file
+__all__ = ["get_analysis_agent", "route_classifier"]
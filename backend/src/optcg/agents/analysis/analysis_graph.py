@@ -3,74 +3,122 @@ An agentic workflow to retrieve the current board state from the user.
 Depending on the user's question, the agent may extract detailed information from the board state or summarize it.
 """
 
+import asyncio
 import logging
+import os
+from itertools import zip_longest
 from typing import Literal
 from langchain.chat_models import init_chat_model
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.types import Command
 from langgraph.graph import StateGraph, START, MessagesState
 
 # Custom Imports
-from ..tools import create_rulebook_retriever_tool, get_board_tool_http
-from ..utils import get_latest_user_message
+from optcg.analysis_cache import analysis_cache
+from optcg.board_serializer import serialize_board
+from optcg.llm_gateway import gated
+from optcg.rulebook_retrieval import select_within_budget
+from ..tools import get_rulebook_retriever, load_board
+from ..context_window import window_messages
+from ..utils import get_latest_user_message, lazy
 from .analysis_schemas import AnalysisState, AnalysisRouterSchema, AnalysisExtractorSchema
+from .route_rules import route_classifier
+from .speculation import end_speculation, get_speculation, start_speculation
 from .analysis_prompts import (ANALYSIS_ROUTER_SYSTEM_PROMPT, ANALYSIS_ROUTER_USER_PROMPT, 
                                ANALYSIS_STATE_SUMMARY_SYSTEM_PROMPT, ANALYSIS_STATE_SUMMARY_USER_PROMPT, 
                                ANALYSIS_EXTRACTION_SYSTEM_PROMPT, ANALYSIS_EXTRACTION_USER_PROMPT, 
                                ANALYSIS_ADVISOR_SYSTEM_PROMPT, ANALYSIS_ADVISOR_USER_PROMPT
 )
 
-# Initialize LLMs
-llm_router = init_chat_model(model="openai:gpt-5-nano")
-llm_router = llm_router.with_structured_output(AnalysisRouterSchema)
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "3000")) # Max tokens of rulebook context given to the advisor
+ANALYSIS_GRAPH_TOPOLOGY = os.getenv("ANALYSIS_GRAPH_TOPOLOGY", "parallel") # "parallel" or "sequential"
 
-llm_state_summarizer = init_chat_model(model="openai:gpt-5-nano")
+# Initialize LLMs lazily, on first use. Structured-output LLMs are tagged "nostream" so their JSON is not streamed to the user
+@lazy
+def get_llm_router():
+    return gated(init_chat_model(model="openai:gpt-5-nano")).with_structured_output(AnalysisRouterSchema).with_config(tags=["nostream"])
 
-llm_extractor = init_chat_model(model="gpt-4.1", temperature=0)
-llm_extractor = llm_extractor.with_structured_output(AnalysisExtractorSchema)
+@lazy
+def get_llm_state_summarizer():
+    return gated(init_chat_model(model="openai:gpt-5-nano"))
 
-retriever = create_rulebook_retriever_tool()
+@lazy
+def get_llm_extractor():
+    return gated(init_chat_model(model="gpt-4.1", temperature=0)).with_structured_output(AnalysisExtractorSchema).with_config(tags=["nostream"])
 
-llm_advisor = init_chat_model(model="openai:gpt-5-mini")
+@lazy
+def get_llm_advisor():
+    return gated(init_chat_model(model="openai:gpt-5-mini"))
 
 # Define the functions for each node in the state graph
-def boardstate_retrieval(state: MessagesState) -> Command[Literal["router", "__end__"]]:
-    """Retrieves the current board state using the get_board_tool."""
+# Nodes return only their new messages, which the `add_messages` reducer appends to the history
+def boardstate_retrieval(state: MessagesState, config: RunnableConfig) -> Command[Literal["router", "summarize_board", "rule_retriever", "advisor", "__end__"]]:
+    """
+    Retrieves the board state of the chat thread. In-process by default, see `load_board` for injecting another source.
+    If the question was already analyzed on this board, skips the router, extraction and retrieval already cached.
+    """
 
-    board = get_board_tool_http.invoke("") # TODO: Replace tool later
+    board = load_board(config)
 
     if board.get("error"): # No board state found
         goto = "__end__"
         update = {
             "board": None,
-            "messages": state["messages"] + [{
+            "messages": [{
                 "role": "assistant",
                 "content": "There was an attempt to retrieve the board state, but none was found. Please update the board state and try again.",
             }]
         }
         logging.info("No board state found for user. Was it updated?")
     else:
+        fingerprint = serialize_board(board).fingerprint
         goto = "router"
         update = {
-            "board": board
+            "board": board,
+            "board_fingerprint": fingerprint,
             }
+        cached = analysis_cache.get(fingerprint, get_latest_user_message(state))
+        if cached and "rule_retrieval" in cached:
+            if not cached["rule_retrieval"]:
+                goto = "summarize_board"
+            elif cached.get("retrieval"):
+                goto = "advisor"
+                update.update(extraction=cached.get("extraction"), retrieval=cached["retrieval"])
+            elif cached.get("extraction"):
+                goto = "rule_retriever"
+                update.update(extraction=cached["extraction"])
+            logging.debug(f"Analysis cache hit, skipping to {goto}")
     return Command(goto=goto, update=update)
 
+def cache_analysis(state: AnalysisState, **results):
+    """Store intermediate results of this question on this board in the analysis cache."""
+    if state.get("board_fingerprint"):
+        analysis_cache.update(state["board_fingerprint"], get_latest_user_message(state), **results)
+
+def router_messages(state: AnalysisState) -> list[dict]:
+    return [
+        {"role": "system", "content": ANALYSIS_ROUTER_SYSTEM_PROMPT},
+        {"role": "user", "content": ANALYSIS_ROUTER_USER_PROMPT.format(question=get_latest_user_message(state))},
+    ]
+
+def extraction_messages(state: AnalysisState) -> list[dict]:
+    return [
+        {"role": "system", "content": ANALYSIS_EXTRACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": ANALYSIS_EXTRACTION_USER_PROMPT.format(
+            board=serialize_board(state["board"]).text, question=get_latest_user_message(state)
+        )},
+    ]
+
 def boardstate_router(state: AnalysisState) -> Command[Literal["extract_board", "summarize_board"]]:
     """Decides whether to extract detailed information from the board state or to summarize it based on the user's question."""
 
-    user_prompt = ANALYSIS_ROUTER_USER_PROMPT.format(
-        question=get_latest_user_message(state)
-    )
-
-    system_prompt = ANALYSIS_ROUTER_SYSTEM_PROMPT
+    # Obvious questions are routed by local rules, the LLM only decides the ambiguous ones
+    rule_retrieval = route_classifier.classify(get_latest_user_message(state))
+    if rule_retrieval is None:
+        rule_retrieval = get_llm_router().invoke(router_messages(state)).rule_retrieval # type: ignore
 
-    result = llm_router.invoke([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
-    )
-    
-    if result.rule_retrieval: # type: ignore
+    cache_analysis(state, rule_retrieval=rule_retrieval)
+    if rule_retrieval:
         goto = "extract_board"
         updates = {}
     else:
@@ -84,22 +132,22 @@ def summarize_board_state(state: AnalysisState) -> Command[Literal["__end__"]]:
     logging.debug(f"Summarizing board state for user question...")
     if not state["board"]:
         logging.debug("summarize_board_state node reached with empty board — this should not happen")
-        return Command(goto="__end__", update={"messages": state["messages"] + [{"role": "assistant", "content": "(Error) No board state available."}]}) # type: ignore
+        return Command(goto="__end__", update={"messages": [{"role": "assistant", "content": "(Error) No board state available."}]}) # type: ignore
 
     user_prompt = ANALYSIS_STATE_SUMMARY_USER_PROMPT.format(
-        board=state["board"],
+        board=serialize_board(state["board"]).text,
         question=get_latest_user_message(state)
     )
 
     system_prompt = ANALYSIS_STATE_SUMMARY_SYSTEM_PROMPT
 
-    summary = llm_state_summarizer.invoke([
+    summary = get_llm_state_summarizer().invoke([
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ]
     )
 
-    return Command(goto="__end__", update={"messages": state["messages"] + [{"role": "assistant", "content": summary.content}]})
+    return Command(goto="__end__", update={"messages": [{"role": "assistant", "content": summary.content}]})
 
 def extract_board_state(state: AnalysisState) -> Command[Literal["rule_retriever"]]:
     """Extracts the board state from the input state."""
@@ -107,20 +155,11 @@ def extract_board_state(state: AnalysisState) -> Command[Literal["rule_retriever
     logging.debug(f"Extracting board state for user question...")
     if not state["board"]:
         logging.debug("extract_board_state nodereached with empty board — this should not happen")
-        return Command(goto="__end__", update={"messages": state["messages"] + [{"role": "assistant", "content": "(Error) No board state available."}]}) # type: ignore
-
-    user_prompt = ANALYSIS_EXTRACTION_USER_PROMPT.format(
-        board=state["board"], question=get_latest_user_message(state)
-    )
+        return Command(goto="__end__", update={"messages": [{"role": "assistant", "content": "(Error) No board state available."}]}) # type: ignore
 
-    system_prompt = ANALYSIS_EXTRACTION_SYSTEM_PROMPT
-
-    extraction = llm_extractor.invoke([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
-    )
+    extraction = get_llm_extractor().invoke(extraction_messages(state))
 
+    cache_analysis(state, extraction=extraction.queries) # type: ignore
     return Command(goto="rule_retriever", update={"extraction": extraction.queries}) # type: ignore
 
 def rulebook_retriever(state: AnalysisState) -> Command[Literal["advisor"]]:
@@ -128,14 +167,11 @@ def rulebook_retriever(state: AnalysisState) -> Command[Literal["advisor"]]:
 
     if not state["extraction"]:
         logging.debug("rulebook_retriever node reached with empty extraction — this should not happen")
-        return Command(goto="__end__", update={"messages": state["messages"] + [{"role": "assistant", "content": "(Error) No extraction queries available."}]}) # type: ignore
+        return Command(goto="__end__", update={"messages": [{"role": "assistant", "content": "(Error) No extraction queries available."}]}) # type: ignore
     
-    results = []
-    for query in state["extraction"]:
-        result = retriever.invoke(query)
-        results.append(result)
-
-    combined_results = "\n\n".join(results)
+    # One embedding request and one vector search for all queries, deduplicated and trimmed to the token budget
+    combined_results = get_rulebook_retriever().retrieve_context(state["extraction"], token_budget=RETRIEVAL_TOKEN_BUDGET)
+    cache_analysis(state, retrieval=combined_results)
 
     return Command(goto="advisor", update={"retrieval": combined_results})
 
@@ -144,10 +180,10 @@ def advisor(state: AnalysisState) -> Command[Literal["__end__"]]:
 
     if not state["board"] or not state["retrieval"]:
         logging.debug("advisor node reached with empty board or rule retrieval — this should not happen")
-        return Command(goto="__end__", update={"messages": state["messages"] + [{"role": "assistant", "content": "(Error) Missing board state or rule retrieval information."}]})
+        return Command(goto="__end__", update={"messages": [{"role": "assistant", "content": "(Error) Missing board state or rule retrieval information."}]})
 
     user_prompt = ANALYSIS_ADVISOR_USER_PROMPT.format(
-        board=state["board"],
+        board=serialize_board(state["board"]).text,
         question=get_latest_user_message(state)
     )
 
@@ -155,27 +191,184 @@ def advisor(state: AnalysisState) -> Command[Literal["__end__"]]:
         retrieval=state["retrieval"]
     )
 
-    messages = [{"role": "system", "content": system_prompt}] + state["messages"] + [{"role": "user", "content": user_prompt}]
+    # The latest turns and a rolling summary of older ones, not the whole conversation
+    messages = [{"role": "system", "content": system_prompt}] + window_messages(state["messages"]) + [{"role": "user", "content": user_prompt}]
 
-    response = llm_advisor.invoke(messages)
+    response = get_llm_advisor().invoke(messages)
 
     return Command(
         goto="__end__", 
         update={
-            "messages": state["messages"] + [{"role": "assistant", "content": response.content}]
+            "messages": [{"role": "assistant", "content": response.content}]
         }
     )
 
 
-# Define the agent builder
-analysis_agent = (
-    StateGraph(AnalysisState, input_schema=MessagesState)
-    .add_node("retrieve_board", boardstate_retrieval)
-    .add_node("router", boardstate_router)
-    .add_node("summarize_board", summarize_board_state)
-    .add_node("extract_board", extract_board_state)
-    .add_node("rule_retriever", rulebook_retriever)
-    .add_node("advisor", advisor)
-    .add_edge(START, "retrieve_board")
-    .compile()
-)
\ No newline at end of file
+# Parallel topology: retrieve_board fans out to three branches that run at the same time
+#   router                              decides whether rules are needed at all
+#   extract_board -> rule_retriever     speculative: extraction queries, then their rulebook chunks
+#   speculative_retrieval               speculative: rulebook chunks for the raw question
+# `join` is deferred until every branch finished, then dispatches to summarize_board or advisor.
+# When the router decides no rules are needed, it cancels the speculative branches' in-flight calls (see `speculation.py`).
+# Nodes have sync and async versions; only the async ones (`ainvoke`/`astream`) can interrupt calls already started.
+# Sync runs (`invoke`/`stream`) cannot stop a cancelled extraction, whose gpt-4.1 call would still be billed on every
+# question the router sends to the summary. They only speculate on the retrieval, and `join` starts the extraction once
+# the router decided rules are needed: no wasted LLM calls, at the cost of the extraction's latency on rule questions.
+
+def parallel_boardstate_retrieval(state: MessagesState, config: RunnableConfig, speculate_extraction: bool = False) -> Command[Literal["router", "extract_board", "speculative_retrieval", "join", "__end__"]]:
+    """
+    `boardstate_retrieval`, then the fan-out, or straight to `join` with the results cached for this question and board
+    or with the router's fast path decision. The extraction is only part of the fan-out with `speculate_extraction`
+    (async runs) or when the fast path already decided rules are needed.
+    """
+    command = boardstate_retrieval(state, config)
+    if command.goto == "__end__":
+        return command
+    # Clear the previous question's intermediate results
+    update = {**command.update, "rule_retrieval": None, "retrieved_chunks": None, "speculative_chunks": None}
+    if command.goto == "router":
+        update.update(extraction=None, retrieval=None)
+        # Obvious questions are routed by local rules: nothing to speculate on, or no router to wait for
+        rule_retrieval = route_classifier.classify(get_latest_user_message(state))
+        if rule_retrieval is not None: # Read back by `boardstate_retrieval` when the question is asked again
+            cache_analysis({**state, **update}, rule_retrieval=rule_retrieval)
+        if rule_retrieval is False:
+            return Command(goto="join", update={**update, "rule_retrieval": False})
+        update["speculation_id"] = start_speculation()
+        if rule_retrieval:
+            return Command(goto=["extract_board", "speculative_retrieval"], update={**update, "rule_retrieval": True})
+        if speculate_extraction:
+            return Command(goto=["router", "extract_board", "speculative_retrieval"], update=update)
+        return Command(goto=["router", "speculative_retrieval"], update=update)
+    update["rule_retrieval"] = command.goto != "summarize_board"
+    return Command(goto="join", update=update)
+
+async def aparallel_boardstate_retrieval(state: MessagesState, config: RunnableConfig) -> Command:
+    """Async `parallel_boardstate_retrieval`, which speculates on the extraction: cancelling it stops its LLM call."""
+    return await asyncio.to_thread(parallel_boardstate_retrieval, state, config, True)
+
+def route_update(state: AnalysisState, rule_retrieval: bool) -> dict:
+    cache_analysis(state, rule_retrieval=rule_retrieval)
+    if not rule_retrieval:
+        get_speculation(state.get("speculation_id")).cancel()
+    return {"rule_retrieval": rule_retrieval}
+
+def parallel_router(state: AnalysisState) -> dict:
+    return route_update(state, get_llm_router().invoke(router_messages(state)).rule_retrieval) # type: ignore
+
+async def aparallel_router(state: AnalysisState) -> dict:
+    return route_update(state, (await get_llm_router().ainvoke(router_messages(state))).rule_retrieval) # type: ignore
+
+def extraction_update(state: AnalysisState, extraction) -> dict:
+    if extraction is None: # Cancelled
+        return {}
+    cache_analysis(state, extraction=extraction.queries)
+    return {"extraction": extraction.queries}
+
+def speculative_extraction(state: AnalysisState) -> dict:
+    speculation = get_speculation(state.get("speculation_id"))
+    return extraction_update(state, speculation.run_sync(get_llm_extractor().invoke, extraction_messages(state)))
+
+async def aspeculative_extraction(state: AnalysisState) -> dict:
+    speculation = get_speculation(state.get("speculation_id"))
+    return extraction_update(state, await speculation.run(get_llm_extractor().ainvoke(extraction_messages(state))))
+
+def retrieve_chunks(queries: list[str]) -> list[str]:
+    """Ranked rulebook chunks for the queries, within the advisor's token budget."""
+    documents = get_rulebook_retriever().retrieve_batch(queries)
+    return select_within_budget([document.page_content for document in documents], RETRIEVAL_TOKEN_BUDGET)
+
+def speculative_rule_retriever(state: AnalysisState) -> dict:
+    if not state.get("extraction"):
+        return {}
+    chunks = get_speculation(state.get("speculation_id")).run_sync(retrieve_chunks, state["extraction"])
+    return {} if chunks is None else {"retrieved_chunks": chunks}
+
+async def aspeculative_rule_retriever(state: AnalysisState) -> dict:
+    if not state.get("extraction"):
+        return {}
+    chunks = await get_speculation(state.get("speculation_id")).run(asyncio.to_thread(retrieve_chunks, state["extraction"]))
+    return {} if chunks is None else {"retrieved_chunks": chunks}
+
+def speculative_retrieval(state: AnalysisState) -> dict:
+    chunks = get_speculation(state.get("speculation_id")).run_sync(retrieve_chunks, [get_latest_user_message(state)])
+    return {} if chunks is None else {"speculative_chunks": chunks}
+
+async def aspeculative_retrieval(state: AnalysisState) -> dict:
+    chunks = await get_speculation(state.get("speculation_id")).run(asyncio.to_thread(retrieve_chunks, [get_latest_user_message(state)]))
+    return {} if chunks is None else {"speculative_chunks": chunks}
+
+def join_branches(state: AnalysisState) -> Command[Literal["summarize_board", "extract_board", "rule_retriever", "advisor", "__end__"]]:
+    """Fan-in of the parallel branches: dispatches on the router's decision and merges the chunks of both retrievals."""
+    end_speculation(state.get("speculation_id"))
+    if not state.get("rule_retrieval"):
+        return Command(goto="summarize_board")
+    if state.get("retrieval"): # Cached
+        return Command(goto="advisor")
+    if state.get("extraction") is None: # Not speculated on (sync runs): extract now, then join again
+        return Command(goto="extract_board")
+    if state.get("extraction") and state.get("retrieved_chunks") is None and state.get("speculative_chunks") is None: # Cached extraction
+        return Command(goto="rule_retriever")
+
+    # Alternate between the two rankings, so both the extracted queries and the question itself are covered
+    chunks = [chunk for pair in zip_longest(state.get("retrieved_chunks") or [], state.get("speculative_chunks") or []) for chunk in pair if chunk]
+    if not chunks:
+        logging.debug("join node found no rulebook chunks")
+        return Command(goto="__end__", update={"messages": [{"role": "assistant", "content": "(Error) No rule retrieval information available."}]})
+    retrieval = "\n\n".join(select_within_budget(chunks, RETRIEVAL_TOKEN_BUDGET))
+    cache_analysis(state, retrieval=retrieval)
+    return Command(goto="advisor", update={"retrieval": retrieval})
+
+
+# Define the agent builders
+def build_sequential_analysis_graph():
+    """retrieve_board -> router -> extract_board -> rule_retriever -> advisor, one node at a time."""
+    return (
+        StateGraph(AnalysisState, input_schema=MessagesState)
+        .add_node("retrieve_board", boardstate_retrieval)
+        .add_node("router", boardstate_router)
+        .add_node("summarize_board", summarize_board_state)
+        .add_node("extract_board", extract_board_state)
+        .add_node("rule_retriever", rulebook_retriever)
+        .add_node("advisor", advisor)
+        .add_edge(START, "retrieve_board")
+        .compile()
+    )
+
+def build_parallel_analysis_graph():
+    """The router, extraction and retrieval at the same time, see above."""
+    return (
+        StateGraph(AnalysisState, input_schema=MessagesState)
+        .add_node("retrieve_board", RunnableLambda(parallel_boardstate_retrieval, afunc=aparallel_boardstate_retrieval),
+                  destinations=("router", "extract_board", "speculative_retrieval", "join", "__end__"))
+        .add_node("router", RunnableLambda(parallel_router, afunc=aparallel_router))
+        .add_node("extract_board", RunnableLambda(speculative_extraction, afunc=aspeculative_extraction))
+        .add_node("rule_retriever", RunnableLambda(speculative_rule_retriever, afunc=aspeculative_rule_retriever))
+        .add_node("speculative_retrieval", RunnableLambda(speculative_retrieval, afunc=aspeculative_retrieval))
+        .add_node("join", join_branches, defer=True)
+        .add_node("summarize_board", summarize_board_state)
+        .add_node("advisor", advisor)
+        .add_edge(START, "retrieve_board")
+        .add_edge("router", "join")
+        .add_edge("extract_board", "rule_retriever")
+        .add_edge("rule_retriever", "join")
+        .add_edge("speculative_retrieval", "join")
+        .compile()
+    )
+
+def build_analysis_graph(topology: str = ANALYSIS_GRAPH_TOPOLOGY):
+    if topology == "parallel":
+        return build_parallel_analysis_graph()
+    if topology == "sequential":
+        return build_sequential_analysis_graph()
+    raise ValueError(f"Unknown ANALYSIS_GRAPH_TOPOLOGY: {topology!r} (expected 'parallel' or 'sequential')")
+
+@lazy
+def get_analysis_agent():
+    return build_analysis_graph()
+
+def __getattr__(name):
+    """Backwards compatible, lazily built `analysis_agent` module attribute."""
+    if name == "analysis_agent":
+        return get_analysis_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -9,8 +9,14 @@ class AnalysisStateInput(MessagesState):
 
 class AnalysisState(MessagesState):
     board: dict | None
+    board_fingerprint: Optional[str] # Key of the board in the analysis cache
     extraction: Optional[List[str]]
     retrieval: Optional[str] 
+    # Parallel topology only
+    rule_retrieval: Optional[bool] # The router's decision
+    speculation_id: Optional[str] # See `speculation.py`
+    retrieved_chunks: Optional[List[str]] # Rulebook chunks for the extraction queries
+    speculative_chunks: Optional[List[str]] # Rulebook chunks for the raw question
 
 class AnalysisExtractorSchema(BaseModel):
     queries: List[str]
@@ -0,0 +1,96 @@
+"""
+Rule-based fast path for the analysis router.
+Most questions plainly ask either about the board ("what is the board state", "how many cards are in my hand") or about
+how to play or what the rules allow ("how should I play this card", "can my Blocker block"). Such questions are routed
+by keyword and regex rules in microseconds; questions matching both kinds of rules, or neither, go to the LLM router,
+as do questions about attacks, counters, winning or options, which read like board questions but need the rules
+("how many counters does my opponent need to survive my attack?"). Check changes with `benchmarks/route_rules.py`.
+"""
+
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+ROUTER_FAST_PATH = os.getenv("ROUTER_FAST_PATH", "true").lower() == "true" # Otherwise every question goes to the LLM
+
+_BOARD_NOUNS = r"(board|board state|leader|life|hand|field|stage|trash|deck|don!*|characters?|cards?)"
+_OWNERS = r"((my|the|their|opponent'?s?|the opponent'?s|enemy'?s?) )*"
+
+# Questions answered from the board state alone
+BOARD_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r"\bboard state\b",
+    rf"\bhow (many|much) {_OWNERS}{_BOARD_NOUNS}\b",
+    rf"\b(summari[sz]e|summary of|overview of|describe|list|show( me)?|tell me about) {_OWNERS}(current |whole )?{_BOARD_NOUNS}\b",
+    rf"\b(what|which|who)('s| is| are)? {_OWNERS}(current )?{_BOARD_NOUNS}\b",
+    rf"\b(what|which|who)('s| is| are) (in|on) {_OWNERS}{_BOARD_NOUNS}\b",
+    r"\b(what|which) .*\b(in play|on the field|on (my|their|the opponent'?s) (side|field|board)|in (my|their|the opponent'?s) (hand|trash|life))\b",
+    r"\b(what|which) .* (does|do) (my|the)? ?(opponent|they|i) have\b",
+    r"\b(power|cost|life total|rested|active)\b.*\b(of|is|are)\b.*\?$",
+]]
+
+# Questions that need rulebook information
+RULE_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r"\brules?\b",
+    r"\b(allowed|legal|illegal|permitted)\b",
+    r"\b(can|could|may) (i|my|we|you|it|they|the|a|an|this|that)\b",
+    r"\bhow (should|do|does|can|could|would|to) ",
+    r"\b(should|shall) (i|we)\b",
+    r"\b(what happens|why|when does|when can|does .* (work|trigger|resolve|apply))\b",
+    r"\b(best|optimal|next) (move|play|line|attack)\b",
+    r"\b(trigger|counter step|blocker step|battle|damage step|on play|when attacking|on k\.?o\.?|activate: main|once per turn)\b",
+    r"\[(blocker|rush|double attack|banish|trigger|counter|on play|when attacking|activate: main|main|on k\.o\.)\]",
+    r"\b(rush|double attack|banish)\b",
+]]
+
+# Strategy words: a question using them is never routed by the rules above
+AMBIGUOUS_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r"\b(attack(s|ed|ing|er)?|counter(s|ed|ing)?|win(s|ning)?|options?)\b",
+]]
+
+
+class RouteClassifier:
+    """Decides `rule_retrieval` from keyword and regex rules when only one kind of rule matches, otherwise returns None."""
+
+    def __init__(self, enabled: bool = ROUTER_FAST_PATH):
+        self.enabled = enabled
+        self.rule_decisions = 0
+        self.board_decisions = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock() # Graph nodes run in worker threads
+
+    def classify(self, question: str) -> bool | None:
+        """True if the question needs rules, False if the board is enough, None if ambiguous (ask the LLM router)."""
+        if not self.enabled:
+            return None
+        needs_rules = any(pattern.search(question) for pattern in RULE_PATTERNS)
+        board_only = any(pattern.search(question) for pattern in BOARD_PATTERNS)
+        decision = needs_rules if needs_rules != board_only else None
+        if decision is not None and any(pattern.search(question) for pattern in AMBIGUOUS_PATTERNS):
+            decision = None
+        with self._lock:
+            if decision is None:
+                self.fallbacks += 1
+            elif decision:
+                self.rule_decisions += 1
+            else:
+                self.board_decisions += 1
+        logger.debug(f"Router fast path: {question!r} -> {'LLM fallback' if decision is None else decision}")
+        return decision
+
+    def stats(self) -> dict:
+        decided = self.rule_decisions + self.board_decisions
+        total = decided + self.fallbacks
+        return {
+            "enabled": self.enabled,
+            "rule_decisions": self.rule_decisions,
+            "board_decisions": self.board_decisions,
+            "llm_fallbacks": self.fallbacks,
+            "fast_path_rate": round(decided / total, 4) if total else None,
+        }
+
+
+# Shared by both analysis graph topologies and reported by /health
+route_classifier = RouteClassifier()
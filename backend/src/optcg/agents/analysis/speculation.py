@@ -0,0 +1,104 @@
+"""
+Cancellation of the parallel analysis graph's speculative branches.
+The extraction and retrieval branches start alongside the router, before it is known whether they are needed. Each run
+registers a `Speculation` under an ID kept in the graph state; when the router decides no rules are needed, it cancels
+the speculation, which cancels the branches' in-flight LLM and retrieval calls and makes branches not yet started skip.
+Sync calls (`invoke`) cannot be interrupted: they run in a worker thread that is abandoned on cancellation, so the
+branch still returns right away, but the call still runs (and is billed). Sync graph runs therefore only speculate on
+the rulebook retrieval, not on the extraction's LLM call (see `analysis_graph`).
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+MAX_SPECULATIONS = 1024 # Runs that failed before their join never unregister, bound them
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="speculation") # Sync speculative calls
+
+
+class Speculation:
+    """Cancellation flag and in-flight tasks of one run's speculative branches."""
+
+    def __init__(self):
+        self.cancelled = False
+        self._tasks: set[asyncio.Task] = set()
+        self._waiters: set[threading.Event] = set() # Sync callers waiting for their call
+        self._lock = threading.Lock() # The router may run in another thread than the branches (sync `invoke`)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            tasks = list(self._tasks)
+            waiters = list(self._waiters)
+        for waiter in waiters:
+            waiter.set()
+        for task in tasks:
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        if tasks or waiters:
+            logger.debug(f"Cancelled {len(tasks) + len(waiters)} speculative calls")
+
+    async def run(self, awaitable: Awaitable) -> Any | None:
+        """Await a speculative call, or None if the speculation is or gets cancelled."""
+        with self._lock:
+            if self.cancelled:
+                if asyncio.iscoroutine(awaitable):
+                    awaitable.close()
+                return None
+            task = asyncio.ensure_future(awaitable)
+            self._tasks.add(task)
+        try:
+            await asyncio.wait({task}) # Does not raise when `task` is cancelled
+        except asyncio.CancelledError: # The run itself was cancelled
+            task.cancel()
+            raise
+        finally:
+            with self._lock:
+                self._tasks.discard(task)
+        return None if task.cancelled() else task.result()
+
+    def run_sync(self, func: Callable, *args) -> Any | None:
+        """Call a speculative function in a worker thread, or None if the speculation is or gets cancelled."""
+        done = threading.Event()
+        with self._lock:
+            if self.cancelled:
+                return None
+            self._waiters.add(done)
+        context = contextvars.copy_context() # Keep the run's callbacks (tracing) in the worker thread
+        future = _executor.submit(context.run, func, *args)
+        future.add_done_callback(lambda _: done.set())
+        try:
+            done.wait()
+        finally:
+            with self._lock:
+                self._waiters.discard(done)
+        return future.result() if future.done() else None
+
+
+_speculations: OrderedDict[str, Speculation] = OrderedDict()
+_speculations_lock = threading.Lock()
+
+def start_speculation() -> str:
+    """Register a new speculation and return its ID."""
+    speculation_id = uuid.uuid4().hex
+    with _speculations_lock:
+        _speculations[speculation_id] = Speculation()
+        while len(_speculations) > MAX_SPECULATIONS:
+            _speculations.popitem(last=False)
+    return speculation_id
+
+def get_speculation(speculation_id: str | None) -> Speculation:
+    """The registered speculation, or a fresh one when there is none (e.g. a branch reached from a cached result)."""
+    with _speculations_lock:
+        return _speculations.get(speculation_id or "") or Speculation()
+
+def end_speculation(speculation_id: str | None):
+    with _speculations_lock:
+        _speculations.pop(speculation_id or "", None)
@@ -0,0 +1,144 @@
+"""
+Context-window management for the agents' LLM calls.
+The model sees the last `CONTEXT_WINDOW_TURNS` turns of the conversation (fewer if they exceed the token budget),
+preceded by a rolling summary of everything older. The stored message history itself is not modified.
+
+Summaries are rolling and written after the response, not before the model calls: `aupdate_context_summary` runs in
+the background after each chat turn and, once the turns evicted from the window since the last summary reach
+`CONTEXT_SUMMARY_MIN_TOKENS`, summarizes them on top of the previous summary. The summary is kept in the thread's
+state as a system message (`SUMMARY_MESSAGE_ID`), so every worker reads it, and the window hook only slices messages:
+turns evicted since the last summary are passed verbatim until the next one covers them.
+"""
+
+import logging
+import os
+from langchain.chat_models import init_chat_model
+from langchain_core.messages import BaseMessage, SystemMessage
+
+# Custom Imports
+from optcg.llm_gateway import gated
+from optcg.tokens import count_tokens
+from .utils import lazy
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_WINDOW_TURNS = int(os.getenv("CONTEXT_WINDOW_TURNS", "6")) # Latest turns given to the model verbatim
+CONTEXT_WINDOW_TOKEN_BUDGET = int(os.getenv("CONTEXT_WINDOW_TOKEN_BUDGET", "4000")) # Max tokens of those turns
+CONTEXT_SUMMARY_ENABLED = os.getenv("CONTEXT_SUMMARY_ENABLED", "true").lower() == "true" # Otherwise older turns are dropped
+CONTEXT_SUMMARY_MIN_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MIN_TOKENS", "800")) # Evicted tokens that trigger a new summary
+SUMMARY_MESSAGE_ID = "context-summary" # ID of the summary message in a thread's history
+SUMMARY_INPUT_CHARS_PER_MESSAGE = 1500 # Long tool results are clipped before summarizing
+
+CONTEXT_SUMMARY_SYSTEM_PROMPT = """
+< Role >
+You maintain a running summary of a conversation between a user and One Piece TCG assistants.
+</ Role >
+
+< Instructions >
+Update the current summary with the new messages. Keep the user's goals, questions, decisions and any facts about their board or deck that later questions may refer to. Drop greetings, retrieved rule text and repeated details. Answer with the updated summary only, in at most 150 words.
+</ Instructions >
+"""
+
+@lazy
+def get_llm_summarizer():
+    return gated(init_chat_model(model="openai:gpt-5-nano")).with_config(tags=["nostream"]) # Not part of the answer stream
+
+def message_tokens(message: BaseMessage) -> int:
+    return count_tokens(message.content if isinstance(message.content, str) else str(message.content))
+
+def split_turns(messages: list[BaseMessage]) -> list[list[BaseMessage]]:
+    """Split a history into turns, each starting at a human message (messages before the first one form their own turn)."""
+    turns: list[list[BaseMessage]] = []
+    for message in messages:
+        if message.type == "human" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+def _format_for_summary(messages: list[BaseMessage]) -> str:
+    lines = []
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        if content:
+            lines.append(f"{message.type}: {content[:SUMMARY_INPUT_CHARS_PER_MESSAGE]}")
+    return "\n".join(lines)
+
+def split_summary(messages: list[BaseMessage]) -> tuple[BaseMessage | None, list[BaseMessage]]:
+    """The thread's summary message, if any, and the conversation without it."""
+    summary = next((message for message in messages if message.id == SUMMARY_MESSAGE_ID), None)
+    return summary, [message for message in messages if message.id != SUMMARY_MESSAGE_ID]
+
+def summarized_count(messages: list[BaseMessage]) -> int:
+    """
+    How many leading messages of the conversation (without the summary message) the summary covers. Covered messages
+    that history compaction removed are not counted: the summary still holds them.
+    """
+    summary, conversation = split_summary(messages)
+    through = summary.additional_kwargs.get("summarized_through") if summary is not None else None
+    return next((index + 1 for index, message in enumerate(conversation) if message.id == through), 0)
+
+def split_window(conversation: list[BaseMessage], max_turns: int = CONTEXT_WINDOW_TURNS,
+                 token_budget: int = CONTEXT_WINDOW_TOKEN_BUDGET) -> tuple[list[BaseMessage], list[BaseMessage]]:
+    """
+    The conversation split into the messages evicted from the window and the window: the latest `max_turns` whole
+    turns that fit in `token_budget` tokens (the latest turn is always kept).
+    """
+    turns = split_turns(conversation)
+    kept = turns[-max_turns:] if max_turns > 0 else turns[-1:]
+    tokens = sum(message_tokens(message) for turn in kept for message in turn)
+    while len(kept) > 1 and tokens > token_budget:
+        tokens -= sum(message_tokens(message) for message in kept[0])
+        kept = kept[1:]
+    window = [message for turn in kept for message in turn]
+    return conversation[: len(conversation) - len(window)], window
+
+def window_messages(messages: list[BaseMessage], max_turns: int = CONTEXT_WINDOW_TURNS, token_budget: int = CONTEXT_WINDOW_TOKEN_BUDGET,
+                    summarize: bool = CONTEXT_SUMMARY_ENABLED) -> list[BaseMessage]:
+    """
+    The messages to send to the model: the latest `max_turns` whole turns that fit in `token_budget` tokens, preceded
+    by the thread's summary of the older turns and the latest older turns it does not cover yet (at most
+    `CONTEXT_SUMMARY_MIN_TOKENS` tokens of them). No LLM call: the summary is updated after the response.
+    """
+    summary, conversation = split_summary(messages)
+    evicted, window = split_window(conversation, max_turns, token_budget)
+    if not summarize:
+        return window
+    pending = split_turns(evicted[summarized_count(messages):])
+    unsummarized, tokens = [], 0
+    for turn in reversed(pending):
+        tokens += sum(message_tokens(message) for message in turn)
+        if tokens > CONTEXT_SUMMARY_MIN_TOKENS:
+            break
+        unsummarized = turn + unsummarized
+    if summary is None:
+        return unsummarized + window
+    return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary.content}")] + unsummarized + window
+
+def context_window_hook(state) -> dict:
+    """`pre_model_hook` for ReAct agents: the model gets the windowed history, the stored history is unchanged."""
+    return {"llm_input_messages": window_messages(state["messages"])}
+
+async def aupdate_context_summary(agent, thread_id: str, min_tokens: int = CONTEXT_SUMMARY_MIN_TOKENS, as_node: str = "chat_agent") -> bool:
+    """
+    Summarize the turns of a thread evicted from the window since its last summary, once they reach `min_tokens`,
+    on top of that summary, and store it in the thread's state (recorded as an update by `as_node`). Returns whether
+    the summary was updated. Runs after the response, see `routes/agent_routes.compact_history`.
+    """
+    if not CONTEXT_SUMMARY_ENABLED:
+        return False
+    config = {"configurable": {"thread_id": thread_id}}
+    messages = (await agent.aget_state(config)).values.get("messages", [])
+    summary, conversation = split_summary(messages)
+    evicted, _ = split_window(conversation)
+    new_messages = evicted[summarized_count(messages):]
+    if not new_messages or sum(message_tokens(message) for message in new_messages) < min_tokens:
+        return False
+
+    response = await get_llm_summarizer().ainvoke([
+        {"role": "system", "content": CONTEXT_SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": f"< Current Summary >\n{summary.content if summary is not None else '(empty)'}\n</ Current Summary >\n\n< New Messages >\n{_format_for_summary(new_messages)}\n</ New Messages >"},
+    ])
+    summary_message = SystemMessage(content=response.content, id=SUMMARY_MESSAGE_ID, additional_kwargs={"summarized_through": new_messages[-1].id})
+    await agent.aupdate_state(config, {"messages": [summary_message]}, as_node=as_node) # Replaces the previous summary, same ID
+    logger.debug(f"Summarized {len(new_messages)} messages of thread {thread_id}")
+    return True
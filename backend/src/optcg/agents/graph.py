@@ -1,22 +1,37 @@
 """
 The primary graph orchestration between the agents.
 The chat agent is the primary agent, which can hand off to other agents as needed.
+The graph and its sub-agents are built lazily (and thread-safely) on first use, not at import time.
 """
 
 from langgraph.graph import StateGraph, START, MessagesState
-from langgraph.checkpoint.memory import InMemorySaver
-from langgraph.graph import MessagesState
 
 # Custom Imports
-from .analysis import analysis_agent
-from .react import chat_agent, rulebook_agent
+from optcg.checkpointer import get_checkpointer
+from .analysis import get_analysis_agent
+from .react import get_chat_agent, get_rulebook_agent, get_cached_rulebook_agent, get_rulebook_answer_cache
+from .utils import lazy
 
 # Define the multi-agent graph
-multi_agent_graph = (
-    StateGraph(MessagesState)
-    .add_node("chat_agent", chat_agent)
-    .add_node("rulebook_agent", rulebook_agent)
-    .add_node("board_analyst", analysis_agent)
-    .add_edge(START, "chat_agent")
-    .compile(checkpointer=InMemorySaver())
-)
\ No newline at end of file
+@lazy
+def get_multi_agent_graph():
+    return (
+        StateGraph(MessagesState)
+        .add_node("chat_agent", get_chat_agent())
+        .add_node("rulebook_agent", get_cached_rulebook_agent()) # Rulebook agent behind the semantic answer cache
+        .add_node("board_analyst", get_analysis_agent())
+        .add_edge(START, "chat_agent")
+        .compile(checkpointer=get_checkpointer()) # Persistent (SQLite) and bounded, see `optcg.checkpointer`
+    )
+
+def warmup():
+    """Build the multi-agent graph and its sub-agents, and open the rulebook vector store, ahead of the first request."""
+    get_rulebook_agent() # Invoked by the cached rulebook agent node, not built with the graph
+    get_rulebook_answer_cache()
+    return get_multi_agent_graph()
+
+def __getattr__(name):
+    """Backwards compatible, lazily built `multi_agent_graph` module attribute."""
+    if name == "multi_agent_graph":
+        return get_multi_agent_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
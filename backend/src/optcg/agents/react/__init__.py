@@ -1,8 +1,10 @@
 """React Style Agents"""
 
-from .react_agents import chat_agent, rulebook_agent
+from .react_agents import get_chat_agent, get_rulebook_agent, get_cached_rulebook_agent, get_rulebook_answer_cache
 
 __all__ = [
-    "chat_agent",
-    "rulebook_agent"
-    ]
\ No newline at end of file
+    "get_chat_agent",
+    "get_rulebook_agent",
+    "get_cached_rulebook_agent",
+    "get_rulebook_answer_cache"
+    ]
@@ -1,22 +1,109 @@
-"""The ReAct style agents used within the project and workflows."""
+"""
+The ReAct style agents used within the project and workflows.
+Agents are built lazily on first use, so importing this module does not create LLM clients or load the vector store.
+"""
 
+import asyncio
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_openai import ChatOpenAI
+from langgraph.graph import MessagesState
 from langgraph.prebuilt import create_react_agent
 
 # Custom Imports
-from ..tools import transfer_to_board_analyst, transfer_to_rulebook_agent, create_rulebook_retriever_tool
+from optcg.answer_cache import SemanticAnswerCache
+from optcg.llm_gateway import gated
+from optcg.vectorstore_logic import get_manifest_hash
+from ..tools import transfer_to_board_analyst, transfer_to_rulebook_agent, get_rulebook_retriever_tool, get_rulebook_vectorstore
+from ..context_window import context_window_hook
+from ..utils import get_latest_user_message, lazy
 from .react_prompts import CHAT_AGENT_PROMPT, RULEBOOK_AGENT_PROMPT
 
-chat_agent = create_react_agent(
-            model=ChatOpenAI(model="gpt-4.1", temperature=0),
+@lazy
+def get_chat_agent():
+    return create_react_agent(
+            model=gated(ChatOpenAI(model="gpt-4.1", temperature=0)),
             name="chat_agent",
             prompt=CHAT_AGENT_PROMPT,
-            tools=[transfer_to_board_analyst, transfer_to_rulebook_agent]
+            tools=[transfer_to_board_analyst, transfer_to_rulebook_agent],
+            pre_model_hook=context_window_hook, # Latest turns plus a rolling summary, see `context_window`
         )
 
-rulebook_agent = create_react_agent(
-            model=ChatOpenAI(model="gpt-4.1", temperature=0),
+@lazy
+def get_rulebook_agent():
+    return create_react_agent(
+            model=gated(ChatOpenAI(model="gpt-4.1", temperature=0)),
             name="rulebook_agent",
             prompt=RULEBOOK_AGENT_PROMPT,
-            tools=[create_rulebook_retriever_tool()]
-        )
\ No newline at end of file
+            tools=[get_rulebook_retriever_tool()],
+            pre_model_hook=context_window_hook,
+        )
+
+# region Rulebook Answer Cache
+
+@lazy
+def get_rulebook_answer_cache():
+    """Semantic cache of rulebook agent answers, dropped whenever the rulebook vector store manifest changes."""
+    return SemanticAnswerCache(get_rulebook_vectorstore().embeddings, version=get_manifest_hash)
+
+def _final_answer(result: dict) -> str | None:
+    """The agent's final answer, if the run ended with a plain AI message (not a tool call or an error)."""
+    final = result["messages"][-1]
+    if final.type == "ai" and not getattr(final, "tool_calls", None) and isinstance(final.content, str) and final.content:
+        return final.content
+    return None
+
+def _cached_answer(answer: str) -> dict:
+    return {"messages": [AIMessage(content=answer, name="rulebook_agent")]}
+
+def _standalone_question(state: MessagesState) -> str | None:
+    """
+    The question of a conversation's first turn, the only one the cache is used for: later questions may depend on
+    earlier turns ("and if it has Blocker?"), so answers to them are neither looked up nor shared with other threads.
+    """
+    if sum(1 for message in state["messages"] if message.type == "human") != 1:
+        return None
+    return get_latest_user_message(state) or None
+
+def rulebook_agent_with_cache(state: MessagesState, config: RunnableConfig) -> dict:
+    """The rulebook agent behind the semantic answer cache: a cached answer to a similar question skips the ReAct loop."""
+    question = _standalone_question(state)
+    if question is None:
+        return get_rulebook_agent().invoke(state, config)
+    cache = get_rulebook_answer_cache()
+    answer = cache.get(question)
+    if answer is not None:
+        return _cached_answer(answer)
+    result = get_rulebook_agent().invoke(state, config)
+    if answer := _final_answer(result):
+        cache.put(question, answer)
+    return result
+
+async def arulebook_agent_with_cache(state: MessagesState, config: RunnableConfig) -> dict:
+    """Async `rulebook_agent_with_cache`. Cache lookups may embed the question, so they run in a worker thread."""
+    question = _standalone_question(state)
+    if question is None:
+        return await get_rulebook_agent().ainvoke(state, config)
+    cache = get_rulebook_answer_cache()
+    answer = await asyncio.to_thread(cache.get, question)
+    if answer is not None:
+        return _cached_answer(answer)
+    result = await get_rulebook_agent().ainvoke(state, config)
+    if answer := _final_answer(result):
+        await asyncio.to_thread(cache.put, question, answer)
+    return result
+
+@lazy
+def get_cached_rulebook_agent():
+    """The rulebook agent node of the multi-agent graph, with the answer cache in front of it."""
+    return RunnableLambda(rulebook_agent_with_cache, afunc=arulebook_agent_with_cache, name="rulebook_agent")
+
+# endregion Rulebook Answer Cache
+
+def __getattr__(name):
+    """Backwards compatible, lazily built `chat_agent` and `rulebook_agent` module attributes."""
+    if name == "chat_agent":
+        return get_chat_agent()
+    if name == "rulebook_agent":
+        return get_rulebook_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
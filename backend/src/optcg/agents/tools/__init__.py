@@ -1,13 +1,19 @@
 """A collection of agent tools"""
 
-from .rulebook_tool import create_rulebook_retriever_tool
-from .get_board_tool import get_board_tool, get_board_tool_http
+from .rulebook_tool import create_rulebook_retriever_tool, get_rulebook_retriever, get_rulebook_retriever_tool, get_rulebook_vectorstore
+from .get_board_tool import get_board_tool, get_board_tool_http, load_board, fetch_board_local, fetch_board_http
 from .handoff_tool import transfer_to_board_analyst, transfer_to_rulebook_agent
 
 __all__ = [
     "create_rulebook_retriever_tool",
+    "get_rulebook_retriever",
+    "get_rulebook_retriever_tool",
+    "get_rulebook_vectorstore",
     "get_board_tool",
     "get_board_tool_http",
+    "load_board",
+    "fetch_board_local",
+    "fetch_board_http",
     "transfer_to_board_analyst",
     "transfer_to_rulebook_agent"
 ]
\ No newline at end of file
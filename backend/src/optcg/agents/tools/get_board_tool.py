@@ -1,47 +1,91 @@
-"""Board state retrieval tool. The HTTP request version is the current implementation. Future versions may (will) use a different approach."""
+"""
+Board state retrieval. The board is read in-process from the board store by default.
+The HTTP version (a pooled request to the API's `/board/` endpoint) is only for remote deployments, where the agents
+run in a different process than the API (`BOARD_ACCESS=http`).
+"""
 
-from asyncio.log import logger
 import os
+from typing import Callable
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 
 # Custom Imports
-from optcg import state
+from optcg.board_store import board_for_agents, get_board_store
+from ..utils import lazy
+
+logger = logging.getLogger(__name__)
 
 api_base_url = os.getenv("API_BASE_URL", "http://localhost:8000")
+BOARD_ACCESS = os.getenv("BOARD_ACCESS", "local") # "local" (in-process board store) or "http" (remote API)
+BOARD_HTTP_TIMEOUT = float(os.getenv("BOARD_HTTP_TIMEOUT", "5")) # Seconds, for connecting and for reading
 
+NO_BOARD_ERROR = {"error": "No board state found. Please tell user to update the board state first."}
 
-# Primary tool to get the current board state
-# Depends on the process memory or state management to store the current board state
-@tool
-def get_board_tool() -> dict:
-    """Retrieves the game board state set up by the user for the One Piece TCG.
 
-    Returns:
-      The current board state as a JSON object or an error message if no board state is set."""
-    if state.current_board_state is None:
+def get_thread_id(config: RunnableConfig | None) -> str | None:
+    """The chat thread ID of the run, which is the board store session ID."""
+    return (config or {}).get("configurable", {}).get("thread_id")
+
+def fetch_board_local(thread_id: str | None) -> dict:
+    """The board of the chat thread from the in-process board store, or an error dict if no board state is set."""
+    board = get_board_store().resolve(thread_id)
+    if board is None:
         logger.debug("No board state found. Returning 404.")
-        return {"error": "No board state found. Please tell user to update the board state first."}
-    return state.current_board_state
+        return dict(NO_BOARD_ERROR)
+    return board_for_agents(board)
 
-# Old version that uses HTTP to get the board state from the API
-# For testing purposes, can be removed later
-@tool 
-def get_board_tool_http() -> dict:
-    """Retrieves the game board state set up by the user for the One Piece TCG.
+@lazy
+def get_http_session() -> requests.Session:
+    """Shared HTTP session, so board requests reuse pooled keep-alive connections to the API."""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=16))
+    session.mount("https://", HTTPAdapter(pool_maxsize=16))
+    return session
 
-    Returns:
-      The current board state as a JSON object or an error message if no board state is set."""
+def fetch_board_http(thread_id: str | None) -> dict:
+    """The board of the chat thread from the API's `/board/` endpoint, or an error dict."""
     response = None
-    print("Getting board state via HTTP...")
     try:
         url = f"{api_base_url}/board/"
-        response = requests.get(url)
+        params = {"agent_view": "true", **({"thread_id": thread_id} if thread_id else {})}
+        response = get_http_session().get(url, params=params, timeout=BOARD_HTTP_TIMEOUT)
         response.raise_for_status()
     except requests.RequestException as e:
-        logging.exception(f"Exception in get_board_tool: {str(e)}")
         if response is not None and response.status_code == 404:
-            return {"error": "No board state found. Please tell user to update the board state first."}
+            return dict(NO_BOARD_ERROR)
+        logger.exception(f"Exception in get_board_tool_http: {str(e)}")
         return {"error": str(e)}
-    return response.json()
\ No newline at end of file
+    return response.json()
+
+def load_board(config: RunnableConfig | None) -> dict:
+    """
+    The board of the run's chat thread, or an error dict.
+    Uses the `board_loader` callable (thread ID -> board) injected in the config's "configurable", if any,
+    otherwise reads the board store in-process, or over HTTP if `BOARD_ACCESS=http`.
+    """
+    loader: Callable[[str | None], dict] | None = (config or {}).get("configurable", {}).get("board_loader")
+    if loader is None:
+        loader = fetch_board_http if BOARD_ACCESS == "http" else fetch_board_local
+    return loader(get_thread_id(config))
+
+# Primary tool to get the current board state
+# Resolves the board of the chat thread (injected `config` carries the thread ID)
+@tool
+def get_board_tool(config: RunnableConfig) -> dict:
+    """Retrieves the game board state set up by the user for the One Piece TCG.
+
+    Returns:
+      The current board state as a JSON object or an error message if no board state is set."""
+    return load_board(config)
+
+# HTTP version, for agents running in a different process than the API
+@tool
+def get_board_tool_http(config: RunnableConfig) -> dict:
+    """Retrieves the game board state set up by the user for the One Piece TCG.
+
+    Returns:
+      The current board state as a JSON object or an error message if no board state is set."""
+    return fetch_board_http(get_thread_id(config))
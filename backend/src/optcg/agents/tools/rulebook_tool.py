@@ -1,20 +1,32 @@
-"""Rulebook Retrieval Tool from the vector store. Must be called as a function to initiate vectorstore loading/creation on first use."""
+"""Rulebook Retrieval Tool from the vector store. The vector store and hybrid retriever are loaded/created lazily on first use and shared by every agent."""
 
 from langchain_core.tools.retriever import create_retriever_tool
 
 # Custom Imports
 from optcg.vectorstore_logic import create_or_load_vectorstore_optcg_rulebooks
+from optcg.rulebook_retrieval import HybridRulebookRetriever
+from ..utils import lazy
 
 
+@lazy
+def get_rulebook_vectorstore():
+    """The single, shared handle to the rulebook vector store. Opened (or created) once per process."""
+    return create_or_load_vectorstore_optcg_rulebooks()
+
+@lazy
+def get_rulebook_retriever():
+    """The shared hybrid (BM25 + dense, with rule-number lookup) retriever over the rulebook vector store."""
+    return HybridRulebookRetriever.from_vectorstore(get_rulebook_vectorstore())
+
 def create_rulebook_retriever_tool():
-    # Ensure the vectorstore is created or loaded
-    vectorstore = create_or_load_vectorstore_optcg_rulebooks()
+    # Ensure the vectorstore is created or loaded, and the hybrid retriever indexes are built
+    retriever = get_rulebook_retriever()
     # Create the retriever tool
     rulebook_retriever_tool = create_retriever_tool(
-    retriever=vectorstore.as_retriever(), # type: ignore
+    retriever=retriever,
     name="rulebooks_retriever",
     description="""Retrieves relevant information from the One Piece TCG rulebooks. This tool is useful for answering questions about the rules of the game, such as how to play, game setup, keywords, and tournament rules.
-    
+
     Args:
       query (str): The query to search for in the rulebooks.
 
@@ -22,4 +34,9 @@ def create_rulebook_retriever_tool():
         A list of relevant document chunks from the rulebooks, or an error message if no relevant information is found.
     """
     )
-    return rulebook_retriever_tool
\ No newline at end of file
+    return rulebook_retriever_tool
+
+@lazy
+def get_rulebook_retriever_tool():
+    """The shared rulebook retriever tool, used by both the rulebook agent and the board analyst."""
+    return create_rulebook_retriever_tool()
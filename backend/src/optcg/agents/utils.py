@@ -1,8 +1,41 @@
 """Utility functions for the agents"""
 
-from typing import Any, Mapping
-from IPython.display import Image
+import functools
+import threading
+from typing import Any, AsyncIterator, Callable, Mapping, TypeVar
 import uuid
+from langchain_core.messages import AIMessageChunk
+
+# Custom Imports
+from optcg.metrics import graph_metrics_handler
+
+T = TypeVar("T")
+_UNSET = object()
+
+def lazy(factory: Callable[[], T]) -> Callable[[], T]:
+    """
+    Thread-safe lazy initialization of a zero-argument factory. The factory runs once, on the first call,
+    and every later call (from any thread) returns the same object. Used to defer building agents, LLM clients
+    and the vector store until they are first needed instead of at import time.
+    A factory that raises or returns None (e.g. the vector store could not be loaded) is retried on the next call.
+    """
+    value: Any = _UNSET
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def get() -> T:
+        nonlocal value
+        if value is _UNSET:
+            with lock:
+                if value is _UNSET: # Another thread may have initialized it while we waited
+                    result = factory()
+                    if result is None:
+                        return result
+                    value = result
+        return value
+
+    get.is_initialized = lambda: value is not _UNSET # type: ignore
+    return get
 
 def get_latest_user_message(state: Mapping[str, Any]) -> str:
     """Extract the most recent human message from the conversation history."""
@@ -14,6 +47,7 @@ def get_latest_user_message(state: Mapping[str, Any]) -> str:
 def display_graph(agent, xray=0):
     """Display the agent's graph structure"""
     try:
+        from IPython.display import Image # Imported here, IPython is only available in notebooks
         return Image(agent.get_graph(xray=xray).draw_mermaid_png())
     except Exception as e:
         print(f"Could not generate graph: {e}")
@@ -26,11 +60,61 @@ def chat(agent, message, thread_id=None, verbose=False):
         
         response = agent.invoke(
             {"messages": [{"role": "user", "content": message}]},
-            config={"configurable": {"thread_id": thread_id}}
+            config={"configurable": {"thread_id": thread_id}, "callbacks": [graph_metrics_handler]}
         )
         
         if verbose:
             return response
         else:
             # Return just the last message content
-            return response["messages"][-1].content
\ No newline at end of file
+            return response["messages"][-1].content
+
+async def achat(agent, message, thread_id=None, verbose=False):
+    """Async `chat`. Runs the workflow with `ainvoke`, so it does not block the event loop of the API."""
+    if thread_id is None:
+        thread_id = str(uuid.uuid4())
+
+    response = await agent.ainvoke(
+        {"messages": [{"role": "user", "content": message}]},
+        config={"configurable": {"thread_id": thread_id}, "callbacks": [graph_metrics_handler]}
+    )
+
+    return response if verbose else response["messages"][-1].content
+
+async def astream_chat(agent, message, thread_id=None) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Stream a chat turn with the agent workflow as (event, data) pairs:
+    - ("node", {"agent", "node", "status"}): a node (of the top-level graph or an agent subgraph) "started" or "completed"
+    - ("handoff", {"from", "to"}): the top-level graph moved to another agent
+    - ("token", {"agent", "node", "content"}): a delta of an LLM response. LLM calls tagged "nostream" (structured output) are not streamed
+    - ("done", {"response", "thread_id"}): the final response, once the workflow finished
+    """
+    if thread_id is None:
+        thread_id = str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": [graph_metrics_handler]}
+    current_agent = None
+
+    async for namespace, mode, chunk in agent.astream(
+        {"messages": [{"role": "user", "content": message}]},
+        config=config,
+        stream_mode=["tasks", "messages"],
+        subgraphs=True,
+    ):
+        # Namespaces look like ("board_analyst:<task id>", ...), the first entry is the top-level agent
+        agent_name = namespace[0].split(":")[0] if namespace else None
+        if mode == "tasks":
+            status = "completed" if "result" in chunk else "started"
+            if not namespace and status == "started":
+                if current_agent is not None and chunk["name"] != current_agent:
+                    yield "handoff", {"from": current_agent, "to": chunk["name"]}
+                current_agent = chunk["name"]
+            yield "node", {"agent": agent_name or chunk["name"], "node": chunk["name"], "status": status}
+        elif mode == "messages":
+            message_chunk, metadata = chunk
+            # Only deltas: complete messages are also emitted when a node returns them, and would repeat the streamed text
+            if isinstance(message_chunk, AIMessageChunk) and isinstance(message_chunk.content, str) and message_chunk.content:
+                yield "token", {"agent": agent_name, "node": metadata.get("langgraph_node"), "content": message_chunk.content}
+
+    final_state = await agent.aget_state(config)
+    messages = final_state.values.get("messages", [])
+    yield "done", {"response": messages[-1].content if messages else "", "thread_id": thread_id}
\ No newline at end of file
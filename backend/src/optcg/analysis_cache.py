@@ -0,0 +1,98 @@
+"""
+Board-aware cache of the board analyst's intermediate results.
+Keyed by the board fingerprint (canonical JSON hash, see `board_serializer.board_fingerprint`) and the normalized
+question, it stores the router decision, the extraction queries and the rulebook retrieval, so re-asking a question
+on an unchanged board skips straight to the advisor. Entries of a board are evicted when that board is replaced.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict, defaultdict
+
+# Custom Imports
+from optcg.answer_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "1024"))
+
+CACHED_FIELDS = ("rule_retrieval", "extraction", "retrieval")
+
+
+class AnalysisCache:
+    """LRU cache of analysis results per (board fingerprint, normalized question), with eviction per board."""
+
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.board_evictions = 0
+        self._lock = threading.Lock() # Graph nodes run in worker threads
+        self._entries: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        self._by_board: dict[str, set[tuple[str, str]]] = defaultdict(set)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, fingerprint: str, question: str) -> dict | None:
+        """The cached results (any of `CACHED_FIELDS`) for the question on this board, or None."""
+        key = (fingerprint, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry)
+
+    def update(self, fingerprint: str, question: str, **results):
+        """Merge results into the entry for the question on this board."""
+        key = (fingerprint, normalize_question(question))
+        with self._lock:
+            self._entries.setdefault(key, {}).update({field: value for field, value in results.items() if field in CACHED_FIELDS})
+            self._entries.move_to_end(key)
+            self._by_board[fingerprint].add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: tuple[str, str]):
+        del self._entries[key]
+        keys = self._by_board.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_board[key[0]]
+
+    def evict_board(self, fingerprint: str) -> int:
+        """Drop every entry of a board, e.g. after the board was replaced. Returns how many were dropped."""
+        with self._lock:
+            keys = self._by_board.pop(fingerprint, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            if keys:
+                self.board_evictions += 1
+                logger.debug(f"Evicted {len(keys)} cached analyses of board {fingerprint[:12]}")
+            return len(keys)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_board.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "boards": len(self._by_board),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "board_evictions": self.board_evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+# Shared by the analysis graph and the board routes
+analysis_cache = AnalysisCache()
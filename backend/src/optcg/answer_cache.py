@@ -0,0 +1,128 @@
+"""
+Semantic answer cache for rulebook questions.
+Questions are normalized and embedded; a new question reuses a stored answer when the cosine similarity to a cached
+question passes the threshold. Every entry is tied to the rulebook corpus version (the manifest hash from
+`vectorstore_logic`), and the whole cache is dropped when the rulebooks change.
+Answers are shared by every conversation, so only standalone questions (a conversation's first turn) are cached.
+"""
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")) # Min cosine similarity for a hit
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+
+_PUNCTUATION = re.compile(r"[^\w\s\[\]!-]") # Keep brackets and "!" used in keywords like "[Blocker]" and "DON!!"
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace, so trivially different phrasings share one key."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", question.lower())).strip()
+
+
+class SemanticAnswerCache:
+    """Bounded (LRU) cache of answers keyed by question embedding, invalidated when `version()` changes."""
+
+    def __init__(self, embeddings: Embeddings, version: Callable[[], str | None] = lambda: None,
+                 threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.version = version
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.exact_hits = 0 # Hits on an identical normalized question, which need no embedding
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[np.ndarray, str]] = OrderedDict() # normalized question -> (unit vector, answer)
+        self._matrix: np.ndarray | None = None # Stacked unit vectors of `_entries`, rebuilt after changes
+        self._keys: list[str] = []
+        self._version = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_version(self):
+        """Drop every entry if the rulebook corpus changed since they were stored."""
+        version = self.version()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                logger.info(f"Rulebooks changed, dropping {len(self._entries)} cached answers")
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _embed(self, normalized: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(normalized), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get(self, question: str) -> str | None:
+        """The cached answer for the most similar question above the threshold, or None."""
+        normalized = normalize_question(question)
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(normalized)
+            if entry is not None:
+                self._entries.move_to_end(normalized)
+                self.hits += 1
+                self.exact_hits += 1
+                return entry[1]
+            if not self._entries:
+                self.misses += 1
+                return None
+
+        vector = self._embed(normalized) # Outside the lock, this may be a network call
+        with self._lock:
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.stack([self._entries[key][0] for key in self._keys]) if self._keys else None
+            if self._matrix is not None:
+                similarities = self._matrix @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold and self._keys[best] in self._entries:
+                    key = self._keys[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    logger.debug(f"Answer cache hit ({similarities[best]:.3f}): {question!r} ~ {key!r}")
+                    return self._entries[key][1]
+            self.misses += 1
+            return None
+
+    def put(self, question: str, answer: str):
+        """Store the answer to a question, evicting the least recently used entry past `max_entries`."""
+        normalized = normalize_question(question)
+        vector = self._embed(normalized)
+        with self._lock:
+            self._check_version()
+            self._entries[normalized] = (vector, answer)
+            self._entries.move_to_end(normalized)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
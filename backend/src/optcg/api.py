@@ -1,5 +1,6 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import os
 from contextlib import asynccontextmanager
 import logging
@@ -9,12 +10,20 @@ from dotenv import load_dotenv
 load_dotenv()  
 
 # Custom Imports
-from optcg import state
+from optcg import state, apitcg, card_catalog
+from optcg.board_store import get_board_store
+from optcg.metrics import MetricsMiddleware, metrics_payload
+from optcg.analysis_cache import analysis_cache
+from optcg.card_table import card_table
+from optcg.llm_gateway import llm_gateway
 from optcg.routes import agent_routes, card_routes, board_routes
+from optcg.agents import warmup
+from optcg.agents.analysis import route_classifier
+from optcg.agents.react import get_rulebook_answer_cache
 
 # Environment validation and logging setup on startup
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(), # DEBUG logs every request and agent step
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 logger = logging.getLogger(__name__)
@@ -31,7 +40,16 @@ async def lifespan(app: FastAPI):
         if os.getenv("API_BASE_URL") == "http://localhost:8000":
             logger.warning("⚠️ Running in local development mode. Ensure this is intended.")
         logger.info("✅ Environment validated")
+        state.apitcg_client = apitcg.create_client()
+        state.card_catalog = card_catalog.load_catalog()
+        purged = get_board_store().purge_expired()
+        logger.info(f"✅ Board store ready ({purged} expired sessions purged)")
+        if os.getenv("AGENT_WARMUP", "false").lower() == "true":
+            # Build the agents and open the vector store before serving, instead of on the first chat request
+            await asyncio.to_thread(warmup)
+            logger.info("✅ Agents warmed up")
         yield
+        await apitcg.close_client()
     except Exception as e:
         logger.error(f"❌ Error during startup: {e}")
         raise
@@ -47,6 +65,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics, exported on /metrics
+app.add_middleware(MetricsMiddleware)
+
 # App Routes
 app.include_router(agent_routes.router, prefix="/agents", tags=["agents"])
 app.include_router(card_routes.router, prefix="/cards", tags=["cards"])
@@ -61,12 +82,26 @@ async def root():
         "docs": "/docs",
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: requests per route, agent graph nodes, LLM calls and tokens, API TCG requests"""
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
     return {
         "status": "healthy",
         "agents_loaded": list(state.active_agents.keys()),
+        "card_catalog_size": len(state.card_catalog) if state.card_catalog else 0,
+        "card_cache": card_routes.card_cache.stats(),
+        "board_store": get_board_store().stats(),
+        "card_table": card_table.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "analysis_router": route_classifier.stats(),
+        "llm_gateway": llm_gateway.stats(),
+        "rulebook_answer_cache": get_rulebook_answer_cache().stats() if get_rulebook_answer_cache.is_initialized() else None,
         "environment": {
             "langsmith_api_key": bool(os.getenv("LANGSMITH_API_KEY")),
             "openai_api_key": bool(os.getenv("OPENAI_API_KEY")), 
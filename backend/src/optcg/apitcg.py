@@ -0,0 +1,143 @@
+"""
+Async client for API TCG (https://apitcg.com), the One Piece TCG card database.
+A single connection-pooled `httpx.AsyncClient` is shared by the whole app. It is created in the `api.lifespan` hook and stored in `state.apitcg_client`.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+import httpx
+
+# Custom Imports
+from optcg import state
+from optcg.metrics import observe_apitcg_request
+
+logger = logging.getLogger(__name__)
+
+APITCG_BASE_URL = "https://apitcg.com/api/one-piece/cards"
+
+# Tunables, configurable through environment variables
+APITCG_MAX_CONCURRENCY = int(os.getenv("APITCG_MAX_CONCURRENCY", "4")) # Max pages of one search fetched at once
+APITCG_TIMEOUT = float(os.getenv("APITCG_TIMEOUT", "10")) # Seconds
+APITCG_MAX_RETRIES = int(os.getenv("APITCG_MAX_RETRIES", "3"))
+APITCG_BACKOFF_BASE = float(os.getenv("APITCG_BACKOFF_BASE", "0.5")) # Seconds, doubled on every retry
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class APITCGError(Exception):
+    """Error returned from or while contacting API TCG. Carries the HTTP status code the route should respond with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+# region Client
+
+def create_client() -> httpx.AsyncClient:
+    """Create the shared, connection-pooled API TCG client."""
+    return httpx.AsyncClient(
+        headers={"x-api-key": os.getenv("APITCG_API_KEY", "")},
+        timeout=httpx.Timeout(APITCG_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=APITCG_MAX_CONCURRENCY * 4,
+            max_keepalive_connections=APITCG_MAX_CONCURRENCY * 2,
+        ),
+    )
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client. Falls back to creating one if the app lifespan did not (e.g. in a notebook)."""
+    if state.apitcg_client is None:
+        state.apitcg_client = create_client()
+    return state.apitcg_client
+
+async def close_client():
+    """Close the shared client, if open."""
+    if state.apitcg_client is not None:
+        await state.apitcg_client.aclose()
+        state.apitcg_client = None
+
+# endregion Client
+
+
+# region Requests
+
+async def _get_json(client: httpx.AsyncClient, url: str, params: dict | None = None, endpoint: str = "card") -> dict:
+    """
+    GET a JSON document from API TCG, retrying transport errors and retryable status codes with exponential backoff.
+    Every attempt is timed in the `optcg_apitcg_request_duration_seconds` metric, labeled with `endpoint`.
+    """
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            response = await client.get(url, params=params)
+        except httpx.HTTPError as e:
+            observe_apitcg_request(endpoint, "error", time.perf_counter() - start)
+            if attempt >= APITCG_MAX_RETRIES:
+                logger.exception(f"Error contacting API TCG: {e}")
+                raise APITCGError(502, "Error contacting API TCG")
+            logger.warning(f"API TCG request failed ({e!r}), retrying ({attempt + 1}/{APITCG_MAX_RETRIES})")
+        else:
+            observe_apitcg_request(endpoint, response.status_code, time.perf_counter() - start)
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= APITCG_MAX_RETRIES:
+                raise APITCGError(response.status_code, f"API TCG responded with status code: {response.status_code}")
+            logger.warning(f"API TCG responded with {response.status_code}, retrying ({attempt + 1}/{APITCG_MAX_RETRIES})")
+
+        # Exponential backoff with jitter
+        await asyncio.sleep(APITCG_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random()))
+        attempt += 1
+
+async def search_cards(params: dict, client: httpx.AsyncClient | None = None) -> list[dict]:
+    """
+    Search API TCG with the given query parameters and return every matching card.
+    Page 1 is fetched first to learn `totalPages`, then pages 2..N are fetched concurrently (bounded by APITCG_MAX_CONCURRENCY).
+    """
+    client = client or get_client()
+    url = f"{APITCG_BASE_URL}/"
+
+    async def fetch_page(page: int) -> dict:
+        data = await _get_json(client, url, params={**params, "page": page}, endpoint="search")
+        if data.get("error"):
+            logger.error(f"API TCG returned error for card search: {data['error']}")
+            raise APITCGError(400, f"Error searching cards: {data['error']}")
+        return data
+
+    first_page = await fetch_page(1)
+    if not first_page.get("data"):
+        logger.error("API TCG called but no cards found (empty data)")
+        raise APITCGError(404, "No cards found matching the search criteria")
+
+    total_pages = first_page.get("totalPages", 1)
+    semaphore = asyncio.Semaphore(APITCG_MAX_CONCURRENCY)
+
+    async def fetch_page_limited(page: int) -> dict:
+        async with semaphore:
+            return await fetch_page(page)
+
+    remaining_pages = await asyncio.gather(*(fetch_page_limited(page) for page in range(2, total_pages + 1)))
+
+    all_cards = list(first_page["data"])
+    for data in remaining_pages: # gather preserves page order
+        all_cards.extend(data.get("data") or [])
+    return all_cards
+
+async def get_card(card_id: str, client: httpx.AsyncClient | None = None) -> dict:
+    """Fetch a single card by ID from API TCG. Returns the raw API response (`{"data": ...}`)."""
+    client = client or get_client()
+    data = await _get_json(client, f"{APITCG_BASE_URL}/{card_id}")
+    if data.get("error"):
+        logger.error(f"API TCG returned error for card {card_id}: {data['error']}")
+        raise APITCGError(404, f"Error fetching card data: {data['error']}")
+    if not data.get("data"):
+        logger.error(f"API TCG called and card not found (empty data): {card_id}")
+        raise APITCGError(404, "Card not found")
+    return data
+
+# endregion Requests
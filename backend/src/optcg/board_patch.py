@@ -0,0 +1,132 @@
+"""
+JSON Patch (RFC 6902) for board updates: clients send only what changed, e.g. one DON!! rested or one life lost,
+instead of re-posting the whole board.
+
+    [{"op": "replace", "path": "/UserState/life", "value": 3},
+     {"op": "add", "path": "/OpponentState/character/-", "value": {...card...}},
+     {"op": "remove", "path": "/OpponentState/character/0"}]
+
+Operations apply in order to a copy of the board, so a failing operation leaves the board unchanged.
+"""
+
+import copy
+from typing import Any
+
+
+class BoardPatchError(ValueError):
+    """An operation could not be applied: bad pointer, missing target, or failed test."""
+
+
+def parse_pointer(pointer: str) -> list[str]:
+    """JSON Pointer (RFC 6901) -> reference tokens. "" is the whole document."""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise BoardPatchError(f"Invalid JSON pointer {pointer!r}: must be empty or start with '/'")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+def _index(array: list, token: str, pointer: str, allow_end: bool = False) -> int:
+    """Array index of a token; "-" (or the length) is the end of the array when adding."""
+    if allow_end and token == "-":
+        return len(array)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise BoardPatchError(f"Invalid array index {token!r} in {pointer!r}")
+    index = int(token)
+    if index > len(array) or (index == len(array) and not allow_end):
+        raise BoardPatchError(f"Array index {index} out of range in {pointer!r}")
+    return index
+
+def _child(container: Any, token: str, pointer: str) -> Any:
+    if isinstance(container, dict):
+        if token not in container:
+            raise BoardPatchError(f"Path {pointer!r} does not exist")
+        return container[token]
+    if isinstance(container, list):
+        return container[_index(container, token, pointer)]
+    raise BoardPatchError(f"Path {pointer!r} goes through a scalar value")
+
+def _parent(document: Any, pointer: str) -> tuple[Any, str]:
+    """The container holding the pointer's target, and the target's key or index in it."""
+    tokens = parse_pointer(pointer)
+    container = document
+    for token in tokens[:-1]:
+        container = _child(container, token, pointer)
+    if not isinstance(container, (dict, list)):
+        raise BoardPatchError(f"Path {pointer!r} goes through a scalar value")
+    return container, tokens[-1]
+
+def get_value(document: Any, pointer: str) -> Any:
+    value = document
+    for token in parse_pointer(pointer):
+        value = _child(value, token, pointer)
+    return value
+
+def _add(document: Any, pointer: str, value: Any) -> Any:
+    if pointer == "":
+        return value
+    container, token = _parent(document, pointer)
+    if isinstance(container, list):
+        container.insert(_index(container, token, pointer, allow_end=True), value)
+    else:
+        container[token] = value
+    return document
+
+def _remove(document: Any, pointer: str) -> tuple[Any, Any]:
+    """Remove the target, returns the document and the removed value."""
+    if pointer == "":
+        raise BoardPatchError("Cannot remove the whole board")
+    container, token = _parent(document, pointer)
+    if isinstance(container, list):
+        return document, container.pop(_index(container, token, pointer))
+    if token not in container:
+        raise BoardPatchError(f"Path {pointer!r} does not exist")
+    return document, container.pop(token)
+
+def _replace(document: Any, pointer: str, value: Any) -> Any:
+    if pointer == "":
+        return value
+    container, token = _parent(document, pointer)
+    if isinstance(container, list):
+        container[_index(container, token, pointer)] = value
+    else:
+        if token not in container:
+            raise BoardPatchError(f"Path {pointer!r} does not exist")
+        container[token] = value
+    return document
+
+
+def apply_patch(document: Any, operations: list[dict]) -> Any:
+    """Apply JSON Patch operations (dicts with "op", "path" and "value" or "from") to a copy of the document."""
+    document = copy.deepcopy(document)
+    for number, operation in enumerate(operations):
+        op, path = operation.get("op"), operation.get("path")
+        if not isinstance(path, str):
+            raise BoardPatchError(f"Operation {number}: missing path")
+        try:
+            if op in ("add", "replace", "test") and "value" not in operation:
+                raise BoardPatchError(f"'{op}' needs a value")
+            if op in ("move", "copy") and not isinstance(operation.get("from"), str):
+                raise BoardPatchError(f"'{op}' needs a 'from' pointer")
+
+            if op == "add":
+                document = _add(document, path, copy.deepcopy(operation["value"]))
+            elif op == "remove":
+                document, _ = _remove(document, path)
+            elif op == "replace":
+                document = _replace(document, path, copy.deepcopy(operation["value"]))
+            elif op == "move":
+                source = operation["from"]
+                if path != source and path.startswith(source + "/"):
+                    raise BoardPatchError(f"Cannot move {source!r} into its own child {path!r}")
+                document, value = _remove(document, source)
+                document = _add(document, path, value)
+            elif op == "copy":
+                document = _add(document, path, copy.deepcopy(get_value(document, operation["from"])))
+            elif op == "test":
+                if get_value(document, path) != operation["value"]:
+                    raise BoardPatchError(f"Test failed at {path!r}")
+            else:
+                raise BoardPatchError(f"Unknown operation {op!r}")
+        except BoardPatchError as e:
+            raise BoardPatchError(f"Operation {number} ({op} {path}): {e}") from None
+    return document
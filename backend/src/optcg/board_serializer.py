@@ -0,0 +1,165 @@
+"""
+Compact, canonical text form of a board state for LLM prompts.
+The raw board JSON repeats presentation fields (image URLs, attribute icons, notes, set names) and the full text of
+every copy of a card. The serialized form drops presentation fields, lists each distinct card's details once, and
+refers to cards in the zones by code, with copies of the same card (in the same state) merged into counts.
+
+Serializations are memoized by board fingerprint, so every analysis node of a turn reuses the same text.
+"""
+
+# region Imports
+import hashlib
+import json
+import logging
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, NamedTuple
+from pydantic import BaseModel
+
+# Custom Imports
+from optcg.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# endregion Imports
+
+SERIALIZER_CACHE_SIZE = 256
+
+PLAYERS = [("UserState", "You"), ("OpponentState", "Opponent")]
+ZONES = [("leader", "Leader"), ("stage", "Stage"), ("character", "Characters"), ("event", "Event"), ("hand", "Hand")]
+PLAYER_FIELDS = {"life", "don", "rested_don_count", "hand_size"} # Formatted in the player's header line
+PRESENTATION_FIELDS = {"id", "images", "notes", "rotated", "set"} # Never shown to the LLM
+INSTANCE_FIELDS = {"rest", "attached_don", "power_modifier"} # Shown per card in the zones, not in the card details
+
+
+class SerializedBoard(NamedTuple):
+    text: str
+    tokens: int
+    fingerprint: str
+
+
+# region Serializing
+
+def board_fingerprint(board: dict | BaseModel) -> str:
+    """Content hash of a board, identical for equal boards regardless of key order."""
+    if isinstance(board, BaseModel):
+        board = board.model_dump()
+    return hashlib.sha256(json.dumps(board, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _card(entry: dict) -> dict:
+    """Card data of a zone entry. Hand cards may be wrapped as {"data": card}."""
+    return entry.get("data", entry) if isinstance(entry.get("data"), dict) else entry
+
+def _entries(value: Any) -> list[dict]:
+    if not value:
+        return []
+    return [entry for entry in (value if isinstance(value, list) else [value]) if isinstance(entry, dict)]
+
+def card_details(card: dict) -> str:
+    """One line with the gameplay-relevant fields of a card."""
+    attribute = card.get("attribute")
+    card_type = str(card.get("type", "")).upper()
+    counter = card.get("counter")
+    parts = [
+        card_type.title(),
+        f"{'life' if card_type == 'LEADER' else 'cost'} {card['cost']}" if card.get("cost") is not None else "", # A leader's "cost" is its life
+        f"{card['power']} power" if card.get("power") is not None else "",
+        f"counter {counter}" if counter not in (None, "", "-") else ("no counter" if card_type == "CHARACTER" else ""),
+        card.get("color", ""),
+        attribute.get("name", "") if isinstance(attribute, dict) else str(attribute or ""),
+        card.get("family", ""),
+    ]
+    text = f"{card.get('code', '?')} {card.get('name', '')}: " + ", ".join(part for part in parts if part)
+    if card.get("ability") not in (None, "", "-"):
+        text += f". {card['ability']}"
+    if card.get("trigger") not in (None, "", "-"):
+        text += f" Trigger: {card['trigger']}"
+    return text
+
+def _card_state(entry: dict) -> tuple[bool, int, int]:
+    """Rested, attached DON!! and power modifier of a card on the board."""
+    card = _card(entry)
+    return (
+        bool(entry.get("rest") or card.get("rest")),
+        int(entry.get("attached_don") or card.get("attached_don") or 0),
+        int(entry.get("power_modifier") or card.get("power_modifier") or 0),
+    )
+
+def _state_text(rested: bool, attached_don: int, power_modifier: int) -> str:
+    parts = ["rested"] if rested else []
+    if attached_don:
+        parts.append(f"{attached_don} DON!! attached")
+    if power_modifier:
+        parts.append(f"{power_modifier:+} power")
+    return f" ({', '.join(parts)})" if parts else ""
+
+def _zone_line(label: str, entries: list[dict]) -> str:
+    counts = Counter((_card(entry).get("code", "?"), _card(entry).get("name", ""), _card_state(entry)) for entry in entries)
+    items = [
+        f"{f'{count}x ' if count > 1 else ''}{code} {name}{_state_text(*card_state)}"
+        for (code, name, card_state), count in counts.items()
+    ]
+    size = f" ({len(entries)})" if len(entries) > 1 else ""
+    return f"  {label}{size}: {', '.join(items)}"
+
+def _player_header(label: str, player: dict) -> str:
+    parts = [f"life {player.get('life', '?')}", f"DON!! {player.get('don', '?')}"]
+    if player.get("rested_don_count"):
+        parts[-1] += f" ({player['rested_don_count']} rested)"
+    if player.get("hand_size") is not None:
+        parts.append(f"hand {player['hand_size']}")
+    # Unknown scalar fields are kept, so new board fields reach the LLM without a serializer change
+    zone_keys = {key for key, _ in ZONES}
+    parts += [f"{key} {value}" for key, value in player.items() if key not in PLAYER_FIELDS | zone_keys and isinstance(value, (str, int, float, bool))]
+    return f"{label}: {', '.join(parts)}"
+
+def render_board(board: dict) -> str:
+    """Render a board dict (or `BoardState`-shaped data) in the compact text form."""
+    lines, cards = [], {}
+    for key, label in PLAYERS:
+        player = board.get(key)
+        if not isinstance(player, dict):
+            continue
+        lines.append(_player_header(label, player))
+        for zone, zone_label in ZONES:
+            entries = _entries(player.get(zone))
+            if not entries:
+                continue
+            lines.append(_zone_line(zone_label, entries))
+            for entry in entries:
+                card = _card(entry)
+                cards.setdefault(card.get("code", "?"), {k: v for k, v in card.items() if k not in PRESENTATION_FIELDS | INSTANCE_FIELDS})
+    if cards:
+        lines.append("Cards:")
+        lines += [f"  {card_details(card)}" for _, card in sorted(cards.items())]
+    return "\n".join(lines)
+
+# endregion Serializing
+
+
+# region Memoization
+
+_cache: OrderedDict[str, SerializedBoard] = OrderedDict()
+_cache_lock = threading.Lock()
+
+def serialize_board(board: dict | BaseModel) -> SerializedBoard:
+    """Compact text form of a board with its token count, memoized per board fingerprint (LRU)."""
+    if isinstance(board, BaseModel):
+        board = board.model_dump()
+    fingerprint = board_fingerprint(board)
+    with _cache_lock:
+        serialized = _cache.get(fingerprint)
+        if serialized is not None:
+            _cache.move_to_end(fingerprint)
+            return serialized
+
+    text = render_board(board)
+    serialized = SerializedBoard(text=text, tokens=count_tokens(text), fingerprint=fingerprint)
+    logger.debug(f"Serialized board {fingerprint[:12]}: {len(text)} chars, {serialized.tokens} tokens")
+    with _cache_lock:
+        _cache[fingerprint] = serialized
+        while len(_cache) > SERIALIZER_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return serialized
+
+# endregion Memoization
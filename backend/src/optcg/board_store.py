@@ -0,0 +1,347 @@
+"""
+Session-keyed board state store.
+Boards are stored per chat `thread_id`, so concurrent users no longer overwrite each other's board.
+Two backends implement the same `BoardStore` interface:
+- `InMemoryBoardStore`: a per-process LRU dict (default, single worker)
+- `SQLiteBoardStore`: a SQLite file in WAL mode that several uvicorn workers can share
+
+Both expire sessions `ttl` seconds after their board was last saved, and evict the least recently used sessions
+past `max_sessions`. Every save increments the session's board version, which patches are checked against. Boards saved without a thread ID go to the `DEFAULT_SESSION`.
+A thread without a board of its own has no board, unless `BOARD_DEFAULT_FALLBACK` is set: it then reads the default
+session's board, which every such thread shares (single-user setups that save the board without a thread ID).
+"""
+
+# region Imports
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+
+# Custom Imports
+from optcg import state
+from optcg.card_table import CardRecord, card_reference, card_table, is_reference
+from optcg.schemas import BoardState
+
+logger = logging.getLogger(__name__)
+
+# endregion Imports
+
+BOARD_STORE_BACKEND = os.getenv("BOARD_STORE_BACKEND", "memory") # "memory" or "sqlite"
+BOARD_STORE_PATH = Path(os.getenv("BOARD_STORE_PATH", Path.home() / ".cache" / "optcg_board_store" / "boards.sqlite3")).expanduser()
+BOARD_STORE_TTL = float(os.getenv("BOARD_STORE_TTL", "86400")) # Seconds after the last save
+BOARD_STORE_MAX_SESSIONS = int(os.getenv("BOARD_STORE_MAX_SESSIONS", "1000"))
+BOARD_DEFAULT_FALLBACK = os.getenv("BOARD_DEFAULT_FALLBACK", "false").lower() == "true" # Threads without a board read the default session's
+
+DEFAULT_SESSION = "default"
+
+
+class BoardVersionConflict(Exception):
+    """The session's board changed since the version a client based its update on."""
+
+    def __init__(self, session_id: str, expected_version: int, version: int):
+        super().__init__(f"Board of session {session_id} is at version {version}, not {expected_version}")
+        self.session_id = session_id
+        self.expected_version = expected_version
+        self.version = version
+
+
+# region Board Representation
+
+PLAYERS = ("UserState", "OpponentState")
+CARD_ZONES = ("leader", "event", "stage", "character", "hand")
+
+def map_cards(board: dict, func) -> dict:
+    """Copy of the board with `func` applied to every card entry of every zone."""
+    board = dict(board)
+    for player_key in PLAYERS:
+        player = board.get(player_key)
+        if not isinstance(player, dict):
+            continue
+        player = board[player_key] = dict(player)
+        for zone in CARD_ZONES:
+            value = player.get(zone)
+            if isinstance(value, dict):
+                player[zone] = func(value)
+            elif isinstance(value, list):
+                player[zone] = [func(entry) if isinstance(entry, dict) else entry for entry in value]
+    return board
+
+def compact_card(card: dict, stored: dict) -> dict:
+    """
+    Stored form of a board card: a reference if the card table's (trusted) record of the card has the same data,
+    else the whole card without its default fields (`stored`), so a client cannot change the card for other boards
+    or store made-up cards in the table.
+    """
+    record = card_table.get(card.get("id") or card["code"])
+    if record is not None and record == CardRecord(card):
+        return card_reference(card)
+    return stored
+
+def compact_board(board: BoardState) -> dict:
+    """
+    Stored form of a validated board: fields at their defaults (empty zones, unrested cards) are left out, and cards
+    matching the card table's record are references (code and per-instance state) into the table.
+    """
+    cards = []
+    map_cards(board.model_dump(mode="json"), lambda card: cards.append(card) or card)
+    full_cards = iter(cards) # Both dumps hold the same card entries, in the same order
+    return map_cards(board.model_dump(mode="json", exclude_defaults=True), lambda stored: compact_card(next(full_cards), stored))
+
+def resolve_board(board: dict, presentation: bool = True) -> dict:
+    """
+    The board with its card references resolved to full card data from the card table (without images, set and notes
+    if not `presentation`). References to unknown cards are kept as they are.
+    """
+    def resolve(entry: dict) -> dict:
+        if not is_reference(entry):
+            return entry
+        card = card_table.resolve(entry)
+        return card.to_dict(presentation) if card is not None else entry
+    return map_cards(board, resolve)
+
+def board_for_agents(board: dict) -> dict:
+    """The board as the agents read it (and the analysis cache fingerprints it): resolved, without presentation fields."""
+    return resolve_board(board, presentation=False)
+
+def expand_board(board: dict) -> dict:
+    """Full `BoardState` form of a stored board, every field present, as clients read and patch it."""
+    return BoardState.model_validate(resolve_board(board)).model_dump(mode="json")
+
+# endregion Board Representation
+
+
+# region Board Store
+
+class BoardStore(ABC):
+    """Interface of a board state store, keyed by session (chat thread) ID."""
+
+    def __init__(self, ttl: float = BOARD_STORE_TTL, max_sessions: int = BOARD_STORE_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+
+    @abstractmethod
+    def get_versioned(self, session_id: str) -> tuple[dict, int] | None:
+        """The session's board and its version, or None if there is none or it expired."""
+
+    @abstractmethod
+    def set(self, session_id: str, board: dict, expected_version: int | None = None) -> int:
+        """
+        Save (replace) the session's board, reset its TTL, and return its new version (1 for a new board).
+        With `expected_version`, saves only if the board is still at that version (0: no board), else raises `BoardVersionConflict`.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Delete the session's board. Returns whether there was one."""
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Delete every expired session. Returns how many were deleted."""
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    def get(self, session_id: str) -> dict | None:
+        """The session's board, or None if there is none or it expired."""
+        entry = self.get_versioned(session_id)
+        return entry[0] if entry is not None else None
+
+    def resolve_versioned(self, thread_id: str | None) -> tuple[dict, int] | None:
+        """
+        The board for a chat thread and its version: the thread's own board (the default session's without a thread).
+        A thread without a board falls back to the default session's board only with `BOARD_DEFAULT_FALLBACK`.
+        """
+        entry = self.get_versioned(thread_id or DEFAULT_SESSION)
+        if entry is None and thread_id and BOARD_DEFAULT_FALLBACK:
+            entry = self.get_versioned(DEFAULT_SESSION)
+        return entry
+
+    def resolve(self, thread_id: str | None) -> dict | None:
+        """The board for a chat thread (see `resolve_versioned`), or None."""
+        entry = self.resolve_versioned(thread_id)
+        return entry[0] if entry is not None else None
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "sessions": len(self),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl,
+        }
+
+
+class InMemoryBoardStore(BoardStore):
+    """Board store in process memory. Not shared between workers."""
+
+    def __init__(self, ttl: float = BOARD_STORE_TTL, max_sessions: int = BOARD_STORE_MAX_SESSIONS):
+        super().__init__(ttl, max_sessions)
+        self._boards: OrderedDict[str, tuple[float, dict, int]] = OrderedDict() # session_id -> (expires_at, board, version)
+        self._lock = threading.Lock() # The agent graph reads boards from worker threads
+
+    def __len__(self):
+        return len(self._boards)
+
+    def _live_entry(self, session_id: str) -> tuple[float, dict, int] | None:
+        """The session's entry unless it expired (then dropped). Call with the lock held."""
+        entry = self._boards.get(session_id)
+        if entry is not None and entry[0] <= time.time():
+            del self._boards[session_id]
+            return None
+        return entry
+
+    def get_versioned(self, session_id: str) -> tuple[dict, int] | None:
+        with self._lock:
+            entry = self._live_entry(session_id)
+            if entry is None:
+                return None
+            self._boards.move_to_end(session_id)
+            return entry[1], entry[2]
+
+    def set(self, session_id: str, board: dict, expected_version: int | None = None) -> int:
+        with self._lock:
+            entry = self._live_entry(session_id)
+            version = entry[2] if entry is not None else 0
+            if expected_version is not None and expected_version != version:
+                raise BoardVersionConflict(session_id, expected_version, version)
+            self._boards[session_id] = (time.time() + self.ttl, board, version + 1)
+            self._boards.move_to_end(session_id)
+            while len(self._boards) > self.max_sessions:
+                evicted, _ = self._boards.popitem(last=False)
+                logger.debug(f"Evicted board of session {evicted}")
+            return version + 1
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._boards.pop(session_id, None) is not None
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [session_id for session_id, (expires_at, _, _) in self._boards.items() if expires_at <= now]
+            for session_id in expired:
+                del self._boards[session_id]
+        return len(expired)
+
+
+class SQLiteBoardStore(BoardStore):
+    """
+    Board store in a SQLite database, shared by every process that opens the same file.
+    WAL mode lets readers proceed while one worker writes. Each thread gets its own connection.
+    """
+
+    def __init__(self, path: Path = BOARD_STORE_PATH, ttl: float = BOARD_STORE_TTL, max_sessions: int = BOARD_STORE_MAX_SESSIONS):
+        super().__init__(ttl, max_sessions)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS boards ("
+                "session_id TEXT PRIMARY KEY, board TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL, version INTEGER NOT NULL DEFAULT 1)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS boards_accessed_at ON boards (accessed_at)")
+            connection.execute("CREATE TABLE IF NOT EXISTS source_cards (card_id TEXT PRIMARY KEY, card TEXT NOT NULL)") # From the API TCG cache
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(boards)")}
+            if "version" not in columns: # Store files created before board versions
+                connection.execute("ALTER TABLE boards ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL") # Safe with WAL, and avoids an fsync per save
+            self._local.connection = connection
+        return connection
+
+    def __len__(self):
+        row = self._connection().execute("SELECT COUNT(*) FROM boards WHERE expires_at > ?", (time.time(),)).fetchone()
+        return row[0]
+
+    def get_versioned(self, session_id: str) -> tuple[dict, int] | None:
+        now = time.time()
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT board, version FROM boards WHERE session_id = ? AND expires_at > ?", (session_id, now)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE boards SET accessed_at = ? WHERE session_id = ?", (now, session_id))
+        return json.loads(row[0]), row[1]
+
+    def set(self, session_id: str, board: dict, expected_version: int | None = None) -> int:
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE") # Check the version and write in one transaction, across workers
+            row = connection.execute(
+                "SELECT version FROM boards WHERE session_id = ? AND expires_at > ?", (session_id, now)
+            ).fetchone()
+            version = row[0] if row is not None else 0
+            if expected_version is not None and expected_version != version:
+                raise BoardVersionConflict(session_id, expected_version, version) # Rolls back
+            connection.execute(
+                "INSERT INTO boards (session_id, board, expires_at, accessed_at, version) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET board = excluded.board, expires_at = excluded.expires_at, "
+                "accessed_at = excluded.accessed_at, version = excluded.version",
+                (session_id, json.dumps(board, separators=(",", ":")), now + self.ttl, now, version + 1),
+            )
+            # Evict the least recently used sessions past the limit
+            connection.execute(
+                "DELETE FROM boards WHERE session_id IN (SELECT session_id FROM boards ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            )
+        return version + 1
+
+    def delete(self, session_id: str) -> bool:
+        with self._connection() as connection:
+            return connection.execute("DELETE FROM boards WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def save_cards(self, cards: list[dict]):
+        """Persist card data found in a worker's API TCG cache, so every worker resolves the boards' card references."""
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT INTO source_cards (card_id, card) VALUES (?, ?) ON CONFLICT (card_id) DO UPDATE SET card = excluded.card",
+                [(card["id"], json.dumps(card, separators=(",", ":"))) for card in cards],
+            )
+
+    def load_card(self, card_id: str) -> dict | None:
+        """Card data saved by any worker, by card ID or code."""
+        row = self._connection().execute(
+            "SELECT card FROM source_cards WHERE card_id = ? OR json_extract(card, '$.code') = ? ORDER BY card_id = ? DESC LIMIT 1",
+            (card_id, card_id, card_id),
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def purge_expired(self) -> int:
+        with self._connection() as connection:
+            return connection.execute("DELETE FROM boards WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+def create_board_store(backend: str = BOARD_STORE_BACKEND) -> BoardStore:
+    """Create the board store for the configured backend."""
+    if backend == "memory":
+        return InMemoryBoardStore()
+    if backend == "sqlite":
+        return SQLiteBoardStore()
+    raise ValueError(f"Unknown BOARD_STORE_BACKEND: {backend!r} (expected 'memory' or 'sqlite')")
+
+_store_lock = threading.Lock()
+
+def get_board_store() -> BoardStore:
+    """The process's board store (`state.board_store`), created on first use."""
+    if state.board_store is None:
+        with _store_lock:
+            if state.board_store is None:
+                state.board_store = create_board_store()
+                if isinstance(state.board_store, SQLiteBoardStore): # Share the cards found in the API TCG cache with the other workers
+                    card_table.add_source(state.board_store.load_card)
+                    card_table.add_sink(state.board_store.save_cards)
+                logger.debug(f"Created board store: {type(state.board_store).__name__}")
+    return state.board_store
+
+# endregion Board Store
@@ -0,0 +1,313 @@
+"""
+Local mirror of the API TCG One Piece card catalog with indexed, offline search.
+The full catalog (a few thousand cards) is bulk-synced once and persisted to `~/.cache/optcg_card_catalog/catalog.json`.
+`CardSearchRequest` queries are then answered from in-memory indexes instead of paging through API TCG on every request.
+
+Resync from the command line:
+    python -m optcg.card_catalog sync                 # Incremental: diff the full catalog, apply only changes
+    python -m optcg.card_catalog sync --set OP12      # Incremental: only refresh the given set(s)
+    python -m optcg.card_catalog sync --full          # Drop the local mirror and rebuild it
+"""
+
+# region Imports
+import argparse
+import asyncio
+import bisect
+import functools
+import json
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# Custom Imports
+from optcg import apitcg
+from optcg.schemas import CardSearchRequest
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = Path(os.getenv("OPTCG_CARD_CATALOG_PATH", Path.home() / ".cache" / "optcg_card_catalog" / "catalog.json"))
+
+# endregion Imports
+
+
+# region Indexing
+
+TOKEN_FIELDS = ("name", "ability", "family") # Inverted token index, partial text matching
+HASH_FIELDS = ("set", "type", "color", "counter") # Exact value -> card ids
+RANGE_FIELDS = ("cost", "power") # Sorted (value, card id) pairs
+VOCAB_MATCH_CACHE_SIZE = 4096 # Memoized (field, query token) -> matching vocabulary tokens
+
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z!]+")
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase and split text into search tokens."""
+    return [token for token in _TOKEN_SPLIT.split(text.lower()) if token]
+
+def set_code(card: dict) -> str:
+    """The set a card belongs to, e.g. "OP01" for "OP01-001"."""
+    return card.get("code", "").split("-")[0].upper()
+
+def _hash_keys(card: dict, field: str) -> list[str]:
+    if field == "set":
+        return [set_code(card)]
+    if field == "color": # Multicolor cards are indexed under each color, e.g. "Red/Green"
+        return [color.strip().lower() for color in (card.get("color") or "").split("/") if color.strip()]
+    return [str(card.get(field) or "").lower()] # Some sources give the counter as a number
+
+# endregion Indexing
+
+
+# region Card Catalog
+
+class CardCatalog:
+    """In-memory card catalog with inverted, hash and range indexes over `CardData` records."""
+
+    def __init__(self, cards: list[dict] | None = None):
+        self.cards: dict[str, dict] = {} # card id -> raw card record
+        self.synced_at: float | None = None
+        self._order: dict[str, int] = {}
+        self._tokens: dict[str, dict[str, set[str]]] = {field: defaultdict(set) for field in TOKEN_FIELDS}
+        self._hashes: dict[str, dict[str, set[str]]] = {field: defaultdict(set) for field in HASH_FIELDS}
+        self._ranges: dict[str, list[tuple[int, str]]] = {field: [] for field in RANGE_FIELDS}
+        self._codes: dict[str, set[str]] = defaultdict(set) # Card code -> ids (alternate arts share a code)
+        self._vocab_matches = functools.lru_cache(maxsize=VOCAB_MATCH_CACHE_SIZE)(self._match_vocabulary)
+        for card in cards or []:
+            self._add(card)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def _add(self, card: dict):
+        card_id = card["id"]
+        if card_id in self.cards:
+            self._remove(card_id)
+        self.cards[card_id] = card
+        self._order.setdefault(card_id, len(self._order))
+        for field in TOKEN_FIELDS:
+            for token in set(tokenize(card.get(field) or "")):
+                self._tokens[field][token].add(card_id)
+        for field in HASH_FIELDS:
+            for key in _hash_keys(card, field):
+                self._hashes[field][key].add(card_id)
+        for field in RANGE_FIELDS:
+            if card.get(field) is not None:
+                bisect.insort(self._ranges[field], (card[field], card_id))
+        if card.get("code"):
+            self._codes[card["code"]].add(card_id)
+        self._vocab_matches.cache_clear()
+
+    def _remove(self, card_id: str):
+        card = self.cards.pop(card_id)
+        for field in TOKEN_FIELDS:
+            for token in set(tokenize(card.get(field) or "")):
+                postings = self._tokens[field][token]
+                postings.discard(card_id)
+                if not postings:
+                    del self._tokens[field][token]
+        for field in HASH_FIELDS:
+            for key in _hash_keys(card, field):
+                postings = self._hashes[field][key]
+                postings.discard(card_id)
+                if not postings:
+                    del self._hashes[field][key]
+        for field in RANGE_FIELDS:
+            if card.get(field) is not None:
+                entries = self._ranges[field]
+                index = bisect.bisect_left(entries, (card[field], card_id))
+                if index < len(entries) and entries[index] == (card[field], card_id):
+                    del entries[index]
+        if card.get("code"):
+            ids = self._codes[card["code"]]
+            ids.discard(card_id)
+            if not ids:
+                del self._codes[card["code"]]
+        self._vocab_matches.cache_clear()
+
+    def upsert(self, cards: list[dict]) -> tuple[int, int]:
+        """Insert new cards and re-index changed ones. Returns (added, updated)."""
+        added = updated = 0
+        for card in cards:
+            existing = self.cards.get(card["id"])
+            if existing is None:
+                added += 1
+            elif existing != card:
+                updated += 1
+            else:
+                continue
+            self._add(card)
+        return added, updated
+
+    def remove(self, card_ids) -> int:
+        """Remove cards by id. Returns the number removed."""
+        removed = 0
+        for card_id in card_ids:
+            if card_id in self.cards:
+                self._remove(card_id)
+                removed += 1
+        return removed
+
+    def _match_vocabulary(self, field: str, query_token: str) -> frozenset[str]:
+        """The vocabulary tokens of `field` containing `query_token`. Memoized in `_vocab_matches`, bounded LRU."""
+        return frozenset(token for token in self._tokens[field] if query_token in token)
+
+    def _token_candidates(self, field: str, text: str) -> set[str]:
+        """
+        Card ids whose `field` may contain `text`. Every query token lies inside a single field token,
+        so the union of postings for vocabulary tokens containing it is a superset of the true matches.
+        """
+        candidates = None
+        for query_token in set(tokenize(text)):
+            postings = set().union(*(self._tokens[field][token] for token in self._vocab_matches(field, query_token)))
+            candidates = postings if candidates is None else candidates & postings
+            if not candidates:
+                return set()
+        return candidates if candidates is not None else set(self.cards)
+
+    def _hash_candidates(self, field: str, value: str) -> set[str]:
+        value = value.strip().lower() if field != "set" else value.strip().upper()
+        if field == "set" and "-" in value: # A full card code rather than a set code
+            return {card_id for card_id in self._hashes["set"].get(value.split("-")[0], ()) if value in self.cards[card_id]["code"].upper()}
+        if field in ("counter", "set"):
+            return set(self._hashes[field].get(value, ()))
+        # Partial matching on other fields (e.g. "char" -> "character")
+        return set().union(*(ids for key, ids in self._hashes[field].items() if value in key))
+
+    def _range_candidates(self, field: str, low: int, high: int) -> set[str]:
+        entries = self._ranges[field]
+        start = bisect.bisect_left(entries, low, key=lambda entry: entry[0])
+        end = bisect.bisect_right(entries, high, key=lambda entry: entry[0])
+        return {card_id for _, card_id in entries[start:end]}
+
+    def search(self, request: CardSearchRequest) -> list[dict]:
+        """Answer a card search from the indexes, matching API TCG semantics (case-insensitive partial text matching)."""
+        filters: list[set[str]] = []
+        if request.set:
+            filters.append(self._hash_candidates("set", request.set))
+        if request.type:
+            filters.append(self._hash_candidates("type", request.type))
+        if request.color:
+            filters.append(self._hash_candidates("color", request.color))
+        if request.counter:
+            filters.append(self._hash_candidates("counter", request.counter))
+        if request.cost is not None:
+            filters.append(self._range_candidates("cost", request.cost, request.cost))
+        if request.power is not None:
+            filters.append(self._range_candidates("power", request.power, request.power))
+        for field in TOKEN_FIELDS:
+            if getattr(request, field):
+                filters.append(self._token_candidates(field, getattr(request, field)))
+
+        # Intersect smallest first
+        filters.sort(key=len)
+        candidates = filters[0] if filters else set(self.cards)
+        for other in filters[1:]:
+            candidates = candidates & other
+            if not candidates:
+                return []
+
+        # Verify partial text matches on the (now small) candidate set
+        text_filters = [(field, getattr(request, field).lower()) for field in (*TOKEN_FIELDS, "trigger") if getattr(request, field)]
+        results = [
+            self.cards[card_id] for card_id in candidates
+            if all(value in (self.cards[card_id].get(field) or "").lower() for field, value in text_filters)
+        ]
+        results.sort(key=lambda card: self._order[card["id"]])
+        return results
+
+    def get(self, card_id: str) -> dict | None:
+        """Look up a card by id, falling back to its card code (the first synced print of the card)."""
+        card = self.cards.get(card_id)
+        if card is None and (ids := self._codes.get(card_id)):
+            card = self.cards[min(ids, key=self._order.__getitem__)]
+        return card
+
+    def save(self, path: Path = CATALOG_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"synced_at": self.synced_at, "cards": sorted(self.cards.values(), key=lambda card: self._order[card["id"]])}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path = CATALOG_PATH) -> "CardCatalog | None":
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            data = json.load(f)
+        catalog = cls(data.get("cards", []))
+        catalog.synced_at = data.get("synced_at")
+        return catalog
+
+# endregion Card Catalog
+
+
+# region Syncing
+
+async def sync_catalog(catalog: CardCatalog | None = None, sets: list[str] | None = None, full: bool = False) -> CardCatalog:
+    """
+    Sync the local catalog from API TCG.
+    - `full`: rebuild from scratch.
+    - `sets`: incremental, only refresh the given set codes (cards missing upstream are removed from those sets).
+    - otherwise: incremental, fetch the full catalog and apply only added/changed/removed cards.
+    """
+    if catalog is None or full:
+        catalog = CardCatalog()
+
+    if sets:
+        for code in sets:
+            code = code.upper()
+            try:
+                cards = await apitcg.search_cards({"code": code})
+            except apitcg.APITCGError as e:
+                if e.status_code != 404:
+                    raise
+                cards = []
+            fetched_ids = {card["id"] for card in cards}
+            stale_ids = [card_id for card_id in catalog._hashes["set"].get(code, ()) if card_id not in fetched_ids]
+            added, updated = catalog.upsert(cards)
+            removed = catalog.remove(stale_ids)
+            logger.info(f"Synced set {code}: {added} added, {updated} updated, {removed} removed")
+    else:
+        cards = await apitcg.search_cards({})
+        fetched_ids = {card["id"] for card in cards}
+        added, updated = catalog.upsert(cards)
+        removed = catalog.remove([card_id for card_id in list(catalog.cards) if card_id not in fetched_ids])
+        logger.info(f"Synced catalog: {added} added, {updated} updated, {removed} removed")
+
+    catalog.synced_at = time.time()
+    return catalog
+
+def load_catalog() -> CardCatalog | None:
+    """Load the persisted catalog, if it has been synced before."""
+    catalog = CardCatalog.load()
+    if catalog is None:
+        logger.info(f"No local card catalog at {CATALOG_PATH}. Run `python -m optcg.card_catalog sync` to create it.")
+    else:
+        logger.info(f"Loaded local card catalog with {len(catalog)} cards")
+    return catalog
+
+async def _main(args):
+    catalog = None if args.full else CardCatalog.load()
+    try:
+        catalog = await sync_catalog(catalog, sets=args.set, full=args.full)
+    finally:
+        await apitcg.close_client()
+    catalog.save()
+    print(f"Card catalog saved to {CATALOG_PATH} ({len(catalog)} cards)")
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Manage the local One Piece TCG card catalog mirror")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sync_parser = subparsers.add_parser("sync", help="Sync the local catalog from API TCG")
+    sync_parser.add_argument("--full", action="store_true", help="Rebuild the catalog from scratch")
+    sync_parser.add_argument("--set", action="append", help="Only refresh the given set code (repeatable)")
+    asyncio.run(_main(parser.parse_args()))
+
+# endregion Syncing
@@ -0,0 +1,215 @@
+"""
+Interned card table: one record per card, shared by every stored board.
+
+Boards store their cards as references: the card code (and ID, for another print of the card) plus the per-instance
+state (`INSTANCE_FIELDS`: rested, attached DON!!, power modifier). Full card data is resolved from this table into
+`BoardCard` views. Cards the table does not hold yet are looked up in its sources: the local card catalog, then the
+API TCG card cache and, with the SQLite board store, the cards saved by the other workers. Cards found by API TCG
+searches, which the frontend builds boards from, are interned as they are fetched (`card_routes.search_and_intern`).
+Only card data from these sources is interned, never the cards clients post: a posted card is stored as a reference
+only if it equals the table's record, see `board_store.compact_board`.
+"""
+
+# region Imports
+import logging
+import threading
+from typing import Callable, Iterable
+from pydantic import ValidationError
+
+# Custom Imports
+from optcg import state
+from optcg.schemas import CardData
+
+logger = logging.getLogger(__name__)
+
+# endregion Imports
+
+CARD_FIELDS = ("id", "code", "rarity", "type", "name", "images", "cost", "attribute", "power", "counter", "color",
+               "family", "ability", "trigger", "set", "notes")
+INSTANCE_FIELDS = {"rest": False, "attached_don": 0, "power_modifier": 0} # Per card on the board -> default
+PRESENTATION_FIELDS = {"id", "images", "notes", "set"} # Not needed by the agents
+
+CardSource = Callable[[str], dict | None] # Card ID or code -> card data
+CardSink = Callable[[list[dict]], None] # Newly interned cards
+
+
+def normalize_card(card: dict) -> dict:
+    """Card data as a validated board card holds it (e.g. the counter as text), so a posted copy compares equal."""
+    try:
+        return CardData.model_validate(card).model_dump(mode="json")
+    except ValidationError:
+        return card
+
+
+# region Records
+
+class CardRecord:
+    """A card's data, interned: boards holding copies of the card share this one object."""
+
+    __slots__ = CARD_FIELDS
+
+    def __init__(self, card: dict):
+        for field in CARD_FIELDS:
+            setattr(self, field, card.get(field))
+        if self.id is None:
+            self.id = self.code
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CardRecord) and all(getattr(self, field) == getattr(other, field) for field in CARD_FIELDS)
+
+    def __repr__(self) -> str:
+        return f"CardRecord({self.id!r}, {self.name!r})"
+
+    def to_dict(self, presentation: bool = True) -> dict:
+        card = {field: getattr(self, field) for field in CARD_FIELDS if presentation or field not in PRESENTATION_FIELDS}
+        if not presentation and isinstance(self.attribute, dict):
+            card["attribute"] = {"name": self.attribute.get("name", "")} # Without its icon
+        return card
+
+class BoardCard:
+    """A card on the board: the shared card record and the state of this copy."""
+
+    __slots__ = ("card", "rest", "attached_don", "power_modifier")
+
+    def __init__(self, card: CardRecord, rest: bool = False, attached_don: int = 0, power_modifier: int = 0):
+        self.card = card
+        self.rest = rest
+        self.attached_don = attached_don
+        self.power_modifier = power_modifier
+
+    @property
+    def code(self) -> str:
+        return self.card.code
+
+    @property
+    def name(self) -> str:
+        return self.card.name
+
+    @property
+    def total_power(self) -> int | None:
+        """Power during its owner's turn: base power, modifiers, and +1000 per attached DON!!."""
+        if self.card.power is None:
+            return None
+        return self.card.power + self.power_modifier + 1000 * self.attached_don
+
+    def __repr__(self) -> str:
+        return f"BoardCard({self.card.code!r}, rest={self.rest}, attached_don={self.attached_don}, power_modifier={self.power_modifier})"
+
+    def to_dict(self, presentation: bool = True) -> dict:
+        return {**self.card.to_dict(presentation), "rest": self.rest, "attached_don": self.attached_don, "power_modifier": self.power_modifier}
+
+# endregion Records
+
+
+# region References
+
+def is_reference(entry: dict) -> bool:
+    """Whether a board card entry is a reference into the card table rather than full card data."""
+    return "code" in entry and "name" not in entry
+
+def card_reference(card: dict) -> dict:
+    """Stored form of a board card: its code (and ID, for another print), and its per-instance state unless default."""
+    reference = {"code": card["code"]}
+    if card.get("id", card["code"]) != card["code"]:
+        reference["id"] = card["id"]
+    reference.update({field: card[field] for field, default in INSTANCE_FIELDS.items() if card.get(field, default) != default})
+    return reference
+
+# endregion References
+
+
+# region Card Table
+
+def catalog_card(card_id: str) -> dict | None:
+    return state.card_catalog.get(card_id) if state.card_catalog else None
+
+class CardTable:
+    """Card records by ID (and code), interned once per process. Misses are looked up in the sources, in order."""
+
+    def __init__(self, sources: list[CardSource] | None = None):
+        self._cards: dict[str, CardRecord] = {} # Card ID -> record. Bounded by the number of cards in the game
+        self._ids_by_code: dict[str, str] = {}
+        self._sources: list[tuple[CardSource, bool]] = [(source, False) for source in sources or []] # (source, persist)
+        self._sinks: list[CardSink] = []
+        self._lock = threading.Lock() # Boards are resolved from graph worker threads
+        self.hits = 0
+        self.source_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cards)
+
+    def add_source(self, source: CardSource, persist: bool = False):
+        """
+        Look up cards the table does not hold in `source` (after the sources added before), which must only hold
+        trusted card data. With `persist`, cards found there are passed to the sinks (a source the other workers lack).
+        """
+        self._sources.append((source, persist))
+
+    def add_sink(self, sink: CardSink):
+        """Pass the cards interned from persisted sources to `sink`, e.g. to save them for the other workers."""
+        self._sinks.append(sink)
+
+    def intern(self, cards: Iterable[dict], persist: bool = True) -> list[CardRecord]:
+        """The shared records of these cards (trusted card data only), adding new or changed cards to the table."""
+        records, new_cards = [], []
+        with self._lock:
+            for card in cards:
+                record = CardRecord(card)
+                existing = self._cards.get(record.id)
+                if existing is not None and existing == record:
+                    record = existing
+                else:
+                    self._cards[record.id] = record
+                    self._ids_by_code.setdefault(record.code, record.id)
+                    new_cards.append(record.to_dict())
+                records.append(record)
+        if persist and new_cards:
+            for sink in self._sinks:
+                try:
+                    sink(new_cards)
+                except Exception as e:
+                    logger.warning(f"Could not persist {len(new_cards)} interned cards: {e}")
+        return records
+
+    def get(self, card_id: str) -> CardRecord | None:
+        """The record of a card by ID or code, from the table or else from the first source that has it."""
+        with self._lock:
+            record = self._cards.get(card_id) or self._cards.get(self._ids_by_code.get(card_id, ""))
+            if record is not None:
+                self.hits += 1
+                return record
+        for source, persist in self._sources:
+            try:
+                card = source(card_id)
+            except Exception as e:
+                logger.warning(f"Card source failed for {card_id}: {e}")
+                continue
+            if card:
+                self.source_hits += 1
+                return self.intern([normalize_card(card)], persist=persist)[0]
+        self.misses += 1
+        logger.debug(f"Card {card_id} not found in the card table or its sources")
+        return None
+
+    def resolve(self, reference: dict) -> BoardCard | None:
+        """The board card of a reference, or None if its card is unknown."""
+        record = self.get(reference.get("id") or reference["code"])
+        if record is None:
+            logger.warning(f"Card {reference['code']} of a stored board not found in the card table or its sources")
+            return None
+        return BoardCard(record, **{field: reference.get(field, default) for field, default in INSTANCE_FIELDS.items()})
+
+    def stats(self) -> dict:
+        return {
+            "cards": len(self._cards),
+            "sources": len(self._sources),
+            "hits": self.hits,
+            "source_hits": self.source_hits,
+            "misses": self.misses,
+        }
+
+# Shared by every board store session. card_routes adds the API TCG card cache as a source
+card_table = CardTable(sources=[catalog_card])
+
+# endregion Card Table
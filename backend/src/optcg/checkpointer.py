@@ -0,0 +1,226 @@
+"""
+Persistent, bounded conversation checkpointer for the multi-agent graph.
+`BoundedSqliteSaver` stores checkpoints in a SQLite file in WAL mode, so conversations survive restarts and can be
+shared by several uvicorn workers, and keeps it bounded:
+- only the latest `keep_checkpoints` checkpoints of a thread are kept (the graph never needs older ones)
+- threads unused for `ttl` seconds are deleted
+- past `max_threads`, the least recently used threads are deleted
+
+`compact_thread` additionally truncates the oldest turns of a thread's message history past a token budget.
+"""
+
+# region Imports
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Sequence
+from langchain_core.messages import BaseMessage, RemoveMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+# Custom Imports
+from optcg.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# endregion Imports
+
+CHECKPOINTER_BACKEND = os.getenv("CHECKPOINTER_BACKEND", "sqlite") # "sqlite" or "memory"
+CHECKPOINTER_PATH = Path(os.getenv("CHECKPOINTER_PATH", Path.home() / ".cache" / "optcg_checkpoints" / "checkpoints.sqlite3")).expanduser()
+CHECKPOINT_THREAD_TTL = float(os.getenv("CHECKPOINT_THREAD_TTL", str(7 * 24 * 3600))) # Seconds since the thread was last used
+CHECKPOINT_MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", "10000"))
+CHECKPOINT_KEEP_PER_THREAD = int(os.getenv("CHECKPOINT_KEEP_PER_THREAD", "3"))
+CHECKPOINT_PRUNE_INTERVAL = 60 # Seconds between TTL/LRU sweeps
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "12000")) # Max tokens of stored message history per thread
+
+
+# region SQLite Checkpointer
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    `SqliteSaver` with bounded storage (see module docstring) and async methods, so the same saver serves `invoke`
+    (notebooks, `chat`) and `ainvoke`/`astream` (the API). Async calls run the SQLite operations in a worker thread.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, *, ttl: float = CHECKPOINT_THREAD_TTL, max_threads: int = CHECKPOINT_MAX_THREADS,
+                 keep_checkpoints: int = CHECKPOINT_KEEP_PER_THREAD, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.keep_checkpoints = max(keep_checkpoints, 2) # The latest checkpoint and its parent
+        self._last_prune = 0.0
+
+    @classmethod
+    def from_path(cls, path: Path = CHECKPOINTER_PATH, **kwargs) -> "BoundedSqliteSaver":
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # The saver serializes access with its own lock, so the connection may be shared between threads
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return cls(conn, **kwargs)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.execute("CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, last_used REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS thread_activity_last_used ON thread_activity (last_used)")
+        self.conn.commit()
+
+    # region Bounding
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        if not config["configurable"].get("checkpoint_ns"): # Root graph checkpoint, once per step
+            self._trim_thread(str(config["configurable"]["thread_id"]))
+            if time.time() - self._last_prune > CHECKPOINT_PRUNE_INTERVAL:
+                self.prune()
+        return saved
+
+    def _trim_thread(self, thread_id: str):
+        """Record the thread as used, and delete its checkpoints (and their writes) older than the latest `keep_checkpoints`."""
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO thread_activity (thread_id, last_used) VALUES (?, ?) ON CONFLICT (thread_id) DO UPDATE SET last_used = excluded.last_used",
+                (thread_id, time.time()),
+            )
+            # Checkpoint IDs are time-ordered, so subgraph checkpoints older than the oldest kept root checkpoint are stale too
+            row = cur.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+                (thread_id, self.keep_checkpoints - 1),
+            ).fetchone()
+            if row is not None:
+                cur.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id < ?", (thread_id, row[0]))
+                cur.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_id < ?", (thread_id, row[0]))
+
+    def prune(self) -> int:
+        """Delete threads past their TTL and the least recently used threads past `max_threads`. Returns how many were deleted."""
+        self._last_prune = time.time()
+        with self.cursor() as cur:
+            expired = [row[0] for row in cur.execute("SELECT thread_id FROM thread_activity WHERE last_used < ?", (time.time() - self.ttl,))]
+            overflow = [row[0] for row in cur.execute(
+                "SELECT thread_id FROM thread_activity WHERE last_used >= ? ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                (time.time() - self.ttl, self.max_threads),
+            )]
+        for thread_id in expired + overflow:
+            self.delete_thread(thread_id)
+        if expired or overflow:
+            logger.info(f"Pruned {len(expired)} expired and {len(overflow)} least recently used conversation threads")
+        return len(expired) + len(overflow)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    def thread_count(self) -> int:
+        with self.cursor(transaction=False) as cur:
+            return cur.execute("SELECT COUNT(*) FROM thread_activity").fetchone()[0]
+
+    # endregion Bounding
+
+    # region Async
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: RunnableConfig | None, *, filter: dict[str, Any] | None = None,
+                    before: RunnableConfig | None = None, limit: int | None = None) -> AsyncIterator[CheckpointTuple]:
+        checkpoints = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # endregion Async
+
+def create_checkpointer(backend: str = CHECKPOINTER_BACKEND) -> BaseCheckpointSaver:
+    """Create the checkpointer for the configured backend."""
+    if backend == "sqlite":
+        return BoundedSqliteSaver.from_path()
+    if backend == "memory":
+        return InMemorySaver()
+    raise ValueError(f"Unknown CHECKPOINTER_BACKEND: {backend!r} (expected 'sqlite' or 'memory')")
+
+_checkpointer: BaseCheckpointSaver | None = None
+_checkpointer_lock = threading.Lock()
+
+def get_checkpointer() -> BaseCheckpointSaver:
+    """The process's checkpointer, created on first use and shared by the agent graphs and the thread routes."""
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = create_checkpointer()
+                logger.debug(f"Created checkpointer: {type(_checkpointer).__name__}")
+    return _checkpointer
+
+# endregion SQLite Checkpointer
+
+
+# region History Compaction
+
+def messages_to_truncate(messages: list[BaseMessage], token_budget: int = HISTORY_TOKEN_BUDGET) -> list[BaseMessage]:
+    """
+    The oldest messages to drop so the history fits in `token_budget` tokens.
+    Whole turns are dropped (cuts are made at a human message, so no tool call loses its result), and the latest turn is always kept.
+    """
+    sizes = [count_tokens(message.content if isinstance(message.content, str) else str(message.content)) for message in messages]
+    total = sum(sizes)
+    if total <= token_budget:
+        return []
+    turn_starts = [index for index, message in enumerate(messages) if message.type == "human"]
+    cut = 0
+    for start in turn_starts[1:]: # Never cut past the start of the latest turn
+        if total - sum(sizes[:start]) <= token_budget:
+            cut = start
+            break
+        cut = start
+    return messages[:cut]
+
+def _messages_to_remove(messages: list[BaseMessage], token_budget: int, removable: Callable[[list[BaseMessage]], int] | None) -> list[BaseMessage]:
+    history = [message for message in messages if message.type != "system"] # A stored summary is not part of any turn
+    removed = messages_to_truncate(history, token_budget)
+    return removed[: removable(messages)] if removable is not None else removed
+
+def compact_thread(agent, thread_id: str, token_budget: int = HISTORY_TOKEN_BUDGET, as_node: str = "chat_agent",
+                   removable: Callable[[list[BaseMessage]], int] | None = None) -> int:
+    """
+    Truncate the oldest turns of a thread's stored message history past the token budget. Returns how many messages were removed.
+    With `removable`, at most its count of leading messages are removed, e.g. only those the thread's summary covers.
+    The removal is recorded as an update by `as_node`, the agent's entry node.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    messages = agent.get_state(config).values.get("messages", [])
+    removed = _messages_to_remove(messages, token_budget, removable)
+    if removed:
+        agent.update_state(config, {"messages": [RemoveMessage(id=message.id) for message in removed]}, as_node=as_node)
+        logger.debug(f"Compacted thread {thread_id}: removed {len(removed)} of {len(messages)} messages")
+    return len(removed)
+
+async def acompact_thread(agent, thread_id: str, token_budget: int = HISTORY_TOKEN_BUDGET, as_node: str = "chat_agent",
+                          removable: Callable[[list[BaseMessage]], int] | None = None) -> int:
+    """Async `compact_thread`."""
+    config = {"configurable": {"thread_id": thread_id}}
+    messages = (await agent.aget_state(config)).values.get("messages", [])
+    removed = _messages_to_remove(messages, token_budget, removable)
+    if removed:
+        await agent.aupdate_state(config, {"messages": [RemoveMessage(id=message.id) for message in removed]}, as_node=as_node)
+        logger.debug(f"Compacted thread {thread_id}: removed {len(removed)} of {len(messages)} messages")
+    return len(removed)
+
+# endregion History Compaction
@@ -0,0 +1,261 @@
+"""
+Persistent, content-addressed embedding cache.
+Wraps an `Embeddings` instance (e.g. `OpenAIEmbeddings`) so text that has been embedded before, by a vector store rebuild
+or a repeated retriever query, is never paid for twice.
+
+Vectors are stored as raw float32 rows in `vectors.f32`. `index.jsonl` is a journal mapping `sha256(model + text)`
+to a row: a `{"dim": ..., "generation": ...}` header, then one `[key, row]` line per cached text, oldest first.
+A miss writes its rows in place (rows freed by eviction are reused, the vector file is never rewritten) and appends
+its lines to the journal; eviction drops the least recently used entries in batches and rewrites only the journal.
+Writes hold a file lock, and each worker catches up with the others' journal lines before writing.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError: # Windows: no lock between processes, use one worker per cache directory
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_DIRECTORY = Path.home() / ".cache" / "optcg_embedding_cache"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "20000"))
+EMBEDDING_CACHE_EVICT_TO = 0.9 # Eviction drops entries down to this fraction of max_entries
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper backed by an on-disk cache with least-recently-used eviction."""
+
+    def __init__(self, underlying: Embeddings, model_name: str, cache_dir: Path = EMBEDDING_CACHE_DIRECTORY, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) / model_name
+        self.vectors_path = self.cache_dir / "vectors.f32"
+        self.index_path = self.cache_dir / "index.jsonl"
+        self.lock_path = self.cache_dir / "cache.lock"
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._clock = 0 # Logical time for LRU ordering
+        self._index: dict[str, list[int]] = {} # key -> [row, last_used]
+        self._keys_by_row: dict[int, str] = {}
+        self._free_rows: set[int] = set() # Rows of vectors.f32 no key points to
+        self._rows = 0 # Rows in vectors.f32
+        self._dim = 0
+        self._vectors = np.empty((0, 0), dtype=np.float32) # Preallocated, grown geometrically, at least `_rows` rows
+        self._generation = None # Of the journal read so far, None until there is one
+        self._journal_offset = 0
+        with self._lock:
+            self._sync()
+
+    # region Storage
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the cache directory, held by writers in every worker."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _reset(self):
+        self._index, self._keys_by_row, self._free_rows = {}, {}, set()
+        self._generation, self._journal_offset = None, 0
+
+    def _sync(self):
+        """Catch up with the journal, which other workers may have appended to or rewritten since it was last read."""
+        try:
+            with open(self.index_path, "rb") as f:
+                header = json.loads(f.readline())
+                reload = header["generation"] != self._generation
+                if reload:
+                    self._reset()
+                    self._generation, self._dim = header["generation"], header["dim"]
+                    self._journal_offset = f.tell()
+                f.seek(self._journal_offset)
+                data = f.read()
+            lines = data[:data.rfind(b"\n") + 1] # A line still being written is read on the next sync
+            rows = []
+            for line in lines.splitlines():
+                key, row = json.loads(line)
+                self._assign(key, row)
+                rows.append(row)
+            self._journal_offset += len(lines)
+            if reload or rows:
+                self._load_vectors(None if reload else rows)
+        except FileNotFoundError:
+            if self._generation is not None: # Deleted
+                self._reset()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Embedding cache at {self.cache_dir} is unreadable, starting empty: {e}")
+            self._reset() # The next write rewrites the journal
+
+    def _load_vectors(self, rows: list[int] | None):
+        """Read the given rows (all rows if None) of the vector file, written by other workers, and find the free ones."""
+        previous_rows = 0 if rows is None else self._rows
+        self._rows = os.path.getsize(self.vectors_path) // (4 * self._dim) if self._dim and self.vectors_path.exists() else 0
+        for key in [key for row, key in self._keys_by_row.items() if row >= self._rows]: # Journal without its vectors
+            del self._keys_by_row[self._index.pop(key)[0]]
+        self._reserve(self._rows)
+        if rows is None:
+            count = self._rows * self._dim
+            self._vectors[:self._rows] = np.fromfile(self.vectors_path, dtype=np.float32, count=count).reshape(self._rows, self._dim)
+            self._free_rows = set(range(self._rows)).difference(self._keys_by_row)
+            logger.debug(f"Loaded {len(self._index)} cached embeddings for {self.model_name}")
+            return
+        with open(self.vectors_path, "rb") as f:
+            for row in rows:
+                if row < self._rows:
+                    f.seek(row * 4 * self._dim)
+                    self._vectors[row] = np.frombuffer(f.read(4 * self._dim), dtype=np.float32)
+        self._free_rows.update(row for row in range(previous_rows, self._rows) if row not in self._keys_by_row)
+
+    def _reserve(self, rows: int):
+        if self._vectors.shape[0] >= rows and self._vectors.shape[1] == self._dim:
+            return
+        vectors = np.empty((max(rows, 2 * self._vectors.shape[0], 64), self._dim), dtype=np.float32)
+        if self._vectors.shape[1] == self._dim:
+            vectors[:len(self._vectors)] = self._vectors
+        self._vectors = vectors
+
+    def _assign(self, key: str, row: int):
+        previous_key = self._keys_by_row.get(row)
+        if previous_key is not None and previous_key != key:
+            del self._index[previous_key]
+        previous = self._index.get(key)
+        if previous is not None and previous[0] != row:
+            del self._keys_by_row[previous[0]]
+            self._free_rows.add(previous[0])
+        self._clock += 1
+        self._index[key] = [row, self._clock]
+        self._keys_by_row[row] = key
+        self._free_rows.discard(row)
+
+    def _write_index(self):
+        """Rewrite the journal with the live entries, least recently used first."""
+        self._generation = uuid.uuid4().hex
+        entries = sorted(self._index.items(), key=lambda item: item[1][1])
+        data = "".join([json.dumps({"dim": self._dim, "generation": self._generation}) + "\n"]
+                       + [json.dumps([key, entry[0]]) + "\n" for key, entry in entries]).encode("utf-8")
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.index_path)
+        self._journal_offset = len(data)
+
+    def _append(self, keys: list[str], vectors: np.ndarray):
+        """Write new rows to the vector file and journal, evicting least-recently-used entries past `max_entries`."""
+        with self._file_lock():
+            self._sync()
+            new = [(key, vector) for key, vector in zip(keys, vectors) if key not in self._index] # Not added meanwhile
+            if not new:
+                return
+            if self._dim != vectors.shape[1]: # First vectors, or another embedding size
+                self._reset()
+                self._rows, self._dim = 0, vectors.shape[1]
+            rows = sorted(self._free_rows)[:len(new)]
+            rows += range(self._rows, self._rows + len(new) - len(rows))
+            self._rows = max(self._rows, rows[-1] + 1)
+            self._reserve(self._rows)
+
+            with open(self.vectors_path, "r+b" if self.vectors_path.exists() else "wb") as f:
+                for row, (_, vector) in zip(rows, new):
+                    f.seek(row * 4 * self._dim)
+                    f.write(vector.tobytes())
+            for row, (key, vector) in zip(rows, new):
+                self._vectors[row] = vector
+                self._assign(key, row)
+
+            if len(self._index) > self.max_entries:
+                self._evict()
+            elif self._generation is None:
+                self._write_index()
+            else:
+                lines = "".join(json.dumps([key, row]) + "\n" for row, (key, _) in zip(rows, new)).encode("utf-8")
+                with open(self.index_path, "ab") as f:
+                    f.write(lines)
+                self._journal_offset += len(lines)
+
+    def _evict(self):
+        """Drop least-recently-used entries down to 90% of `max_entries`, freeing their rows for the next misses."""
+        entries = sorted(self._index.items(), key=lambda item: item[1][1])
+        evicted = entries[:len(entries) - int(self.max_entries * EMBEDDING_CACHE_EVICT_TO)]
+        for key, (row, _) in evicted:
+            del self._index[key], self._keys_by_row[row]
+            self._free_rows.add(row)
+        self.evictions += len(evicted)
+        self._write_index()
+        logger.debug(f"Evicted {len(evicted)} cached embeddings, {len(self._index)} left")
+
+    # endregion Storage
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        for key in keys:
+            entry = self._index.get(key)
+            if entry is not None:
+                self._clock += 1
+                entry[1] = self._clock
+                found[key] = self._vectors[entry[0]].tolist()
+        return found
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents, batching every cache miss into a single call to the underlying model."""
+        keys = [self.key(text) for text in texts]
+        with self._lock:
+            found = self._lookup(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found} # Also dedupes repeated texts
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            new_vectors = np.asarray(self.underlying.embed_documents(list(missing.values())), dtype=np.float32)
+            with self._lock:
+                self._append(list(missing), new_vectors)
+            found.update(zip(missing, new_vectors.tolist()))
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self.key(text)
+        with self._lock:
+            found = self._lookup([key])
+        if key in found:
+            self.hits += 1
+            return found[key]
+        self.misses += 1
+        vector = np.asarray([self.underlying.embed_query(text)], dtype=np.float32)
+        with self._lock:
+            self._append([key], vector)
+        return vector[0].tolist()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "size": len(self._index),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
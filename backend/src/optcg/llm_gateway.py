@@ -0,0 +1,502 @@
+"""
+Shared gateway for the outbound LLM calls of the analysis graph, the ReAct agents and the history summarizer.
+
+Every chat model of the agents is wrapped with `gated`, so that the calls to one model, from every agent and user:
+- run at most `LLM_MAX_CONCURRENCY` at a time; the others wait for a slot in FIFO order
+- are admitted only while fewer than `LLM_MAX_QUEUE` calls wait, and wait at most `LLM_QUEUE_TIMEOUT` seconds,
+  otherwise they fail fast with `LLMGatewayOverloaded` (HTTP 503) instead of piling up behind a burst
+- are paced by token buckets of requests and tokens per minute, set per model with `LLM_RATE_LIMITS`, or else learned
+  from the `x-ratelimit-limit-*` headers of the responses (starting from the OpenAI usage tier 1 limits)
+- are coalesced when byte-identical to a call in flight (same model, parameters, messages and tools): the identical
+  calls wait for that call's response instead of sending the prompt again
+
+Sync callers (`invoke` in worker threads) and async callers (`ainvoke` on the event loop) share the same slots.
+Streamed calls take a slot and are rate limited, but are not coalesced.
+"""
+
+# region Imports
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, convert_to_openai_messages
+from langchain_core.outputs import ChatResult
+from langchain_core.runnables import RunnableBinding, RunnableSequence
+
+# Custom Imports
+from optcg.metrics import LLM_GATEWAY_ACTIVE, LLM_GATEWAY_CALLS, LLM_GATEWAY_QUEUE_DEPTH, LLM_GATEWAY_WAIT_SECONDS
+from optcg.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# endregion Imports
+
+LLM_GATEWAY = os.getenv("LLM_GATEWAY", "true").lower() == "true" # Otherwise the models call OpenAI directly
+LLM_COALESCE = os.getenv("LLM_COALESCE", "true").lower() == "true"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16")) # Per model and process
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30")) # Seconds, for a slot and for the rate limits each
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "500")) # Reserved per call, unless `max_tokens` is set
+LLM_LEARN_RATE_LIMITS = os.getenv("LLM_LEARN_RATE_LIMITS", "true").lower() == "true" # From the x-ratelimit-* response headers
+
+# Requests and tokens per minute, OpenAI usage tier 1: only the starting point of models without LLM_RATE_LIMITS
+# ("gpt-4.1=5000:450000,..."), until their responses report the account's limits
+DEFAULT_RATE_LIMIT = (500, 200_000)
+TIER_RATE_LIMITS = {
+    "gpt-4.1": (500, 30_000),
+    "gpt-5-mini": (500, 500_000),
+    "gpt-5-nano": (500, 200_000),
+}
+
+def parse_rate_limits(value: str) -> dict[str, tuple[int, int]]:
+    """"gpt-4.1=5000:450000,gpt-5-nano=5000:2000000" -> {"gpt-4.1": (5000, 450000), ...}"""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        try:
+            model, rates = entry.split("=", 1)
+            requests, tokens = rates.split(":", 1)
+            limits[model.strip()] = (int(requests), int(tokens))
+        except ValueError:
+            logger.warning(f"Ignoring malformed LLM_RATE_LIMITS entry {entry!r}, expected MODEL=REQUESTS:TOKENS")
+    return limits
+
+CONFIGURED_RATE_LIMITS = parse_rate_limits(os.getenv("LLM_RATE_LIMITS", ""))
+
+def parse_rate_limit_headers(headers: dict) -> tuple[int | None, int | None]:
+    """The requests and tokens per minute of the `x-ratelimit-limit-requests`/`-tokens` response headers, if present."""
+    limits = []
+    for name in ("x-ratelimit-limit-requests", "x-ratelimit-limit-tokens"):
+        value = next((value for key, value in headers.items() if key.lower() == name), None)
+        try:
+            limits.append(int(value) if value is not None else None)
+        except ValueError:
+            limits.append(None)
+    return limits[0], limits[1]
+
+
+class LLMGatewayOverloaded(Exception):
+    """The call was not admitted: too many calls queued for the model, or its rate limits are exhausted for too long."""
+
+    def __init__(self, model: str, reason: str, retry_after: float = LLM_QUEUE_TIMEOUT):
+        super().__init__(f"LLM gateway overloaded for {model}: {reason}")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units a minute, holding at most a minute's worth.
+    Reservations may overdraw it: the caller then waits until the debt is refilled, so concurrent callers are paced in turn.
+    Not thread-safe, the gate holds its lock around it.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def resize(self, per_minute: int):
+        """Change the rate, keeping what was taken from the bucket since it was full."""
+        taken = self.capacity - self.level
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.level = self.capacity - taken
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` units and return the seconds to wait before using them."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount: float):
+        self.level += min(amount, self.capacity)
+
+
+class _InFlight:
+    """A call that identical calls wait for. Sync followers wait on the event, async ones on their future."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: ChatResult | None = None
+        self.error: BaseException | None = None
+        self.cancelled = False # The followers then make the call themselves
+        self.futures: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def outcome(self) -> ChatResult:
+        if self.error is not None:
+            raise self.error
+        return copy.deepcopy(self.result) # Followers may mutate their messages
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+def _wake(loop: asyncio.AbstractEventLoop, future: asyncio.Future) -> bool:
+    try:
+        loop.call_soon_threadsafe(_resolve, future)
+        return True
+    except RuntimeError: # The waiter's event loop is closed
+        return False
+
+
+class ModelGate:
+    """Concurrency slots, rate limits and in-flight calls of one model."""
+
+    def __init__(self, model: str, max_concurrency: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE,
+                 requests_per_minute: int | None = None, tokens_per_minute: int | None = None):
+        configured = CONFIGURED_RATE_LIMITS.get(model)
+        default_requests, default_tokens = configured or TIER_RATE_LIMITS.get(model, DEFAULT_RATE_LIMIT)
+        if not configured and not (requests_per_minute and tokens_per_minute):
+            logger.warning(
+                f"No LLM_RATE_LIMITS for {model}, assuming OpenAI usage tier 1 ({default_requests} requests, "
+                f"{default_tokens} tokens per minute)" + (" until its responses report the account's limits" if LLM_LEARN_RATE_LIMITS else "")
+            )
+        self.model = model
+        # Limits set by LLM_RATE_LIMITS or the caller are kept, the tier 1 defaults are replaced by the reported ones
+        self.learns_limits = LLM_LEARN_RATE_LIMITS and not configured and not (requests_per_minute or tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.requests = TokenBucket(requests_per_minute or default_requests)
+        self.tokens = TokenBucket(tokens_per_minute or default_tokens)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: deque[threading.Event | tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._inflight: dict[str, _InFlight] = {}
+        self.admitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def _update_gauges(self):
+        LLM_GATEWAY_QUEUE_DEPTH.labels(self.model).set(len(self._waiters))
+        LLM_GATEWAY_ACTIVE.labels(self.model).set(self._active)
+
+    def _reject(self, reason: str, retry_after: float = LLM_QUEUE_TIMEOUT) -> LLMGatewayOverloaded:
+        self.rejected += 1
+        LLM_GATEWAY_CALLS.labels(self.model, "rejected").inc()
+        logger.warning(f"LLM gateway rejected a call to {self.model}: {reason}")
+        return LLMGatewayOverloaded(self.model, reason, retry_after)
+
+    # region Slots
+
+    def _enqueue(self, waiter) -> bool:
+        """Take a free slot (True), or queue `waiter` to be handed the next one (False). Raises when the queue is full."""
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                self._update_gauges()
+                return True
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject(f"{len(self._waiters)} calls queued")
+            self._waiters.append(waiter)
+            self._update_gauges()
+            return False
+
+    def _abandon(self, waiter) -> bool:
+        """Leave the queue. False if the waiter was handed a slot meanwhile, which it then holds."""
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                return False
+            self._update_gauges()
+            return True
+
+    def _release(self):
+        """Hand the slot to the first waiter, or free it."""
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    break
+                if _wake(*waiter):
+                    break
+            else:
+                self._active -= 1
+            self._update_gauges()
+
+    def _reserve(self, prompt_tokens: int) -> float:
+        """Reserve one request and the call's tokens, returns the seconds to wait for them."""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(self.requests.reserve(1, now), self.tokens.reserve(prompt_tokens, now))
+            if delay > LLM_QUEUE_TIMEOUT:
+                self.requests.refund(1)
+                self.tokens.refund(prompt_tokens)
+                raise self._reject(f"rate limited for {delay:.0f} s", retry_after=delay)
+            self.admitted += 1
+        LLM_GATEWAY_CALLS.labels(self.model, "admitted").inc()
+        return delay
+
+    @contextmanager
+    def slot(self, tokens: int):
+        """Hold a concurrency slot, once the rate limits allow `tokens` more tokens (sync callers)."""
+        start = time.perf_counter()
+        waiter = threading.Event()
+        if not self._enqueue(waiter):
+            if not waiter.wait(LLM_QUEUE_TIMEOUT) and self._abandon(waiter):
+                raise self._reject(f"no slot within {LLM_QUEUE_TIMEOUT:.0f} s")
+        try:
+            delay = self._reserve(tokens)
+            if delay:
+                time.sleep(delay)
+            LLM_GATEWAY_WAIT_SECONDS.labels(self.model).observe(time.perf_counter() - start)
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self, tokens: int):
+        """Hold a concurrency slot, once the rate limits allow `tokens` more tokens (async callers)."""
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        if not self._enqueue(waiter):
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter[1]), LLM_QUEUE_TIMEOUT)
+            except TimeoutError:
+                if self._abandon(waiter):
+                    raise self._reject(f"no slot within {LLM_QUEUE_TIMEOUT:.0f} s") from None
+            except asyncio.CancelledError:
+                if not self._abandon(waiter):
+                    self._release()
+                raise
+        try:
+            delay = self._reserve(tokens)
+            if delay:
+                await asyncio.sleep(delay)
+            LLM_GATEWAY_WAIT_SECONDS.labels(self.model).observe(time.perf_counter() - start)
+            yield
+        finally:
+            self._release()
+
+    def learn_limits(self, headers: dict):
+        """Resize the rate limits to those reported by the `x-ratelimit-limit-*` headers of a response."""
+        if not self.learns_limits or not headers:
+            return
+        requests_per_minute, tokens_per_minute = parse_rate_limit_headers(headers)
+        with self._lock:
+            changed = []
+            for bucket, limit, unit in ((self.requests, requests_per_minute, "requests"), (self.tokens, tokens_per_minute, "tokens")):
+                if limit and limit != int(bucket.capacity):
+                    bucket.resize(limit)
+                    changed.append(f"{limit} {unit}")
+        if changed:
+            logger.info(f"LLM gateway rate limits of {self.model} set to {', '.join(changed)} per minute, as reported by the API")
+
+    # endregion Slots
+
+    # region Coalescing
+
+    def _join(self, key: str | None, loop: asyncio.AbstractEventLoop | None = None) -> tuple[_InFlight | None, asyncio.Future | None, bool]:
+        """The in-flight call for `key` and whether this caller leads it, with a future to await for async followers."""
+        if key is None:
+            return None, None, True
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is None:
+                entry = self._inflight[key] = _InFlight()
+                return entry, None, True
+            self.coalesced += 1
+            future = None
+            if loop is not None:
+                future = loop.create_future()
+                entry.futures.append((loop, future))
+        LLM_GATEWAY_CALLS.labels(self.model, "coalesced").inc()
+        return entry, future, False
+
+    def _finish(self, key: str | None, entry: _InFlight | None, result: ChatResult | None = None, error: BaseException | None = None):
+        if entry is None:
+            return
+        with self._lock:
+            self._inflight.pop(key, None) # No follower joins past this point
+        entry.result = result
+        entry.error = error
+        entry.cancelled = isinstance(error, (asyncio.CancelledError, GeneratorExit, KeyboardInterrupt))
+        entry.done.set()
+        for loop, future in entry.futures:
+            _wake(loop, future)
+
+    def call(self, key: str | None, tokens, func) -> ChatResult:
+        """`func()` within a slot, or the result of the identical call in flight. `tokens()` estimates the call's tokens."""
+        while True:
+            entry, _, leader = self._join(key)
+            if leader:
+                break
+            entry.done.wait()
+            if not entry.cancelled:
+                return entry.outcome()
+        try:
+            with self.slot(tokens()):
+                result = func()
+        except BaseException as e:
+            self._finish(key, entry, error=e)
+            raise
+        self._finish(key, entry, result=result)
+        self.learn_limits(response_headers(result))
+        return result
+
+    async def acall(self, key: str | None, tokens, afunc) -> ChatResult:
+        """Async `call`: awaits `afunc()` within a slot, or the result of the identical call in flight."""
+        while True:
+            entry, future, leader = self._join(key, asyncio.get_running_loop())
+            if leader:
+                break
+            await future
+            if not entry.cancelled:
+                return entry.outcome()
+        try:
+            async with self.aslot(tokens()):
+                result = await afunc()
+        except BaseException as e:
+            self._finish(key, entry, error=e)
+            raise
+        self._finish(key, entry, result=result)
+        self.learn_limits(response_headers(result))
+        return result
+
+    # endregion Coalescing
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "requests_per_minute": int(self.requests.capacity),
+                "tokens_per_minute": int(self.tokens.capacity),
+                "learns_rate_limits": self.learns_limits,
+                "active": self._active,
+                "queued": len(self._waiters),
+                "in_flight_prompts": len(self._inflight),
+                "admitted": self.admitted,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+            }
+
+
+class LLMGateway:
+    """One gate per model name, shared by every model instance of that name in the process."""
+
+    def __init__(self):
+        self._gates: dict[str, ModelGate] = {}
+        self._lock = threading.Lock()
+
+    def gate(self, model: str) -> ModelGate:
+        with self._lock:
+            if model not in self._gates:
+                self._gates[model] = ModelGate(model)
+            return self._gates[model]
+
+    def stats(self) -> dict:
+        with self._lock:
+            gates = dict(self._gates)
+        return {"enabled": LLM_GATEWAY, "coalesce": LLM_COALESCE, "models": {model: gate.stats() for model, gate in gates.items()}}
+
+# Shared by every agent and reported by /health
+llm_gateway = LLMGateway()
+
+
+# region Chat Model
+
+def response_headers(result: ChatResult | None) -> dict:
+    """The HTTP response headers of a call, kept by chat models created with `include_response_headers=True`."""
+    for generation in (result.generations if result else []):
+        headers = (generation.generation_info or {}).get("headers") or generation.message.response_metadata.get("headers")
+        if headers:
+            return headers
+    return {}
+
+def _prompt_key(params: dict, messages: list[BaseMessage], stop: list[str] | None, kwargs: dict) -> str:
+    """Hash of what is sent to the provider: model parameters, messages in the wire format (without message IDs) and tools."""
+    payload = {"params": params, "messages": convert_to_openai_messages(messages), "stop": stop, "kwargs": kwargs}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=repr).encode()).hexdigest()
+
+class GatedChatModel(BaseChatModel):
+    """
+    Chat model whose calls go through the gate of its model. Tool binding and structured output are delegated to the
+    wrapped model, then rebound to the wrapper so that their calls are gated too.
+    """
+
+    inner: BaseChatModel
+    gate: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return self.inner._llm_type
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return self.inner._identifying_params
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        return self.inner._get_ls_params(stop=stop, **kwargs)
+
+    def _should_stream(self, *, async_api: bool, run_manager=None, **kwargs) -> bool:
+        return self.inner._should_stream(async_api=async_api, run_manager=run_manager, **kwargs)
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(**self.inner.bind_tools(tools, **kwargs).kwargs)
+
+    def with_structured_output(self, schema, **kwargs):
+        structured = self.inner.with_structured_output(schema, **kwargs)
+        steps = structured.steps if isinstance(structured, RunnableSequence) else []
+        if steps and isinstance(steps[0], RunnableBinding) and steps[0].bound is self.inner:
+            return RunnableSequence(self.bind(**steps[0].kwargs).with_config(steps[0].config), *steps[1:])
+        return super().with_structured_output(schema, **kwargs) # Through `bind_tools`
+
+    def _tokens(self, messages: list[BaseMessage], kwargs: dict) -> int:
+        max_tokens = kwargs.get("max_tokens") or getattr(self.inner, "max_tokens", None) or LLM_EXPECTED_OUTPUT_TOKENS
+        return sum(count_tokens(message.content if isinstance(message.content, str) else str(message.content)) for message in messages) + max_tokens
+
+    def _key(self, messages: list[BaseMessage], stop: list[str] | None, kwargs: dict) -> str | None:
+        return _prompt_key(self._identifying_params, messages, stop, kwargs) if LLM_COALESCE else None
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self.gate.call(
+            self._key(messages, stop, kwargs), lambda: self._tokens(messages, kwargs),
+            lambda: self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await self.gate.acall(
+            self._key(messages, stop, kwargs), lambda: self._tokens(messages, kwargs),
+            lambda: self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        with self.gate.slot(self._tokens(messages, kwargs)):
+            for chunk in self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                self.gate.learn_limits((chunk.generation_info or {}).get("headers")) # Sent with the first chunk
+                yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        async with self.gate.aslot(self._tokens(messages, kwargs)):
+            async for chunk in self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                self.gate.learn_limits((chunk.generation_info or {}).get("headers"))
+                yield chunk
+
+
+def model_name(model: BaseChatModel) -> str:
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or model._llm_type
+
+def gated(model: BaseChatModel) -> BaseChatModel:
+    """Route the calls of `model` through the shared gateway, unless it is disabled (LLM_GATEWAY=false)."""
+    if not LLM_GATEWAY:
+        return model
+    gate = llm_gateway.gate(model_name(model))
+    if gate.learns_limits and "include_response_headers" in type(model).model_fields:
+        model = model.model_copy(update={"include_response_headers": True}) # For the x-ratelimit-* headers
+    return GatedChatModel(inner=model, gate=gate)
+
+# endregion Chat Model
@@ -0,0 +1,205 @@
+"""
+Prometheus metrics of the API, exported in the text format on `/metrics`:
+- HTTP requests per route template (`MetricsMiddleware`), until the last byte of the response, so streams included
+- agent graph node runs per node path, e.g. "board_analyst/router" or "chat_agent/agent" (`GraphMetricsHandler`)
+- LLM calls per model and node, with their prompt and completion tokens (`GraphMetricsHandler`)
+- LLM gateway queue depth, slots in use, waits and admission outcomes per model (`llm_gateway`)
+- API TCG requests per endpoint (`observe_apitcg_request`)
+
+Metrics are per process: with several uvicorn workers, every scrape sees one worker.
+"""
+
+# region Imports
+import logging
+import threading
+import time
+from typing import Any
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+logger = logging.getLogger(__name__)
+
+# endregion Imports
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0) # Seconds
+MAX_TRACKED_RUNS = 10000 # Runs that never report their end (e.g. a dropped stream) are forgotten past this
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "optcg_http_request_duration_seconds", "HTTP request duration, until the response is fully sent",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+GRAPH_NODE_SECONDS = Histogram(
+    "optcg_graph_node_duration_seconds", "Agent graph node run duration",
+    ["node", "status"], buckets=LATENCY_BUCKETS,
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "optcg_llm_request_duration_seconds", "LLM call duration",
+    ["model", "node", "status"], buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter("optcg_llm_tokens", "LLM tokens", ["model", "node", "kind"]) # kind: prompt or completion
+LLM_GATEWAY_QUEUE_DEPTH = Gauge("optcg_llm_gateway_queue_depth", "LLM calls waiting for a concurrency slot", ["model"])
+LLM_GATEWAY_ACTIVE = Gauge("optcg_llm_gateway_active_calls", "LLM calls holding a concurrency slot", ["model"])
+LLM_GATEWAY_WAIT_SECONDS = Histogram(
+    "optcg_llm_gateway_wait_seconds", "Time an LLM call waited for a slot and for the rate limits",
+    ["model"], buckets=LATENCY_BUCKETS,
+)
+LLM_GATEWAY_CALLS = Counter("optcg_llm_gateway_calls", "LLM calls by gateway outcome", ["model", "outcome"]) # admitted, coalesced or rejected
+APITCG_REQUEST_SECONDS = Histogram(
+    "optcg_apitcg_request_duration_seconds", "API TCG request duration, per attempt",
+    ["endpoint", "status"], buckets=LATENCY_BUCKETS,
+)
+
+
+def metrics_payload() -> tuple[bytes, str]:
+    """The metrics in the Prometheus text format, and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# region HTTP
+
+def route_template(scope) -> str:
+    """The matched route's path template ("/cards/{card_id}"), to bound label cardinality."""
+    route = scope.get("route") # Set by the router on a match
+    if route is None:
+        return "unmatched"
+    path = scope["path"]
+    if route.path_regex.match(path):
+        return route.path
+    # Newer FastAPI versions keep an included router's routes without its prefix: the prefix is what precedes the match
+    for index, char in enumerate(path):
+        if char == "/" and route.path_regex.match(path[index:]):
+            return path[:index] + route.path
+    return route.path
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request, labeled by the matched route's path template (not the raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500 # Unless a response starts
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route_template(scope), str(status)).observe(time.perf_counter() - start)
+
+# endregion HTTP
+
+
+# region Agent Graphs
+
+def node_path(metadata: dict | None) -> str | None:
+    """"board_analyst/router" for the router inside the board analyst subgraph, from the run's checkpoint namespace."""
+    namespace = (metadata or {}).get("langgraph_checkpoint_ns")
+    if not namespace:
+        return None
+    return "/".join(part.split(":", 1)[0] for part in namespace.split("|"))
+
+def _model_name(metadata: dict | None, kwargs: dict) -> str:
+    params = kwargs.get("invocation_params") or {}
+    return (metadata or {}).get("ls_model_name") or params.get("model") or params.get("model_name") or "unknown"
+
+class GraphMetricsHandler(BaseCallbackHandler):
+    """
+    Callback handler recording graph node and LLM call metrics, shared by every agent run.
+    The first run of a graph task (identified by its checkpoint namespace) is the node itself; runs nested in it are not nodes.
+    """
+
+    run_inline = True # Cheap, and keeps async runs from scheduling every callback in a thread
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks: set[str] = set()
+        self._nodes: dict[UUID, tuple[str, str, float]] = {} # run ID -> (checkpoint namespace, node path, start)
+        self._llm_calls: dict[UUID, tuple[str, str, float]] = {} # run ID -> (model, node path, start)
+
+    def _forget_stale_runs(self):
+        if len(self._nodes) > MAX_TRACKED_RUNS or len(self._llm_calls) > MAX_TRACKED_RUNS:
+            logger.warning("Too many unfinished runs tracked for metrics, forgetting them")
+            self._tasks.clear()
+            self._nodes.clear()
+            self._llm_calls.clear()
+
+    # Nodes
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, metadata: dict | None = None, **kwargs: Any):
+        namespace = (metadata or {}).get("langgraph_checkpoint_ns")
+        if not namespace:
+            return
+        with self._lock:
+            if namespace not in self._tasks:
+                self._forget_stale_runs()
+                self._tasks.add(namespace)
+                self._nodes[run_id] = (namespace, node_path(metadata), time.perf_counter())
+
+    def _end_node(self, run_id: UUID, status: str):
+        with self._lock:
+            node = self._nodes.pop(run_id, None)
+            if node:
+                self._tasks.discard(node[0])
+        if node:
+            GRAPH_NODE_SECONDS.labels(node[1], status).observe(time.perf_counter() - node[2])
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any):
+        self._end_node(run_id, "ok")
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        # LangGraph ends the node that hands off or routes with a `Command` through a ParentCommand "error"
+        self._end_node(run_id, "ok" if type(error).__name__ in ("ParentCommand", "GraphBubbleUp", "GraphInterrupt") else "error")
+
+    # LLM calls
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: dict | None = None, **kwargs: Any):
+        with self._lock:
+            self._forget_stale_runs()
+            self._llm_calls[run_id] = (_model_name(metadata, kwargs), node_path(metadata) or "none", time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            call = self._llm_calls.pop(run_id, None)
+        if not call:
+            return
+        model, node, start = call
+        LLM_REQUEST_SECONDS.labels(model, node, "ok").observe(time.perf_counter() - start)
+        usage = None
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        if usage is None and response.llm_output: # Older integrations report usage here
+            token_usage = response.llm_output.get("token_usage") or {}
+            usage = {"input_tokens": token_usage.get("prompt_tokens", 0), "output_tokens": token_usage.get("completion_tokens", 0)}
+        if usage:
+            LLM_TOKENS.labels(model, node, "prompt").inc(usage.get("input_tokens", 0))
+            LLM_TOKENS.labels(model, node, "completion").inc(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            call = self._llm_calls.pop(run_id, None)
+        if call:
+            LLM_REQUEST_SECONDS.labels(call[0], call[1], "error").observe(time.perf_counter() - call[2])
+
+# Passed in the config of every agent run (see `agents.utils`)
+graph_metrics_handler = GraphMetricsHandler()
+
+# endregion Agent Graphs
+
+
+# region API TCG
+
+def observe_apitcg_request(endpoint: str, status: int | str, seconds: float):
+    APITCG_REQUEST_SECONDS.labels(endpoint, str(status)).observe(seconds)
+
+# endregion API TCG
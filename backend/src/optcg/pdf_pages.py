@@ -0,0 +1,77 @@
+"""
+Page text extraction for the rulebook PDFs, in this process or in a process pool.
+Depends on pypdf only: pool workers are spawned (forking the multithreaded API process can deadlock) and import this
+module, so they start in a fraction of a second instead of importing chromadb and langchain with `vectorstore_logic`.
+A page takes a few milliseconds to extract, so small PDFs are extracted serially: a pool only pays off past
+`RULEBOOK_PARALLEL_MIN_PAGES` pages. Check changes with `benchmarks/pdf_extraction.py`.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+RULEBOOK_EXTRACTION_WORKERS = int(os.getenv("RULEBOOK_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1)))) # 1 = serial extraction
+RULEBOOK_PARALLEL_MIN_PAGES = int(os.getenv("RULEBOOK_PARALLEL_MIN_PAGES", "300")) # Fewer pages in total are extracted serially
+
+
+def count_pages(path) -> int:
+    return len(PdfReader(path).pages)
+
+def extract_page_texts(path, page_numbers: list[int]) -> list[tuple[int, str]]:
+    """Process pool worker: extract the text of the given pages of a PDF."""
+    reader = PdfReader(path)
+    return [(page_number, reader.pages[page_number].extract_text()) for page_number in page_numbers]
+
+def extract_pages(paths: dict, workers: int = RULEBOOK_EXTRACTION_WORKERS, min_pages: int = RULEBOOK_PARALLEL_MIN_PAGES) -> dict:
+    """
+    Extract every page of each PDF, in a pool of `workers` processes if they have at least `min_pages` pages in total.
+
+    Args:
+        paths: Dict of name -> PDF path
+
+    Returns:
+        Dict of name -> list of page texts, or None for a PDF that could not be parsed
+    """
+    page_texts, page_counts = {}, {}
+    for name, path in paths.items():
+        try:
+            page_counts[name] = count_pages(path)
+            page_texts[name] = [None] * page_counts[name]
+        except Exception as e:
+            logger.error(f"Error loading PDF {path}: {e}")
+            page_texts[name] = None
+
+    parallel = workers > 1 and sum(page_counts.values()) >= min_pages
+    tasks = []
+    for name, num_pages in page_counts.items():
+        # One batch of pages per worker, so each worker opens the PDF once per batch
+        batch_size = max(1, -(-num_pages // workers)) if parallel else max(1, num_pages)
+        for start in range(0, num_pages, batch_size):
+            tasks.append((name, str(paths[name]), list(range(start, min(start + batch_size, num_pages)))))
+
+    failed = set()
+    def collect(name, extract):
+        try:
+            extracted = extract()
+        except Exception as e:
+            logger.error(f"Error extracting pages of PDF {name}: {e}")
+            failed.add(name)
+            return
+        for page_number, text in extracted:
+            page_texts[name][page_number] = text
+
+    if parallel and tasks:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [(name, executor.submit(extract_page_texts, path, page_numbers)) for name, path, page_numbers in tasks]
+            for name, future in futures:
+                collect(name, future.result)
+    else:
+        for name, path, page_numbers in tasks:
+            collect(name, lambda: extract_page_texts(path, page_numbers))
+    for name in failed:
+        page_texts[name] = None
+    return page_texts
@@ -1,23 +1,31 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+import asyncio
+import json
 import logging
 import uuid
 
 # Custom Imports
 from optcg import state
 from optcg.schemas import ChatRequest, ChatResponse
-from optcg.agents import multi_agent_graph, chat
+from optcg.agents import get_multi_agent_graph, achat, astream_chat
+from optcg.agents.context_window import CONTEXT_SUMMARY_ENABLED, aupdate_context_summary, summarized_count
+from optcg.board_store import get_board_store
+from optcg.checkpointer import acompact_thread, get_checkpointer
+from optcg.llm_gateway import LLMGatewayOverloaded
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 AVAILABLE_AGENTS = ["multi_agent"]
 
-def get_or_create_agent(agent_type: str):
-    """Get or create an agent instance"""
+async def get_or_create_agent(agent_type: str):
+    """Get or create an agent instance. The first build (vector store, rulebook embedding) runs in a worker thread"""
     logger.debug(f"Requesting agent of type: {agent_type}")
     if agent_type not in state.active_agents:
         if agent_type == "multi_agent":
-            state.active_agents[agent_type] = multi_agent_graph
+            state.active_agents[agent_type] = await asyncio.to_thread(get_multi_agent_graph)
             logger.debug(f"Created new agent of type: {agent_type}")
         else:
             logger.error(f"Unknown agent type requested: {agent_type}")
@@ -37,19 +45,79 @@ async def list_agents():
         }
     }
 
+async def compact_history(agent, thread_id: str):
+    """
+    Update the thread's summary of the turns evicted from the context window, then truncate its stored history past
+    the token budget, keeping turns the summary does not cover yet. Failures are logged, the chat already succeeded.
+    """
+    try:
+        await aupdate_context_summary(agent, thread_id)
+    except Exception as e:
+        logger.warning(f"Could not summarize history of thread {thread_id}: {e}")
+    try:
+        await acompact_thread(agent, thread_id, removable=summarized_count if CONTEXT_SUMMARY_ENABLED else None)
+    except Exception as e:
+        logger.warning(f"Could not compact history of thread {thread_id}: {e}")
+
 @router.post("/chat", response_model=ChatResponse)
-async def chat_with_agent(request: ChatRequest):
+async def chat_with_agent(request: ChatRequest, background_tasks: BackgroundTasks):
     """Chat with an agent"""
     logger.debug(f"Chat request received for agent: {request.agent_type}")
     try:
-        agent = get_or_create_agent(request.agent_type)
+        agent = await get_or_create_agent(request.agent_type)
         actual_thread_id = request.thread_id or str(uuid.uuid4()) # Generate a new thread ID if not provided
-        agent_response = chat(agent, request.message, thread_id=actual_thread_id)
+        agent_response = await achat(agent, request.message, thread_id=actual_thread_id)
+        background_tasks.add_task(compact_history, agent, actual_thread_id) # After the response is sent
         return ChatResponse(
             response=agent_response,
             thread_id=actual_thread_id,
             agent_type=request.agent_type
         )
+    except LLMGatewayOverloaded as e: # Shed load, the client retries later
+        logger.warning(f"Overloaded in API <chat_with_agent: {request.agent_type}>: {e}")
+        raise HTTPException(status_code=503, detail=f"Agent overloaded: {str(e)}", headers={"Retry-After": str(max(1, round(e.retry_after)))})
     except Exception as e:
         logger.error(f"Error in API <chat_with_agent: {request.agent_type}>: {e}")
-        raise HTTPException(status_code=500, detail=f"Agent error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Agent error: {str(e)}")
+
+def format_sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/chat/stream")
+async def stream_chat_with_agent(request: ChatRequest):
+    """
+    Chat with an agent, streamed as Server-Sent Events while the workflow runs:
+    `node` (node started/completed), `handoff`, `token` (response deltas), then `done` with the full response, or `error`.
+    """
+    logger.debug(f"Streaming chat request received for agent: {request.agent_type}")
+    agent = await get_or_create_agent(request.agent_type) # Unknown agent types fail before the stream starts
+    actual_thread_id = request.thread_id or str(uuid.uuid4())
+
+    async def event_stream():
+        try:
+            async for event, data in astream_chat(agent, request.message, thread_id=actual_thread_id):
+                if event == "done":
+                    data["agent_type"] = request.agent_type
+                yield format_sse(event, data)
+        except LLMGatewayOverloaded as e:
+            logger.warning(f"Overloaded in API <stream_chat_with_agent: {request.agent_type}>: {e}")
+            yield format_sse("error", {"detail": f"Agent overloaded: {str(e)}", "retry_after": e.retry_after, "thread_id": actual_thread_id})
+        except Exception as e:
+            logger.error(f"Error in API <stream_chat_with_agent: {request.agent_type}>: {e}")
+            yield format_sse("error", {"detail": f"Agent error: {str(e)}", "thread_id": actual_thread_id})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # Disable proxy buffering so events arrive as they happen
+        background=BackgroundTask(compact_history, agent, actual_thread_id), # After the stream ended
+    )
+
+@router.delete("/threads/{thread_id}")
+async def delete_thread(thread_id: str):
+    """Delete a conversation thread: its checkpointed history and its board state"""
+    logger.debug(f"Deleting thread: {thread_id}")
+    await get_checkpointer().adelete_thread(thread_id)
+    get_board_store().delete(thread_id)
+    return {"status": "Thread deleted", "thread_id": thread_id}
@@ -1,31 +1,127 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
+from pydantic import ValidationError
+from typing import Optional
 import logging
 
 # Custom Imports
-from optcg import state
-from optcg.schemas import BoardState
+from optcg.analysis_cache import analysis_cache
+from optcg.board_patch import BoardPatchError, apply_patch
+from optcg.board_serializer import board_fingerprint
+from optcg.board_store import DEFAULT_SESSION, BoardVersionConflict, board_for_agents, compact_board, expand_board, get_board_store
+from optcg.schemas import BoardPatchRequest, BoardState
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Boards are stored per chat thread. Without a `thread_id`, the default session's board is used.
+# A thread without a board of its own has none (404), unless `BOARD_DEFAULT_FALLBACK` is set.
+# Every save increments the board's version, returned in the responses and in the `ETag` header of GET.
+# The routes are sync, so FastAPI runs them in its threadpool: the SQLite store's locked writes and the (de)serialization
+# of whole boards do not block the event loop, and with it the chat streams.
+
+def evict_cached_analyses(previous_board: dict | None, board: dict | None = None):
+    """Drop the board analyst's cached results for a board that was replaced or cleared."""
+    if previous_board is None:
+        return
+    previous = board_fingerprint(board_for_agents(previous_board)) # As the analyst fingerprints the boards it reads
+    if board is None or board_fingerprint(board_for_agents(board)) != previous:
+        analysis_cache.evict_board(previous)
+
+def find_board(thread_id: str | None) -> tuple[dict, int, bool] | None:
+    """
+    The board GET and PATCH act on, its version, and whether it is the session's own board rather than the default
+    session's board a thread falls back to (`BOARD_DEFAULT_FALLBACK`). None if there is no board.
+    """
+    store = get_board_store()
+    entry = store.get_versioned(thread_id or DEFAULT_SESSION)
+    if entry is not None:
+        return (*entry, True)
+    entry = store.resolve_versioned(thread_id)
+    return (*entry, False) if entry is not None else None
+
+def version_conflict(version: int, expected_version: int) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail=f"Board is at version {version}, not {expected_version}. Get the board again and re-apply the changes.",
+        headers={"ETag": f'"{version}"'},
+    )
+
 @router.post("/")
-async def set_board_state(board_state: dict): # TODO: add type: BoardState
-    """Save the current board state for the session"""
-    state.current_board_state = board_state
-    logger.debug("Board state saved")
-    return {"status": "Board state saved successfully"}
-
-@router.get("/") 
-async def get_board_state():
-    """Get the current board state"""
-    if state.current_board_state is None:
+def set_board_state(board_state: BoardState, response: Response, thread_id: Optional[str] = None):
+    """Save (replace) the board state for the session. Returns the board's new version"""
+    session_id = thread_id or DEFAULT_SESSION
+    store = get_board_store()
+    board = compact_board(board_state)
+    previous_board = store.get(session_id)
+    version = store.set(session_id, board)
+    evict_cached_analyses(previous_board, board)
+    logger.debug(f"Board state saved for session: {session_id} (version {version})")
+    response.headers["ETag"] = f'"{version}"'
+    return {"status": "Board state saved successfully", "version": version}
+
+@router.patch("/")
+def patch_board_state(patch: BoardPatchRequest, response: Response, thread_id: Optional[str] = None):
+    """
+    Update the board state for the session with JSON Patch operations, applied to the board as GET returns it.
+    `version` is the version the operations were made against: if the board changed since, nothing is applied (409).
+    """
+    session_id = thread_id or DEFAULT_SESSION
+    store = get_board_store()
+    found = find_board(thread_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="No board state found. Please update the board state first.")
+    previous_board, version, own = found
+    if not own:
+        raise HTTPException(status_code=409, detail="The thread has no board of its own. Save the whole board for the thread first.")
+    if patch.version != version:
+        raise version_conflict(version, patch.version)
+
+    try:
+        current = expand_board(previous_board)
+    except ValidationError:
+        raise HTTPException(status_code=409, detail="The saved board cannot be patched, save the whole board instead.")
+    operations = [operation.model_dump(by_alias=True, exclude_unset=True) for operation in patch.operations]
+    try:
+        board = compact_board(BoardState.model_validate(apply_patch(current, operations)))
+    except BoardPatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False, include_input=False))
+
+    try:
+        new_version = store.set(session_id, board, expected_version=version)
+    except BoardVersionConflict as e: # Another update won the race
+        raise version_conflict(e.version, patch.version)
+    evict_cached_analyses(previous_board, board)
+    logger.debug(f"Board state patched for session: {session_id} ({len(operations)} operations, version {new_version})")
+    response.headers["ETag"] = f'"{new_version}"'
+    return {"status": "Board state patched successfully", "version": new_version}
+
+@router.get("/")
+def get_board_state(response: Response, thread_id: Optional[str] = None, agent_view: bool = False):
+    """
+    Get the board state for the session, with its version as ETag (only for the session's own board, which PATCH updates).
+    With `agent_view`, the board as the agents read it: without images, set names and notes.
+    """
+    found = find_board(thread_id)
+    if found is None:
         logger.debug("No board state found. Returning 404.")
         raise HTTPException(status_code=404, detail="No board state found. Please update the board state first.")
-    return state.current_board_state
+    board, version, own = found
+    if own:
+        response.headers["ETag"] = f'"{version}"'
+    if agent_view:
+        return board_for_agents(board)
+    try:
+        return expand_board(board)
+    except ValidationError: # Saved in-process without validation
+        return board
 
 @router.delete("/")
-async def clear_board_state():
-    """Clear the current board state"""
-    logger.debug("Clearing board state")
-    state.current_board_state = None
-    return {"status": "Board state cleared"}
\ No newline at end of file
+def clear_board_state(thread_id: Optional[str] = None):
+    """Clear the board state for the session"""
+    logger.debug(f"Clearing board state for session: {thread_id or DEFAULT_SESSION}")
+    store = get_board_store()
+    evict_cached_analyses(store.get(thread_id or DEFAULT_SESSION))
+    store.delete(thread_id or DEFAULT_SESSION)
+    return {"status": "Board state cleared"}
@@ -1,21 +1,48 @@
 from fastapi import APIRouter, HTTPException
+import asyncio
+import json
 import logging
-import requests
 import os
 
 # Custom Imports
+from optcg import apitcg, state
+from optcg.cache import AsyncTTLCache
+from optcg.card_table import card_table, normalize_card
 from optcg.schemas import CardSearchRequest
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Response cache in front of API TCG, keyed on the normalized query
+card_cache = AsyncTTLCache(
+    maxsize=int(os.getenv("CARD_CACHE_MAXSIZE", "1024")),
+    ttl=float(os.getenv("CARD_CACHE_TTL", "21600")), # 6 hours, cards only change on set releases
+)
+# Board card references resolve from cards fetched here when they are not in the local catalog. Searched cards are
+# interned as they are fetched, see `search_and_intern`. The card table calls its sources from worker threads, so the
+# cache is only peeked at (read without reordering or expiring entries)
+card_table.add_source(lambda card_id: (card_cache.peek(f"card:{card_id}") or {}).get("data"), persist=True)
+
+async def search_and_intern(params: dict) -> list[dict]:
+    """Search API TCG and intern the cards found, which boards are built from, so posted copies store as references."""
+    cards = await apitcg.search_cards(params)
+    await asyncio.to_thread(card_table.intern, [normalize_card(card) for card in cards if card.get("code")])
+    return cards
+
+def search_cache_key(request: CardSearchRequest) -> str:
+    """Canonical cache key for a card search, independent of field order and unset fields."""
+    return "search:" + json.dumps(request.model_dump(exclude_none=True), sort_keys=True)
+
 @router.post("/")
 async def card_search(request: CardSearchRequest):
-    """Search for cards in the One Piece TCG database with API TCG. Returns a list of cards matching the search criteria."""
-    api_key = os.getenv("APITCG_API_KEY")
-    url = "https://apitcg.com/api/one-piece/cards/"
-    headers = {"x-api-key": api_key}
-    
+    """Search for cards in the One Piece TCG database. Answered from the local card catalog when synced, otherwise from API TCG. Returns a list of cards matching the search criteria."""
+    if state.card_catalog:
+        logger.debug(f"Searching local card catalog: {request.model_dump(exclude_none=True)}")
+        cards = state.card_catalog.search(request)
+        if not cards:
+            raise HTTPException(status_code=404, detail="No cards found matching the search criteria")
+        return {"data": cards}
+
     # Build query parameters, filtering out None values
     params = {}
     if request.name:
@@ -39,55 +66,21 @@ async def card_search(request: CardSearchRequest):
     if request.trigger:
         params["trigger"] = request.trigger
 
+    logger.debug(f"Searching cards with params: {params}")
     try:
-        logger.debug(f"Searching cards with params: {params}")
-        all_cards = []
-        page = 1
-        total_pages = 1  # default, will be updated after first request
-        while page <= total_pages:
-            params["page"] = page
-            response = requests.get(url, headers=headers, params=params)
-            if response.status_code != 200:
-                logger.error(f"Card search failed with status code: {response.status_code}")
-                raise HTTPException(status_code=response.status_code, detail=f"Error searching cards: {response.status_code}")
-            data = response.json()
-            if data.get("error"):
-                logger.error(f"API TCG returned error for card search: {data['error']}")
-                raise HTTPException(status_code=400, detail=f"Error searching cards: {data['error']}")
-            if not data.get("data"):
-                logger.error("API TCG called but no cards found (empty data)")
-                if page == 1:
-                    raise HTTPException(status_code=404, detail="No cards found matching the search criteria")
-                break
-            all_cards.extend(data["data"])
-            total_pages = data.get("totalPages", 1)
-            page += 1
-        return {"data": all_cards}
-    except requests.RequestException as e:
-        logger.exception(f"Error contacting API TCG: {e}")
-        raise HTTPException(status_code=502, detail="Error contacting API TCG")
+        all_cards = await card_cache.get_or_fetch(search_cache_key(request), lambda: search_and_intern(params))
+    except apitcg.APITCGError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return {"data": all_cards}
 
 @router.get("/{card_id}")
 async def get_card(card_id: str):
-    """Get details of a specific card by ID from API TCG"""
-    api_key = os.getenv("APITCG_API_KEY")
-    url = f"https://apitcg.com/api/one-piece/cards/{card_id}"
-    headers = {"x-api-key": api_key}
+    """Get details of a specific card by ID from the local card catalog or API TCG"""
+    if state.card_catalog and (card := state.card_catalog.get(card_id)) is not None:
+        return {"data": card}
 
+    logger.debug(f"Fetching card {card_id} from API TCG")
     try:
-        logger.debug(f"Fetching card {card_id} from {url}")
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            logger.error(f"Card not found: {card_id}, status code: {response.status_code}")
-            raise HTTPException(status_code=response.status_code, detail=f"Error fetching card data: {response.status_code}")
-        data = response.json()
-        if data.get("error"):
-            logger.error(f"API TCG returned error for card {card_id}: {data['error']}")
-            raise HTTPException(status_code=404, detail=f"Error fetching card data: {data['error']}")
-        if not data.get("data"):
-            logger.error(f"API TCG called and card not found (empty data): {card_id}")
-            raise HTTPException(status_code=404, detail="Card not found")
-        return data
-    except requests.RequestException as e:
-        logger.exception(f"Error contacting API TCG: {e}")
-        raise HTTPException(status_code=502, detail="Error contacting API TCG")
\ No newline at end of file
+        return await card_cache.get_or_fetch(f"card:{card_id}", lambda: apitcg.get_card(card_id))
+    except apitcg.APITCGError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
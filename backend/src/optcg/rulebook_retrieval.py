@@ -0,0 +1,211 @@
+"""
+Hybrid retrieval over the rulebook vector store.
+Pairs an in-memory BM25 index over the same chunks as the Chroma collection with the dense similarity search,
+and fuses both rankings with reciprocal-rank fusion (RRF). Exact lookups such as "rule 6-5-3" are answered from a
+rule-number index without an embedding call, and keyword names such as "[Blocker]" are matched by BM25.
+"""
+
+# region Imports
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any
+from pydantic import ConfigDict, PrivateAttr
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Custom Imports
+from optcg.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# endregion Imports
+
+
+# region Indexes
+
+# Comprehensive rules are numbered "6-5-3-1", tournament rules "1.2.1" (the numbering `preprocess_tournament_rules` splits on)
+RULE_NUMBER_PATTERN = re.compile(r"\b\d+(?:-\d+)+\b|\b\d+(?:\.\d+)+\b")
+RULE_DEFINITION_PATTERN = re.compile(r"(?m)^\s*(\d+(?:-\d+)+|\d+(?:\.\d+)+)(?=\s|\.|$)") # A rule number that starts a line
+
+_TOKEN_PATTERN = re.compile(r"\d+(?:[-.]\d+)+|[a-z0-9]+")
+_STOPWORDS = frozenset("a an and are as at be by can do does for from how i if in is it its of on or that the their this to what when which with you your".split())
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase BM25 tokens. Rule numbers are kept whole, brackets and punctuation are dropped ("[Blocker]" -> "blocker")."""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts."""
+
+    def __init__(self, texts: list[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._term_freqs = [Counter(tokenize(text)) for text in texts]
+        self._doc_lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._doc_lengths) / len(texts)) if texts else 0.0
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        for index, tf in enumerate(self._term_freqs):
+            for term in tf:
+                self._postings[term].append(index)
+        n = len(texts)
+        self._idf = {term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)) for term, docs in self._postings.items()}
+
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        """Return up to `k` (text index, score) pairs, best first."""
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for index in self._postings[term]:
+                tf = self._term_freqs[index][term]
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[index] / (self._avg_length or 1))
+                scores[index] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def build_rule_number_index(texts: list[str]) -> dict[str, list[int]]:
+    """Map each rule number to the texts where it starts a line (i.e. where the rule is defined)."""
+    index: dict[str, list[int]] = defaultdict(list)
+    for position, text in enumerate(texts):
+        for number in dict.fromkeys(RULE_DEFINITION_PATTERN.findall(text)):
+            index[number].append(position)
+    return dict(index)
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """Fuse several rankings of IDs: score(id) = sum over rankings of 1 / (k + rank)."""
+    scores: dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+# endregion Indexes
+
+
+# region Retriever
+
+class HybridRulebookRetriever(BaseRetriever):
+    """
+    Rulebook retriever fusing BM25 and dense (Chroma) rankings with RRF, with a rule-number fast path.
+    Build it with `HybridRulebookRetriever.from_vectorstore(vectorstore)`; the keyword indexes are built from the
+    chunks already in the Chroma collection, so no documents need to be re-loaded.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: Any
+    k: int = 4 # Results returned, same default as `vectorstore.as_retriever()`
+    fetch_k: int = 20 # Candidates taken from each ranking before fusion
+    rrf_k: int = 60
+
+    _ids: list[str] = PrivateAttr(default_factory=list)
+    _texts: list[str] = PrivateAttr(default_factory=list)
+    _metadatas: list[dict] = PrivateAttr(default_factory=list)
+    _positions: dict[str, int] = PrivateAttr(default_factory=dict)
+    _bm25: BM25Index | None = PrivateAttr(default=None)
+    _rule_numbers: dict[str, list[int]] = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, **kwargs) -> "HybridRulebookRetriever":
+        retriever = cls(vectorstore=vectorstore, **kwargs)
+        retriever.refresh()
+        return retriever
+
+    def refresh(self):
+        """(Re)build the keyword and rule-number indexes from the Chroma collection, e.g. after an incremental update."""
+        data = self.vectorstore.get(include=["documents", "metadatas"])
+        self._ids = data["ids"]
+        self._texts = data["documents"]
+        self._metadatas = [metadata or {} for metadata in data["metadatas"]]
+        self._positions = {chunk_id: position for position, chunk_id in enumerate(self._ids)}
+        self._bm25 = BM25Index(self._texts)
+        self._rule_numbers = build_rule_number_index(self._texts)
+        logger.debug(f"Hybrid retriever indexed {len(self._ids)} chunks, {len(self._rule_numbers)} rule numbers")
+
+    def _document(self, position: int, score: float | None = None) -> Document:
+        metadata = dict(self._metadatas[position])
+        if score is not None:
+            metadata["score"] = score
+        return Document(id=self._ids[position], page_content=self._texts[position], metadata=metadata)
+
+    def lookup_rule_numbers(self, query: str) -> list[Document] | None:
+        """Chunks defining the rule numbers referenced in the query, or None if the query references no known rule number."""
+        positions = []
+        for number in RULE_NUMBER_PATTERN.findall(query):
+            matches = self._rule_numbers.get(number)
+            if matches is None: # Fall back to sub-rules, e.g. "6-5" -> "6-5-1", "6-5-2"
+                separator = "-" if "-" in number else "."
+                sub_rules = sorted(n for n in self._rule_numbers if n.startswith(number + separator))
+                matches = [position for sub_rule in sub_rules for position in self._rule_numbers[sub_rule]]
+            positions.extend(matches)
+        if not positions:
+            return None
+        return [self._document(position) for position in dict.fromkeys(positions)][: self.k]
+
+    def keyword_ranking(self, query: str) -> list[str]:
+        return [self._ids[position] for position, _ in self._bm25.search(query, self.fetch_k)] if self._bm25 else []
+
+    def fuse(self, rankings: list[list[str]]) -> list[Document]:
+        fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)
+        return [self._document(self._positions[chunk_id], score) for chunk_id, score in fused[: self.k] if chunk_id in self._positions]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        rule_documents = self.lookup_rule_numbers(query)
+        if rule_documents: # Exact rule-number lookup, no embedding call
+            return rule_documents
+        dense_ranking = [document.id for document in self.vectorstore.similarity_search(query, k=self.fetch_k)]
+        return self.fuse([dense_ranking, self.keyword_ranking(query)])
+
+    def retrieve_batch(self, queries: list[str]) -> list[Document]:
+        """
+        Retrieve for several queries at once. All queries without a rule-number hit are embedded in one request and
+        searched in one Chroma query. Chunks are deduplicated by ID, and a chunk's fused scores are summed across the
+        queries that retrieved it, so chunks relevant to several queries rank first.
+        """
+        queries = list(dict.fromkeys(query for query in queries if query.strip()))
+        merged: dict[str, float] = defaultdict(float)
+
+        dense_queries = []
+        for query in queries:
+            rule_documents = self.lookup_rule_numbers(query)
+            if rule_documents:
+                for rank, document in enumerate(rule_documents, start=1):
+                    merged[document.id] += 1 / rank # Exact rule-number hits outrank fused results
+            else:
+                dense_queries.append(query)
+
+        if dense_queries:
+            vectors = self.vectorstore.embeddings.embed_documents(dense_queries)
+            dense_rankings = self.vectorstore._collection.query(query_embeddings=vectors, n_results=self.fetch_k, include=[])["ids"]
+            for query, dense_ranking in zip(dense_queries, dense_rankings):
+                for chunk_id, score in reciprocal_rank_fusion([dense_ranking, self.keyword_ranking(query)], k=self.rrf_k)[: self.k]:
+                    merged[chunk_id] += score
+
+        ranked = sorted(merged.items(), key=lambda item: item[1], reverse=True)
+        return [self._document(self._positions[chunk_id], score) for chunk_id, score in ranked if chunk_id in self._positions]
+
+    def retrieve_context(self, queries: list[str], token_budget: int) -> str:
+        """Batch-retrieve for `queries` and join the ranked, deduplicated chunks into one context string within `token_budget` tokens."""
+        return "\n\n".join(select_within_budget([document.page_content for document in self.retrieve_batch(queries)], token_budget))
+
+def select_within_budget(chunks: list[str], token_budget: int) -> list[str]:
+    """The ranked chunks that fit in `token_budget` tokens, skipping duplicates and chunks too large for what is left."""
+    parts, used = [], 0
+    for chunk in dict.fromkeys(chunks):
+        tokens = count_tokens(chunk)
+        if used + tokens > token_budget:
+            if parts:
+                continue # Try smaller, lower ranked chunks that still fit
+            # Always return at least the best chunk, truncated to the budget
+            parts.append(chunk[: token_budget * 4])
+            break
+        parts.append(chunk)
+        used += tokens
+    return parts
+
+# endregion Retriever
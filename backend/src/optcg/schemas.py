@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Any, Literal, Optional, List
 
 # Pydantic models for request/response
 class ChatRequest(BaseModel):
@@ -52,16 +52,51 @@ class CardData(BaseModel):
     ability: str
     trigger: str
     set: CardSet
-    notes: List # List[str] -- if list vals are all str
+    notes: List = [] # List[str] -- if list vals are all str
+    # State of this copy on the board
+    rest: bool = False # Rested (tapped). The frontend's `rotated` display flag is not stored
+    attached_don: int = 0 # DON!! cards given to it
+    power_modifier: int = 0 # e.g. -2000 from an opponent's effect this turn
+
+    @field_validator("counter", mode="before")
+    @classmethod
+    def counter_as_text(cls, value):
+        return "-" if value is None else str(value) # Some sources give the counter as a number
 
 class PlayerState(BaseModel):
+    model_config = ConfigDict(extra="allow") # New scalar fields are kept, and shown to the board analyst
+
     life: int
     don: int
+    rested_don_count: int = 0
+    hand_size: Optional[int] = None # The opponent's hand is only known by its size
     leader: Optional[CardData] = None
     event: Optional[CardData] = None
     stage: Optional[List[CardData]] = None
     character: Optional[List[CardData]] = None
+    hand: Optional[List[CardData]] = None
+
+    @field_validator("hand", mode="before")
+    @classmethod
+    def unwrap_hand_cards(cls, value):
+        """Hand cards may be wrapped as {"data": card}."""
+        if isinstance(value, list):
+            return [entry["data"] if isinstance(entry, dict) and isinstance(entry.get("data"), dict) else entry for entry in value]
+        return value
 
 class BoardState(BaseModel):
     UserState: PlayerState
-    OpponentState: PlayerState
\ No newline at end of file
+    OpponentState: PlayerState
+
+class BoardPatchOperation(BaseModel):
+    """One JSON Patch (RFC 6902) operation on the board, e.g. {"op": "replace", "path": "/UserState/life", "value": 3}."""
+    model_config = ConfigDict(populate_by_name=True)
+
+    op: Literal["add", "remove", "replace", "move", "copy", "test"]
+    path: str # JSON Pointer, e.g. "/OpponentState/character/0/rest"
+    value: Any = None # For add, replace and test
+    from_: Optional[str] = Field(default=None, alias="from") # For move and copy
+
+class BoardPatchRequest(BaseModel):
+    version: int # The board version the operations apply to, as returned by the last POST, PATCH or GET (ETag)
+    operations: List[BoardPatchOperation]
\ No newline at end of file
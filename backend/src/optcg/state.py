@@ -1,5 +1,13 @@
 """Shared state for the OPTCG API"""
 
-# Global state for board and agents
-current_board_state = None
+# Global state for agents
 active_agents = {}
+
+# Session-keyed board state store (see `optcg.board_store.get_board_store`)
+board_store = None
+
+# Shared, connection-pooled API TCG client (created in `api.lifespan`)
+apitcg_client = None
+
+# Local card catalog mirror (loaded in `api.lifespan` if it has been synced)
+card_catalog = None
@@ -0,0 +1,22 @@
+"""Token counting for prompt budgeting."""
+
+import functools
+import logging
+
+logger = logging.getLogger(__name__)
+
+@functools.cache
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e: # tiktoken downloads its encodings on first use, which can fail offline
+        logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the o200k encoding used by the GPT-4.1/GPT-5 models, or estimate ~4 characters per token."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
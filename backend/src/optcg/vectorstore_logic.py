@@ -1,42 +1,73 @@
 # region Imports
-import os, shutil, tempfile, requests, hashlib
+import os, shutil, requests, hashlib
 import json, re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from langchain_community.document_loaders.pdf import PyPDFLoader
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+# chromadb, langchain_chroma, langchain_openai and the text splitter are imported by the functions building the store,
+# so importing this module (as the agents and the API do) does not load them
+
+# Custom Imports
+from optcg.embedding_cache import CachedEmbeddings
+from optcg.pdf_pages import RULEBOOK_EXTRACTION_WORKERS, extract_pages
 
 # Vector store creation and management for One Piece Card Game rules
 # This implementation handles loading the rules from PDF files, checking for updates, and managing the vector store.
 # Namely, it operates in a `.cache/optcg_rulebooks_vectorstore` directory in the user's home directory.
 # The vector store is created using the Chroma library with OpenAI embeddings.
 
-# TODO: See region "Hashing and Updating"
-
 # Main Functions: 
 # - loader_optcg_rulebooks
 # - create_or_load_vectorstore_optcg_rulebooks
 # - check_for_updates_to_rules
+# - update_vectorstore_optcg_rulebooks
 # - delete_vectorstore_optcg_rulebooks
 
 
 # All Functions:
-# - load_pdf_from_url: Load a PDF from a URL and extract its text content
+# - fetch_pdf: Conditionally download a PDF into the on-disk PDF cache, streaming it to disk
+# - fetch_rulebook_pdfs: Fetch both rulebook PDFs concurrently
+# - extract_pdf_pages: Extract page texts (see `pdf_pages.py`), cached by PDF hash and page number
+# - iter_pdf_documents: Stream the pages of an extracted PDF as documents
+# - load_pdf_from_url: Load a PDF from a URL (through the PDF cache) and extract its text content
 # - loader_optcg_rulebooks: Load the One Piece Card Game rules from the official website
 
-# - hash_documents: Create a unique hash for the documents
-# - save_hash: Save the hash of the documents to a file
-# - load_hash: Load the hash of the documents from a file
-
-# - check_document_changes: Check if the documents have changed since the last time the vector store was created
-# - check_for_updates_to_rules: Check if the One Piece Card Game rules have been updated since the last vector store creation, using the hash of the documents
-
-# - preprocess_tournament_rules: Add custom separators for tournament rule numbering to improve document chunking and retrieval
+# - get_text_splitter: The text splitter shared by vector store creation and updates
+# - hash_chunks: Create a content-addressed ID for each chunk
+# - manifest_hash: Hash of the whole corpus, derived from its chunk IDs
+# - pdf_hashes: The SHA-256 of each fetched rulebook PDF
+# - save_manifest: Save the chunk IDs in the vector store to a manifest file
+# - load_manifest: Load the chunk manifest from a file
+# - get_manifest_hash: The corpus hash of the persisted manifest, re-read only when the manifest file changes
+# - diff_chunks: Diff fresh chunk IDs against the manifest
+# - load_and_split_rulebooks: Load the rulebooks and split them into chunks with their IDs
+
+# - check_document_changes: Check if the chunked documents have changed since the last vector store update
+# - check_for_updates_to_rules: Check if the One Piece Card Game rules have been updated since the last vector store update, using the chunk manifest
+# - update_vectorstore_optcg_rulebooks: Incrementally embed new/changed chunks and delete removed chunks in place
+# - refresh_rulebook_retriever: Rebuild the shared hybrid retriever's keyword indexes after an update
+
+# - get_embeddings: The OpenAI embedding model wrapped in the persistent embedding cache
+# - preprocess_tournament_rules: Streaming stage adding custom separators for tournament rule numbering to improve document chunking and retrieval
 # - create_or_load_vectorstore_optcg_rulebooks: Create or load the persistent vector store for the One Piece Card Game rules
 # - delete_vectorstore_optcg_rulebooks: Delete the persistent vector store for One Piece Card Game rules
 
 
+# Persistent locations, in the `.cache` directory of the user's home directory
+CACHE_DIRECTORY = Path.home() / ".cache"
+PERSIST_DIRECTORY = CACHE_DIRECTORY / "optcg_rulebooks_vectorstore"
+MANIFEST_PATH = PERSIST_DIRECTORY / "chunk_manifest.json"
+PDF_CACHE_DIRECTORY = CACHE_DIRECTORY / "optcg_rulebooks_pdfs"
+PAGE_CACHE_DIRECTORY = CACHE_DIRECTORY / "optcg_rulebooks_pages"
+
+RULEBOOK_URLS = {
+    "comprehensive_rules": "https://en.onepiece-cardgame.com/pdf/rule_comprehensive.pdf?20250221",
+    "tournament_rules": "https://en.onepiece-cardgame.com/pdf/tournament_rules_manual.pdf?20250613",
+}
+RULEBOOK_DOWNLOAD_TIMEOUT = 60 # Seconds
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+
 # endregion Imports
 
 
@@ -46,9 +77,143 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 ## Dummy PDF URL for testing purposes to reduce embedding costs with OpenAI
 # docs = load_pdf_from_url("https://www.w3.org/WAI/ER/tests/xhtml/testfiles/resources/pdf/dummy.pdf")
 
+## NOTE: The rulebook PDFs are cached on disk in `.cache/optcg_rulebooks_pdfs`, next to the vector store.
+# Downloads are conditional (If-None-Match / If-Modified-Since) and streamed to disk, so an unchanged rulebook
+# costs a single 304 response. The SHA-256 of each cached PDF is recorded, and the chunk manifest stores the
+# hashes the vector store was built from, so unchanged PDFs are never re-parsed.
+
+def fetch_pdf(url: str, name: str):
+    """
+    Fetch a PDF into the on-disk PDF cache with a conditional, streaming download.
+
+    Args:
+        url: The URL of the PDF file
+        name: The cache file name (without extension)
+
+    Returns:
+        Dict with the cached file `path`, its `sha256`, and `not_modified` (True if the server answered 304),
+        or None if the PDF could not be fetched and is not cached
+    """
+    PDF_CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    pdf_path = PDF_CACHE_DIRECTORY / f"{name}.pdf"
+    meta_path = PDF_CACHE_DIRECTORY / f"{name}.json"
+    meta = {}
+    if pdf_path.exists() and meta_path.exists():
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+
+    headers = {}
+    if meta.get("url") == url: # Only revalidate if the cached copy came from the same URL
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        with requests.get(url, headers=headers, stream=True, timeout=RULEBOOK_DOWNLOAD_TIMEOUT) as response:
+            if response.status_code == 304:
+                print(f"{name}: not modified, using cached PDF.")
+                return {"path": pdf_path, "sha256": meta["sha256"], "not_modified": True}
+            response.raise_for_status()  # Raise an exception for bad status codes
+
+            # Stream to a temporary file in the cache directory, hashing as we go
+            digest = hashlib.sha256()
+            tmp_path = pdf_path.with_suffix(".part")
+            try:
+                with open(tmp_path, "wb") as f:
+                    for block in response.iter_content(chunk_size=64 * 1024):
+                        f.write(block)
+                        digest.update(block)
+                os.replace(tmp_path, pdf_path)
+            finally:
+                tmp_path.unlink(missing_ok=True) # Discard a partial download, the cached PDF is left as it was
+
+            meta = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": digest.hexdigest(),
+            }
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+            print(f"{name}: downloaded to {pdf_path}")
+            return {"path": pdf_path, "sha256": meta["sha256"], "not_modified": False}
+
+    except Exception as e:
+        print(f"Error fetching PDF from URL: {str(e)}")
+        if meta.get("sha256"):
+            print(f"{name}: using previously cached PDF.")
+            return {"path": pdf_path, "sha256": meta["sha256"], "not_modified": True}
+        return None
+
+def fetch_rulebook_pdfs():
+    """
+    Fetch both rulebook PDFs concurrently into the PDF cache.
+
+    Returns:
+        Dict of rulebook source name -> `fetch_pdf` result, or None if either rulebook could not be fetched
+    """
+    with ThreadPoolExecutor(max_workers=len(RULEBOOK_URLS)) as executor:
+        futures = {name: executor.submit(fetch_pdf, url, name) for name, url in RULEBOOK_URLS.items()}
+        pdfs = {name: future.result() for name, future in futures.items()}
+    if any(pdf is None for pdf in pdfs.values()):
+        return None
+    return pdfs
+
+## NOTE: Page text is extracted by `pdf_pages.extract_pages` (a process pool for large PDFs, serially otherwise), and
+# cached on disk in `.cache/optcg_rulebooks_pages`, keyed by the PDF's SHA-256 and page number. A rebuild or update
+# check never re-parses pages of a PDF that has been extracted before.
+
+def _load_page_cache(pdf_hash):
+    cache_path = PAGE_CACHE_DIRECTORY / f"{pdf_hash}.json"
+    if cache_path.exists():
+        with open(cache_path, "r") as f:
+            return json.load(f)
+    return None
+
+def _save_page_cache(pdf_hash, page_texts):
+    PAGE_CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    with open(PAGE_CACHE_DIRECTORY / f"{pdf_hash}.json", "w") as f:
+        json.dump(page_texts, f)
+
+def extract_pdf_pages(pdfs, workers=RULEBOOK_EXTRACTION_WORKERS):
+    """
+    Extract the page texts of one or more cached PDFs, in parallel across pages and documents when they are large.
+    
+    Args:
+        pdfs: Dict of name -> `fetch_pdf` result
+        workers: Process pool size. 1 extracts serially in this process.
+    
+    Returns:
+        Dict of name -> list of page texts, or None for a PDF that could not be parsed
+    """
+    page_texts, uncached = {}, {}
+    for name, pdf in pdfs.items():
+        cached = _load_page_cache(pdf["sha256"])
+        if cached is not None:
+            page_texts[name] = cached
+        else:
+            uncached[name] = pdf["path"]
+
+    if uncached:
+        for name, texts in extract_pages(uncached, workers=workers).items():
+            page_texts[name] = texts
+            if texts is not None:
+                _save_page_cache(pdfs[name]["sha256"], texts)
+
+    return page_texts
+
+def iter_pdf_documents(name, page_texts):
+    """Stream the pages of an extracted PDF as documents tagged with their source."""
+    for page_number, text in enumerate(page_texts):
+        yield Document(
+            page_content=text,
+            metadata={"source": name, "page": page_number, "total_pages": len(page_texts)}
+        )
+
 def load_pdf_from_url(url: str):
     """
-    Load a PDF from a URL and extract its text content.
+    Load a PDF from a URL (through the PDF cache) and extract its text content.
     
     Args:
         url: The URL of the PDF file
@@ -56,52 +221,40 @@ def load_pdf_from_url(url: str):
     Returns:
         List of documents with page content
     """
-    try:
-        # Download the PDF content
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        
-        # Create a temporary file to store the PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(response.content)
-            temp_file_path = temp_file.name
-        
-        # Load the PDF using PyPDFLoader
-        loader = PyPDFLoader(temp_file_path)
-        documents = loader.load()
-        
-        # Clean up the temporary file
-        os.unlink(temp_file_path)
-        
-        return documents
-    
-    except Exception as e:
-        print(f"Error loading PDF from URL: {str(e)}")
+    name = hashlib.md5(url.encode("utf-8")).hexdigest()
+    pdf = fetch_pdf(url, name)
+    if pdf is None:
+        return None
+    page_texts = extract_pdf_pages({name: pdf})[name]
+    if page_texts is None:
         return None
+    return list(iter_pdf_documents(url, page_texts))
     
-def loader_optcg_rulebooks():
+def loader_optcg_rulebooks(pdfs=None):
     """
     Load the One Piece Card Game rules from the official website.
+    The tournament rules are streamed through `preprocess_tournament_rules`.
+
+    Args:
+        pdfs: Optional result of `fetch_rulebook_pdfs`, to avoid fetching again
     
     Returns:
         List of documents with page content
     """
-    comp_rules = load_pdf_from_url("https://en.onepiece-cardgame.com/pdf/rule_comprehensive.pdf?20250221")
-    tourney_rules = load_pdf_from_url("https://en.onepiece-cardgame.com/pdf/tournament_rules_manual.pdf?20250613")
+    pdfs = pdfs or fetch_rulebook_pdfs()
+    page_texts = extract_pdf_pages(pdfs) if pdfs is not None else {}
     
     # Verifies BOTH comprehensive and tournament rules are loaded
     # If either is None, it means loading failed
     # Ensures we have both sets of rules before proceeding
-    if comp_rules is None or tourney_rules is None:
+    if page_texts.get("comprehensive_rules") is None or page_texts.get("tournament_rules") is None:
         print("Failed to load One Piece Card Game rules.")
         print("Please check the URLs or your internet connection.")
         return None, None # Exit early if loading fails
     
-    # Tag each page/chunk with its source
-    for page in comp_rules:
-        page.metadata["source"] = "comprehensive_rules"
-    for page in tourney_rules:
-        page.metadata["source"] = "tournament_rules"
+    # Each page is tagged with its source
+    comp_rules = list(iter_pdf_documents("comprehensive_rules", page_texts["comprehensive_rules"]))
+    tourney_rules = list(preprocess_tournament_rules(iter_pdf_documents("tournament_rules", page_texts["tournament_rules"])))
 
     return comp_rules, tourney_rules
 
@@ -111,123 +264,246 @@ def loader_optcg_rulebooks():
 
 # region Hashing and Updating
 
-## NOTE: Hashing function to create a unique hash for the documents
-# This is used to check if the documents have changed since the last time the vector store was created
-# i.e. if the documents have been updated.
+## NOTE: Chunk-level hashing to detect which parts of the rulebooks changed.
+# Each chunk produced by the text splitter gets a content-addressed ID (hash of its source and text).
+# The IDs of the chunks in the vector store are persisted in a manifest next to the vector store.
+# On an update, the fresh chunks are diffed against the manifest and only new/changed chunks are embedded,
+# while removed chunk IDs are deleted from the Chroma collection in place. No full rebuild is needed for small errata.
+
+def get_text_splitter():
+    """The text splitter used to chunk the rulebooks. Chunk IDs depend on it, so it is shared by creation and updates."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1500,
+        chunk_overlap=300,
+        separators=["\n\n", "\n \n", "\n", ". ", " ", ""]
+    )
+
+def hash_chunks(chunks):
+    """
+    Create a content-addressed ID for each chunk.
+    Identical chunks within the same source get an occurrence suffix so IDs stay unique.
+
+    Returns:
+        List of chunk IDs, in the same order as `chunks`
+    """
+    ids, seen = [], {}
+    for chunk in chunks:
+        digest = hashlib.sha256(f"{chunk.metadata.get('source')}\x00{chunk.page_content}".encode("utf-8")).hexdigest()
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(digest if occurrence == 0 else f"{digest}-{occurrence}")
+    return ids
+
+def manifest_hash(chunk_ids):
+    """Hash of the whole corpus, derived from its chunk IDs. Changes whenever any chunk changes."""
+    return hashlib.sha256("\n".join(sorted(chunk_ids)).encode("utf-8")).hexdigest()
+
+def pdf_hashes(pdfs):
+    """The SHA-256 of each rulebook PDF, from a `fetch_rulebook_pdfs` result."""
+    return {name: pdf["sha256"] for name, pdf in pdfs.items()}
+
+def save_manifest(chunk_ids, pdfs=None, MANIFEST_PATH=MANIFEST_PATH):
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump({
+            "hash": manifest_hash(chunk_ids),
+            "pdf_hashes": pdf_hashes(pdfs) if pdfs else None, # The PDFs the chunks were parsed from
+            "chunk_ids": sorted(chunk_ids)
+        }, f)
+
+def load_manifest(MANIFEST_PATH=MANIFEST_PATH):
+    """Load the persisted manifest. Returns None if the vector store was never created with one."""
+    if MANIFEST_PATH.exists():
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    return None
 
-## TODO: The `check_for_updates_to_rules` function only implements the check for updates to the rules. This function does not update the vector store.
-# Would need to call `create_or_load_vectorstore_optcg_rulebooks()` to create the vector store if updates are detected.
-# If there is an existing vector store, it should be deleted and a new one will be created.
+_manifest_hash_memo = {} # MANIFEST_PATH -> (mtime_ns, hash)
 
-def hash_documents(documents):
-    combined = "".join(doc.page_content for doc in documents)
-    return hashlib.md5(combined.encode("utf-8")).hexdigest()
+def get_manifest_hash(MANIFEST_PATH=MANIFEST_PATH):
+    """
+    The corpus hash of the persisted manifest, or None if there is no manifest.
+    Cheap enough to call per request: the file is only re-read when its modification time changes.
+    """
+    try:
+        mtime = MANIFEST_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    memo = _manifest_hash_memo.get(MANIFEST_PATH)
+    if memo is None or memo[0] != mtime:
+        manifest = load_manifest(MANIFEST_PATH)
+        memo = (mtime, manifest.get("hash") if manifest else None)
+        _manifest_hash_memo[MANIFEST_PATH] = memo
+    return memo[1]
+
+def diff_chunks(chunk_ids, manifest):
+    """
+    Diff fresh chunk IDs against the persisted manifest.
 
-def save_hash(doc_hash, HASH_PATH):
-    with open(HASH_PATH, "w") as f:
-        json.dump({"hash": doc_hash}, f)
+    Returns:
+        (added_ids, removed_ids) as sets
+    """
+    current_ids = set(chunk_ids)
+    saved_ids = set(manifest["chunk_ids"]) if manifest else set()
+    return current_ids - saved_ids, saved_ids - current_ids
 
-def load_hash(HASH_PATH):
-    if HASH_PATH.exists():
-        with open(HASH_PATH, "r") as f:
-            return json.load(f).get("hash")
-    return None
+def load_and_split_rulebooks(pdfs=None):
+    """
+    Load the rulebooks and split them into chunks with their IDs.
 
-def check_document_changes(documents, HASH_PATH, PERSIST_DIR_IN_CACHE="optcg_rulebooks_vectorstore"): 
+    Returns:
+        (chunks, chunk_ids), or (None, None) if loading failed
     """
-    Check if the documents have changed since the last time the vector store was created.
-    This should never return `False, False` as at document hash should always be created when the vector store is created.
+    comp_rules, tourney_rules = loader_optcg_rulebooks(pdfs)
+    if not comp_rules or not tourney_rules:
+        print("No documents loaded. Please check PDF URLs.")
+        return None, None
+    chunks = get_text_splitter().split_documents(comp_rules + tourney_rules)
+    return chunks, hash_chunks(chunks)
+
+def check_document_changes(chunk_ids, MANIFEST_PATH=MANIFEST_PATH):
     """
-    current_hash = hash_documents(documents)
-    saved_hash = load_hash(HASH_PATH)
-    
-    CACHE_DIRECTORY = Path.home() / ".cache"
-    CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
-    PERSIST_DIRECTORY = CACHE_DIRECTORY / PERSIST_DIR_IN_CACHE
+    Check if the chunked documents have changed since the vector store was last created or updated.
+    This should never return `False, False` as a manifest should always be saved when the vector store is created.
+    """
+    manifest = load_manifest(MANIFEST_PATH)
 
-    if saved_hash is None:
+    if manifest is None:
         if os.path.exists(PERSIST_DIRECTORY) and os.listdir(PERSIST_DIRECTORY):
-            print("WARNING: Previous hash not found, but vector store exists. This is unexpected!")
-            print("Please delete the existing vector store and create a new one to ensure hash is created.")
-            return False, False # This should not happen! Hash should always be created when the vector store is created.
-        print("No previous hash found. Create a new vector store.")
-        return False, True  # No previous hash, so we need to create a new vector store
-    elif current_hash != saved_hash:
-        print("Documents have changed since last vector store creation.")
-        return True, True  # Documents have changed, so we need to create a new vector store
-    elif current_hash == saved_hash:
-        print("Documents have not changed since last vector store creation.")
-        return True, False  # No changes detected
+            print("WARNING: Previous manifest not found, but vector store exists. This is unexpected!")
+            print("Run `update_vectorstore_optcg_rulebooks()` to re-index the existing vector store and create a manifest.")
+            return False, False # This should not happen! Manifest should always be created when the vector store is created.
+        print("No previous manifest found. Create a new vector store.")
+        return False, True  # No previous manifest, so we need to create a new vector store
+
+    added_ids, removed_ids = diff_chunks(chunk_ids, manifest)
+    if added_ids or removed_ids:
+        print(f"Documents have changed since last vector store update: {len(added_ids)} chunks added/changed, {len(removed_ids)} removed.")
+        return True, True  # Documents have changed, the vector store needs an update
+    print("Documents have not changed since last vector store update.")
+    return True, False  # No changes detected
 
 def check_for_updates_to_rules():
-    """Check if the One Piece Card Game rules have been updated since the last vector store creation, using the hash of the documents"""
-    CACHE_DIRECTORY = Path.home() / ".cache"
-    CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
-    PERSIST_DIR_IN_CACHE="optcg_rulebooks_vectorstore"
-    PERSIST_DIRECTORY = CACHE_DIRECTORY / PERSIST_DIR_IN_CACHE
-    HASH_PATH = PERSIST_DIRECTORY / "doc_hash.json"
-
-    comp_rules, tourney_rules = loader_optcg_rulebooks()
-    if comp_rules is not None and tourney_rules is not None: # Exit if no documents are loaded.
-        documents = comp_rules + tourney_rules
-        existing_hash_bool, doc_changes_bool = check_document_changes(documents, HASH_PATH, PERSIST_DIR_IN_CACHE) # type: ignore
-        print(f"Existing hash found: {existing_hash_bool}, Document changes detected: {doc_changes_bool}")
-        if not doc_changes_bool:
-            print("No updates needed.")
-            return False
-        elif not existing_hash_bool and doc_changes_bool:
-            print("Documents have changed or no previous hash found. Create a new vector store.")
-            return True       
-        elif existing_hash_bool and doc_changes_bool:
-            print("Update needed. Delete existing vector store and create a new one.")
-            return True
-        else: # If check_document_changes returns as `False, False`, this is unexpected.
-            # This should not happen! Hash should always be created when the vector store is created.
-            print("Unexpected case. Please check the implementation.")
-            return None
-    else:
+    """Check if the One Piece Card Game rules have been updated since the last vector store update, using the chunk manifest"""
+    pdfs = fetch_rulebook_pdfs()
+    if pdfs is None:
+        print("Cannot check for updates. Rulebook PDFs could not be fetched.")
+        return None
+
+    # Skip parsing entirely if the PDFs are the ones the vector store was built from
+    manifest = load_manifest()
+    if manifest is not None and manifest.get("pdf_hashes") == pdf_hashes(pdfs):
+        print("Rulebook PDFs unchanged since last vector store update. No updates needed.")
+        return False
+
+    _, chunk_ids = load_and_split_rulebooks(pdfs)
+    if chunk_ids is None: # Exit if no documents are loaded.
         print("Cannot check for updates. No documents loaded.")
         return None
+
+    existing_manifest_bool, doc_changes_bool = check_document_changes(chunk_ids)
+    print(f"Existing manifest found: {existing_manifest_bool}, Document changes detected: {doc_changes_bool}")
+    if not existing_manifest_bool and not doc_changes_bool:
+        # This should not happen! Manifest should always be created when the vector store is created.
+        print("Unexpected case. Run `update_vectorstore_optcg_rulebooks()` to re-index the vector store.")
+        return None
+    if not doc_changes_bool:
+        print("No updates needed.")
+        return False
+    if not existing_manifest_bool:
+        print("No previous manifest found. Create a new vector store with `create_or_load_vectorstore_optcg_rulebooks()`.")
+    else:
+        print("Update needed. Run `update_vectorstore_optcg_rulebooks()` to update the vector store in place.")
+    return True
+
+def update_vectorstore_optcg_rulebooks(vectorstore=None):
+    """
+    Incrementally update the persistent vector store in place.
+    Only new or changed chunks are embedded, and removed chunks are deleted from the Chroma collection,
+    so a running service can keep serving from the same store during the update. New chunks are added before removed
+    ones are deleted, and the shared hybrid retriever's keyword indexes are rebuilt afterwards.
+
+    Returns:
+        (added, removed) chunk counts, or None if the rulebooks could not be loaded
+    """
+    pdfs = fetch_rulebook_pdfs()
+    if pdfs is None:
+        print("Cannot update. Rulebook PDFs could not be fetched.")
+        return None
+    chunks, chunk_ids = load_and_split_rulebooks(pdfs)
+    if chunks is None:
+        return None
+
+    if vectorstore is None:
+        vectorstore = create_or_load_vectorstore_optcg_rulebooks()
+        if vectorstore is None:
+            return None
+
+    manifest = load_manifest()
+    if manifest is None:
+        # Store was created before manifests existed (random chunk IDs). Re-index everything once.
+        print("No manifest found. Re-indexing all chunks.")
+        manifest = {"chunk_ids": vectorstore.get(include=[])["ids"]}
+    added_ids, removed_ids = diff_chunks(chunk_ids, manifest)
+
+    # Add before deleting: the store keeps serving the old chunks while the new ones are embedded,
+    # and a failed embedding leaves the old version in place (the manifest is unchanged, so a rerun retries)
+    if added_ids:
+        new_chunks = [(chunk_id, chunk) for chunk_id, chunk in zip(chunk_ids, chunks) if chunk_id in added_ids]
+        vectorstore.add_documents(
+            documents=[chunk for _, chunk in new_chunks],
+            ids=[chunk_id for chunk_id, _ in new_chunks]
+        )
+    if removed_ids:
+        vectorstore.delete(ids=list(removed_ids))
+    save_manifest(chunk_ids, pdfs)
+    if added_ids or removed_ids:
+        refresh_rulebook_retriever()
+    print(f"Vector store updated: {len(added_ids)} chunks embedded, {len(removed_ids)} chunks removed.")
+    return len(added_ids), len(removed_ids)
+
+def refresh_rulebook_retriever():
+    """Rebuild the keyword indexes of this process's shared hybrid retriever, if it was built, from the updated store."""
+    from optcg.agents.tools.rulebook_tool import get_rulebook_retriever # Imported here, the agents import this module
+    if get_rulebook_retriever.is_initialized():
+        get_rulebook_retriever().refresh()
+
 # endregion Hashing and Updating
 
 
 
 # region Vector Store Creation and Management
 
+def get_embeddings():
+    """
+    The embedding model for the rulebooks, wrapped in the persistent embedding cache.
+    Rebuilds and repeated retriever queries reuse embeddings of text that has been embedded before.
+    """
+    from langchain_openai import OpenAIEmbeddings
+    return CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL), model_name=EMBEDDING_MODEL)
+
 def preprocess_tournament_rules(documents):
     """
     Add custom separators for tournament rule numbering
     Used to improve document chunking and retrieval.
+    Runs as a streaming stage: consumes and yields documents one page at a time.
     """
-    processed_docs = []
-    
     for doc in documents:
-        # Replace patterns like "1.2 followed by 1.2.1" with double newlines
-        content = doc.page_content
-        
         # Add double newlines (`\n\n`) before numbered sections like "1.2" and "1.2.1"
-        content = re.sub(r'(\d+\.\d+)', r' \n\n\1', content)
+        content = re.sub(r'(\d+\.\d+)', r' \n\n\1', doc.page_content)
         #content = re.sub(r'(\d+\.\d+\.\d+)', r' \n\n\1', content)
 
-        # Create new document with processed content
-        new_doc = doc.model_copy()
-        new_doc.page_content = content
-        processed_docs.append(new_doc)
-    
-    return processed_docs
+        yield Document(page_content=content, metadata=doc.metadata)
 
 def create_or_load_vectorstore_optcg_rulebooks():
     """Create or load the persistent vector store for the One Piece Card Game rules. Using Chroma and OpenAI embeddings."""
-    
-    # Define the cache directory and persistent directory
-    CACHE_DIRECTORY = Path.home() / ".cache"
+    from langchain_chroma import Chroma
+
     CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
-    PERSIST_DIRECTORY = CACHE_DIRECTORY / "optcg_rulebooks_vectorstore"
 
-    # Define the embedding model
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-large"
-        )
+    # Define the embedding model (cached on disk)
+    embeddings = get_embeddings()
 
     # Check if vector store already exists and load it
     if os.path.exists(PERSIST_DIRECTORY) and os.listdir(PERSIST_DIRECTORY):
@@ -242,34 +518,24 @@ def create_or_load_vectorstore_optcg_rulebooks():
     else: 
         print("Creating new vector store...")
         
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1500,
-            chunk_overlap=300,
-            separators=["\n\n", "\n \n", "\n", ". ", " ", ""]
-        )
-        
         # Load and split documents
-        comp_rules, tourney_rules = loader_optcg_rulebooks()
-        if not comp_rules or not tourney_rules:
-            print("No documents loaded. Please check PDF URLs.")
+        pdfs = fetch_rulebook_pdfs()
+        doc_chunks, chunk_ids = load_and_split_rulebooks(pdfs) if pdfs else (None, None)
+        if doc_chunks is None:
             return None # Exit if no documents are loaded. Will not create a vector store.
-        docs = comp_rules + tourney_rules
-        doc_chunks = text_splitter.split_documents(docs)
         print(f"Split documents into {len(doc_chunks)} chunks")
         
-        # Create vector store with persistence
+        # Create vector store with persistence, using content-addressed chunk IDs for incremental updates
         vectorstore = Chroma.from_documents(
             documents=doc_chunks,
+            ids=chunk_ids,
             embedding=embeddings,
             persist_directory=str(PERSIST_DIRECTORY)
         )
         print(f"Vector store created and saved to {PERSIST_DIRECTORY}")
 
-
-        HASH_PATH = PERSIST_DIRECTORY / "doc_hash.json"
-        docs_hash = hash_documents(docs)
-        save_hash(docs_hash, HASH_PATH)
-        print(f"Document hash saved to {HASH_PATH}")
+        save_manifest(chunk_ids, pdfs)
+        print(f"Chunk manifest saved to {MANIFEST_PATH}")
 
         return vectorstore
     
@@ -290,7 +556,6 @@ def delete_vectorstore_optcg_rulebooks():
         return
     
     # Delete the vector store directory if it exists
-    PERSIST_DIRECTORY = Path.home() / ".cache" / "optcg_rulebooks_vectorstore"
     if PERSIST_DIRECTORY.exists():
         try:
             # Use shutil.rmtree to recursively delete the entire directory tree
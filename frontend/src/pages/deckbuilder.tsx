@@ -829,6 +829,12 @@ const ChatWidget = forwardRef((props, ref) => {
       setOpen(true);
       setInput(value);
     },
+    // The board is saved under the chat's thread, so start one if no message was sent yet
+    ensureThreadId: () => {
+      const id = threadId || crypto.randomUUID();
+      if (!threadId) setThreadId(id);
+      return id;
+    },
     sendBoardStateMessage: async (gameState: any) => {
       setOpen(true);
       setLoading(true);
@@ -841,6 +847,7 @@ const ChatWidget = forwardRef((props, ref) => {
             agent_type: 'multi_agent',
             message: 'Analyze the current board state and suggest possible moves.',
             game_state: gameState,
+            ...(threadId ? { thread_id: threadId } : {}),
           }),
         });
         const data = await res.json();
@@ -1193,8 +1200,10 @@ const DeckBuilderPage = () => {
       OpponentState: opponentState,
     };
     console.log('Sending to /board/:', JSON.stringify(gameState, null, 2)); // for debugging
+    const threadId = chatRef.current?.ensureThreadId();
+    const boardUrl = threadId ? `http://localhost:8000/board/?thread_id=${encodeURIComponent(threadId)}` : 'http://localhost:8000/board/';
     try {
-      const res = await fetch('http://localhost:8000/board/', {
+      const res = await fetch(boardUrl, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(gameState),